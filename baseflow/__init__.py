@@ -1,3 +1,20 @@
-import baseflow.models
-import baseflow.plots
-import baseflow.processing
\ No newline at end of file
+import importlib
+
+# Submodules are imported on first attribute access, so `import baseflow` and `import baseflow.models`
+# only load NumPy. pandas, SciPy, matplotlib and the network stack load with the modules that need them.
+_SUBMODULES = (
+    'cache', 'engine', 'models', 'batch', 'sweep', 'ensemble', 'segments', 'recession', 'summary', 'plots',
+    'download', 'rdb', 'store', 'periods', 'processing', 'pipeline', 'cli', 'instrument',
+)
+
+__all__ = list(_SUBMODULES)
+
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        return importlib.import_module(f'{__name__}.{name}')
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_SUBMODULES))
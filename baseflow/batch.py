@@ -0,0 +1,110 @@
+import numpy as np
+import pandas as pd
+
+from baseflow.cache import memoize
+from baseflow.engine import masked_filter, multi_pass_filter, pack_valid, unpack_valid
+from baseflow.instrument import stage
+from baseflow.models import LINEAR_FILTERS, check_parameters
+from baseflow.recession import recession_constant
+
+# Filter parameters that are recession constants and can be estimated from the data with 'auto'
+RECESSION_PARAMETERS = ('alpha', 'k')
+
+
+def _like(streamflow, baseflow):
+    if isinstance(streamflow, pd.DataFrame):
+        return pd.DataFrame(baseflow, index=streamflow.index, columns=streamflow.columns)
+    return baseflow
+
+
+def _filter_name(model):
+    name = getattr(model, '__name__', model)
+    if name not in LINEAR_FILTERS and name != 'hyd_run':
+        raise ValueError(f"Unknown filter '{name}'. Choose one of: {', '.join(LINEAR_FILTERS)}, hyd_run.")
+    return name
+
+
+@memoize
+def filter_columns(values, model, params, state=None, segments=None):
+    """
+    Runs a linear filter down every column of a 2-D float64 block, skipping each column's NaNs.
+
+    Args:
+        values (numpy.ndarray): Streamflow values, shape (time, columns).
+        model (str): Name of a filter in :data:`baseflow.models.LINEAR_FILTERS`, or 'hyd_run'.
+        params (dict): Filter parameters; each may be a scalar or one value per column.
+        state (dict): Optional saved state with one value per column, from
+            :func:`baseflow.engine.filter_state`, to continue a previous run.
+        segments (numpy.ndarray): Optional segment id of every value, shaped like ``values``; the filter
+            restarts at each new segment.
+
+    Returns:
+        numpy.ndarray: Baseflow values aligned with ``values``, NaN where the input is NaN.
+    """
+    if model == 'hyd_run':
+        if state is not None:
+            raise ValueError("hyd_run cannot resume from a saved state: its backward passes depend on later data.")
+        if segments is not None:
+            raise ValueError("hyd_run cannot restart on segments: its backward passes cross segment boundaries.")
+        packed, order, valid = pack_valid(values)
+        filtered = multi_pass_filter(packed, params['k'], params['passes'], lengths=valid.sum(axis=0))
+        return unpack_valid(filtered, order, valid)
+
+    check_parameters(model, params)
+    coefficient_function, start_from_streamflow = LINEAR_FILTERS[model]
+    return masked_filter(values, *coefficient_function(**params), None if start_from_streamflow else 0.0, state,
+                         segments)
+
+
+def batch_filter(streamflow, model, state=None, segments=None, **params):
+    """
+    Runs one baseflow filter across many gauges in a single vectorized pass.
+
+    Each column is filtered as if it had been passed on its own to the matching function in
+    :mod:`baseflow.models`: NaNs are skipped and the recursion starts from the column's first
+    valid value. Unlike the single-series functions, the output stays aligned with the input
+    rows, with NaN wherever the input is NaN, and the input is never modified.
+
+    Args:
+        streamflow (pandas.DataFrame or array-like): Streamflow values, either a wide DataFrame
+            with one column per gauge or an array of shape (time,) or (time, gauges).
+        model (str or function): A filter from :mod:`baseflow.models`, by name or the function itself.
+        state (dict): Optional saved state from :func:`baseflow.engine.filter_state`, to continue a
+            previous run on newly appended rows.
+        segments (pandas.DataFrame or array-like): Optional segment id of every value, shaped like
+            ``streamflow``, e.g. from :func:`baseflow.processing.fill_gaps`. Each gauge's filter restarts
+            at every new segment instead of stepping across long gaps.
+        **params: The filter's parameters, named as in :mod:`baseflow.models`. Each parameter may be
+            a scalar or an array with one value per gauge. ``alpha`` or ``k`` may also be 'auto', to
+            use each gauge's master recession constant from :func:`baseflow.recession.recession_constant`.
+
+    Returns:
+        pandas.DataFrame or numpy.ndarray: Baseflow values with the same shape, and for a DataFrame
+        the same index and columns, as ``streamflow``.
+
+    Example:
+        .. code-block:: python
+
+            import pandas as pd
+            discharge = pd.read_csv("/my/sample/huc_discharge.csv", index_col='Date')
+            baseflow = batch_filter(discharge, 'eckhardt', alpha=0.925, bfi_max=0.8)
+            baseflow = batch_filter(discharge, 'eckhardt', alpha='auto', bfi_max=0.8)
+    """
+    name = _filter_name(model)
+    values = np.asarray(streamflow, dtype=np.float64)
+    if values.ndim not in (1, 2):
+        raise ValueError("streamflow must be 1-D (time,) or 2-D (time, gauges).")
+    if len(values) == 0:
+        # Like the single-series filters, an empty record gives an empty result
+        return _like(streamflow, np.empty(values.shape))
+    block = values.reshape(len(values), -1)
+
+    for key in RECESSION_PARAMETERS:
+        if isinstance(params.get(key), str) and params[key] == 'auto':
+            params[key] = recession_constant(block)
+
+    if segments is not None:
+        segments = np.asarray(segments).reshape(block.shape)
+    with stage(f'filter.{name}', rows=block.size):
+        baseflow = filter_columns(block, name, params, state, segments).reshape(values.shape)
+    return _like(streamflow, baseflow)
@@ -0,0 +1,315 @@
+import collections
+import functools
+import hashlib
+import inspect
+import os
+import tempfile
+import types
+
+import numpy as np
+
+# Settings and contents of the enabled cache, or None while caching is off
+_cache = None
+
+# Part of every key; bump it whenever a change alters the results of a cached function, so files
+# written by earlier versions in a persistent disk tier are never served again
+CACHE_VERSION = '2'
+
+# The disk tier is measured again after this many writes, to account for other processes sharing it
+_RESCAN_WRITES = 256
+
+# Eviction trims the disk tier to this fraction of its bound, so it only has to run occasionally
+_TRIM_FRACTION = 0.9
+
+
+def enable_cache(max_bytes=256 * 2 ** 20, max_entries=1024, cache_dir=None, max_disk_bytes=2 ** 30):
+    """
+    Turns on memoization of filter results.
+
+    Results of the filters in :mod:`baseflow.models` and of :func:`baseflow.batch.batch_filter` are
+    kept in an in-memory LRU and, when ``cache_dir`` is given, in a disk tier shared by every process
+    using the same folder, e.g. the workers of :func:`baseflow.pipeline.run_pipeline`. Entries are keyed
+    by a content hash of the input series plus the filter name and parameters, so editing the data or
+    changing a parameter never returns a stale result, and by :data:`CACHE_VERSION`, so files from a
+    release whose filters gave different results are not reused. Enabling again replaces the settings
+    and empties the memory tier.
+
+    Args:
+        max_bytes (int): Size bound of the memory tier; least recently used results are evicted first.
+        max_entries (int): Entry bound of the memory tier.
+        cache_dir (str): Folder of the disk tier, or None to keep results in memory only.
+        max_disk_bytes (int): Size bound of the disk tier; least recently used files are deleted first.
+
+    Example:
+        .. code-block:: python
+
+            enable_cache(cache_dir='filter_cache')
+            baseflow = lyne_hollick(dataset_models['Discharge'], 0.925)   # computed
+            baseflow = lyne_hollick(dataset_models['Discharge'], 0.925)   # served from the cache
+            print(cache_info())
+    """
+    global _cache
+    _cache = {
+        'entries': collections.OrderedDict(),
+        'bytes': 0,
+        'max_bytes': max_bytes,
+        'max_entries': max_entries,
+        'cache_dir': cache_dir,
+        'max_disk_bytes': max_disk_bytes,
+        # Estimated size of the disk tier, measured on the first write
+        'disk_bytes': None,
+        'disk_writes': 0,
+        'counters': dict.fromkeys(('hits', 'disk_hits', 'misses', 'evictions', 'disk_evictions'), 0),
+    }
+    if cache_dir is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+
+
+def disable_cache():
+    """Turns memoization off and drops the memory tier. Files in the disk tier are kept."""
+    global _cache
+    _cache = None
+
+
+def clear_cache(disk=False):
+    """
+    Empties the memory tier, and optionally the disk tier, and resets the counters.
+
+    Args:
+        disk (bool): Also delete every file of the disk tier.
+    """
+    if _cache is None:
+        return
+    _cache['entries'].clear()
+    _cache['bytes'] = 0
+    _cache['counters'] = dict.fromkeys(_cache['counters'], 0)
+    if disk and _cache['cache_dir'] is not None:
+        for path, _ in _disk_files(_cache['cache_dir']):
+            _remove(path)
+        _cache['disk_bytes'] = None
+
+
+def cache_info():
+    """
+    Reports the cache counters and size.
+
+    Returns:
+        dict: 'enabled', the 'hits' (memory), 'disk_hits', 'misses', 'evictions' and 'disk_evictions'
+        counters, and the number of 'entries' and 'bytes' held in memory.
+    """
+    if _cache is None:
+        return {'enabled': False}
+    return {'enabled': True, **_cache['counters'], 'entries': len(_cache['entries']), 'bytes': _cache['bytes']}
+
+
+# Values whose repr is fully determined by their contents
+_SCALARS = (str, int, float, complex, bool, type(None), np.dtype)
+
+
+def _hash_array(digest, array):
+    array = np.ascontiguousarray(array)
+    digest.update(f'{array.dtype.str}{array.shape}'.encode())
+    digest.update(repr(array.tolist()).encode() if array.dtype.hasobject else memoryview(array).cast('B'))
+
+
+def _hash_value(digest, value):
+    if isinstance(value, (np.ndarray, np.generic)) or hasattr(value, '__array__'):
+        _hash_array(digest, value)
+    elif isinstance(value, (memoryview, bytes, bytearray)):
+        # Buffers are hashed by their contents; the repr of a memoryview is only its address
+        _hash_array(digest, np.asarray(value))
+    elif isinstance(value, _SCALARS):
+        digest.update(f'{type(value).__name__}:{value!r}'.encode())
+    elif isinstance(value, (types.FunctionType, types.BuiltinFunctionType)):
+        digest.update(f'{value.__module__}.{value.__qualname__}'.encode())
+    elif isinstance(value, dict):
+        for key in sorted(value):
+            digest.update(repr(key).encode())
+            _hash_value(digest, value[key])
+    elif isinstance(value, (list, tuple)):
+        digest.update(f'{type(value).__name__}{len(value)}'.encode())
+        for item in value:
+            _hash_value(digest, item)
+    else:
+        raise TypeError(f"Cannot fingerprint a {type(value).__name__} by its contents.")
+
+
+def fingerprint(*values):
+    """
+    Hashes arrays and parameters into a short key.
+
+    Array contents are hashed with BLAKE2b straight from their buffers, without copying contiguous
+    input, so fingerprinting a long series costs about as much as reading it once.
+
+    Args:
+        *values: Arrays, array-likes such as pandas Series, buffers such as memoryviews, scalars,
+            strings, functions, or dicts and lists of them.
+
+    Returns:
+        str: A 32-character hexadecimal key.
+
+    Raises:
+        TypeError: If a value is of any other type, whose contents cannot be hashed reliably.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for value in values:
+        _hash_value(digest, value)
+    return digest.hexdigest()
+
+
+def _disk_path(cache_dir, key):
+    return os.path.join(cache_dir, key[:2], key + '.npz')
+
+
+def _disk_files(cache_dir):
+    # Other processes sharing the folder may delete files while it is listed
+    for folder in os.scandir(cache_dir):
+        if folder.is_dir():
+            for entry in os.scandir(folder.path):
+                if entry.name.endswith('.npz'):
+                    try:
+                        yield entry.path, entry.stat()
+                    except FileNotFoundError:
+                        continue
+
+
+def _remove(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def _read_disk(key):
+    path = _disk_path(_cache['cache_dir'], key)
+    try:
+        with np.load(path) as stored:
+            result = tuple(stored[f'arr_{i}'] for i in range(len(stored.files) - 1))
+            single = bool(stored['single'])
+    except (OSError, ValueError, KeyError):
+        return None
+    try:
+        # Touch the file so disk eviction is least recently used, not least recently written
+        os.utime(path)
+    except FileNotFoundError:
+        # Evicted by another process since it was read; the result is still good
+        pass
+    return result[0] if single else result
+
+
+def _write_disk(key, result):
+    cache_dir = _cache['cache_dir']
+    path = _disk_path(cache_dir, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    arrays = (result,) if isinstance(result, np.ndarray) else result
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    with os.fdopen(descriptor, 'wb') as file:
+        np.savez(file, *arrays, single=isinstance(result, np.ndarray))
+        size = file.tell()
+    os.replace(temporary, path)
+
+    # The size is tracked as files are written, and only measured again every few hundred writes
+    _cache['disk_writes'] += 1
+    if _cache['disk_bytes'] is None or _cache['disk_writes'] % _RESCAN_WRITES == 0:
+        _cache['disk_bytes'] = sum(stat.st_size for _, stat in _disk_files(cache_dir))
+    else:
+        _cache['disk_bytes'] += size
+    if _cache['disk_bytes'] > _cache['max_disk_bytes']:
+        _evict_disk(cache_dir, path)
+
+
+def _evict_disk(cache_dir, keep):
+    files = sorted(_disk_files(cache_dir), key=lambda item: item[1].st_mtime)
+    total = sum(stat.st_size for _, stat in files)
+    for old_path, stat in files:
+        if total <= _cache['max_disk_bytes'] * _TRIM_FRACTION:
+            break
+        if old_path == keep:
+            continue
+        _remove(old_path)
+        total -= stat.st_size
+        _cache['counters']['disk_evictions'] += 1
+    _cache['disk_bytes'] = total
+
+
+def _nbytes(result):
+    return result.nbytes if isinstance(result, np.ndarray) else sum(array.nbytes for array in result)
+
+
+def _store(key, result):
+    entries = _cache['entries']
+    entries[key] = result
+    _cache['bytes'] += _nbytes(result)
+    while entries and (_cache['bytes'] > _cache['max_bytes'] or len(entries) > _cache['max_entries']):
+        _, evicted = entries.popitem(last=False)
+        _cache['bytes'] -= _nbytes(evicted)
+        _cache['counters']['evictions'] += 1
+
+
+def _copy(result):
+    # Callers get their own copy so changing a returned array never alters the cached one
+    return result.copy() if isinstance(result, np.ndarray) else tuple(array.copy() for array in result)
+
+
+def _cacheable(result):
+    if isinstance(result, np.ndarray):
+        return True
+    return isinstance(result, tuple) and all(isinstance(array, np.ndarray) for array in result)
+
+
+def memoize(function=None, series=None):
+    """
+    Makes a filter use the cache while it is enabled.
+
+    While caching is off the wrapped function is called directly. Results that are not arrays or
+    tuples of arrays, e.g. None when parameter validation fails, are never cached, and neither are
+    calls with arguments :func:`fingerprint` cannot hash.
+
+    Args:
+        function (callable): The filter. Its first argument is the input series and the others are
+            its parameters.
+        series (callable): Optional function picking the array to hash from the first argument, e.g.
+            one column of a DataFrame.
+
+    Returns:
+        callable: The wrapped filter.
+    """
+    if function is None:
+        return functools.partial(memoize, series=series)
+    signature = inspect.signature(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if _cache is None:
+            return function(*args, **kwargs)
+
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        arguments = list(bound.arguments.values())
+        data = series(arguments[0]) if series is not None else arguments[0]
+        try:
+            key = fingerprint(CACHE_VERSION, function.__module__, function.__qualname__, data, arguments[1:])
+        except TypeError:
+            return function(*args, **kwargs)
+
+        counters = _cache['counters']
+        if key in _cache['entries']:
+            _cache['entries'].move_to_end(key)
+            counters['hits'] += 1
+            return _copy(_cache['entries'][key])
+        if _cache['cache_dir'] is not None:
+            result = _read_disk(key)
+            if result is not None:
+                counters['disk_hits'] += 1
+                _store(key, result)
+                return _copy(result)
+
+        counters['misses'] += 1
+        result = function(*args, **kwargs)
+        if _cacheable(result):
+            _store(key, _copy(result))
+            if _cache['cache_dir'] is not None:
+                _write_disk(key, result)
+        return result
+
+    return wrapper
@@ -0,0 +1,270 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+
+# Column names that hold USGS Station IDs and HUCs in station tables, e.g. NWIS site files
+STATION_COLUMNS = ('site_no', 'station', 'station_number', 'staid')
+HUC_COLUMNS = ('huc_cd', 'huc', 'huc8', 'huc_8')
+
+
+def _table_rows(lines):
+    delimiter = '\t' if '\t' in lines[0] else ','
+    rows = [line.split(delimiter) for line in lines]
+    header = [name.strip().lower() for name in rows[0]]
+    body = rows[1:]
+    # NWIS RDB files have a field-format line, e.g. '5s 15s 50s', right after the header
+    if body and all(field.strip()[:-1].isdigit() and field.strip()[-1:] in 'sdn' for field in body[0] if field.strip()):
+        body = body[1:]
+    return header, body
+
+
+def read_stations(path, huc=None):
+    """
+    Reads USGS Station IDs from a station list or a HUC station table.
+
+    A station list has one ID per line. A station table is a CSV or tab-separated file, such as an
+    NWIS site file for a hydrologic unit, with a station column ('site_no', 'station', 'station_number'
+    or 'staid') and optionally a HUC column ('huc_cd', 'huc', 'huc8' or 'huc_8'). Lines starting with
+    '#' and blank lines are skipped in both.
+
+    Args:
+        path (str): The station list or table.
+        huc (str): Optional HUC prefix; only stations of a table whose HUC starts with it are kept.
+
+    Returns:
+        list of str: The station IDs in file order, without duplicates.
+
+    Example:
+        .. code-block:: python
+
+            stations = read_stations('stations_02070010.rdb', huc='0207')
+    """
+    with open(path) as file:
+        lines = [line.rstrip('\r\n') for line in file if line.strip() and not line.startswith('#')]
+    if not lines:
+        return []
+
+    if ',' not in lines[0] and '\t' not in lines[0]:
+        if huc is not None:
+            raise ValueError("A HUC filter needs a station table with a HUC column, not a plain station list.")
+        stations = [line.strip() for line in lines]
+    else:
+        header, body = _table_rows(lines)
+        station_column = next((header.index(name) for name in STATION_COLUMNS if name in header), None)
+        if station_column is None:
+            raise ValueError(f"{path} has no station column. Name it one of: {', '.join(STATION_COLUMNS)}.")
+        huc_column = next((header.index(name) for name in HUC_COLUMNS if name in header), None)
+        if huc is not None and huc_column is None:
+            raise ValueError(f"{path} has no HUC column. Name it one of: {', '.join(HUC_COLUMNS)}.")
+        stations = [row[station_column].strip() for row in body
+                    if huc is None or row[huc_column].strip().startswith(huc)]
+
+    return list(dict.fromkeys(station for station in stations if station))
+
+
+def load_pipeline(path):
+    """
+    Reads a pipeline from a JSON file.
+
+    Args:
+        path (str): A JSON file holding a list of ``[step name, parameters]`` pairs, the same steps as
+            :data:`baseflow.pipeline.STEPS`.
+
+    Returns:
+        list: ``(step name, parameters)`` pairs.
+
+    Example:
+        .. code-block:: json
+
+            [["fetch", {"start_date": "2000-01-01", "end_date": "2023-12-31"}],
+             ["clean", {}],
+             ["filter", {"column": "Eckhardt", "model": "eckhardt", "alpha": 0.925, "bfi_max": 0.8}]]
+    """
+    with open(path) as file:
+        pipeline = json.load(file)
+    if not isinstance(pipeline, list) or not all(isinstance(step, list) and len(step) == 2 for step in pipeline):
+        raise ValueError(f"{path} must hold a list of [step name, parameters] pairs.")
+    return [(step, params) for step, params in pipeline]
+
+
+def pipeline_key(pipeline):
+    """Returns a short hash of a pipeline, so checkpoints of a different pipeline are not reused."""
+    text = json.dumps([[step, params] for step, params in pipeline], sort_keys=True, default=str)
+    return hashlib.sha256(text.encode()).hexdigest()[:16]
+
+
+def read_checkpoint(path, key):
+    """
+    Returns the stations a previous run of the same pipeline completed.
+
+    Args:
+        path (str): The checkpoint file, one JSON record per line as written by :func:`main`.
+        key (str): The :func:`pipeline_key` of the pipeline being run.
+
+    Returns:
+        set of str: Stations whose latest record for this pipeline is 'ok' and whose output still exists.
+    """
+    latest = {}
+    if os.path.exists(path):
+        with open(path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # The last line of an interrupted run can be cut short
+                    continue
+                if record.get('Pipeline') == key:
+                    latest[record['Station']] = record
+    return {station for station, record in latest.items()
+            if record['Status'] == 'ok' and record['Output'] and os.path.exists(record['Output'])}
+
+
+def _append_json(file, record):
+    file.write(json.dumps(record, default=str) + '\n')
+    file.flush()
+    os.fsync(file.fileno())
+
+
+def throughput(records, seconds):
+    """
+    Summarizes a run's records into throughput metrics.
+
+    Args:
+        records (list of dict): Station records from :func:`baseflow.pipeline.run_station`.
+        seconds (float): Wall-clock duration of the run.
+
+    Returns:
+        dict: 'stations', 'ok', 'failed', 'rows', 'seconds', 'stations_per_second', 'rows_per_second'
+        and 'stages', the total seconds spent in each step across all stations.
+    """
+    stages = {}
+    for record in records:
+        for step, spent in record.get('Stages', {}).items():
+            stages[step] = stages.get(step, 0.0) + spent
+    rows = sum(record['Rows'] for record in records)
+    ok = sum(record['Status'] == 'ok' for record in records)
+    return {
+        'stations': len(records),
+        'ok': ok,
+        'failed': len(records) - ok,
+        'rows': rows,
+        'seconds': seconds,
+        'stations_per_second': len(records) / seconds if seconds else 0.0,
+        'rows_per_second': rows / seconds if seconds else 0.0,
+        'stages': stages,
+    }
+
+
+def _parser():
+    parser = argparse.ArgumentParser(
+        prog='baseflow', description='Run a baseflow pipeline for many USGS stations.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--stations', help='Station list (one ID per line) or station table.')
+    source.add_argument('--huc-file', help='Station table with a HUC column, e.g. an NWIS site file.')
+    parser.add_argument('--huc', help='Only run stations whose HUC starts with this prefix.')
+    parser.add_argument('--pipeline', help='JSON pipeline file; defaults to the fetch/clean/filter/label chain.')
+    parser.add_argument('--start-date', help='Overrides the start date of the fetch step.')
+    parser.add_argument('--end-date', help='Overrides the end date of the fetch step.')
+    parser.add_argument('--cache-dir', help='NWIS response cache folder for the fetch step.')
+    parser.add_argument('--filter-cache', help='Filter result cache folder shared by the workers.')
+    parser.add_argument('--output-dir', default='output', help='Folder for the per-station output files.')
+    parser.add_argument('--workers', type=int, help='Worker processes; defaults to the number of CPUs.')
+    parser.add_argument('--checkpoint', help='Checkpoint file; defaults to <output-dir>/checkpoint.jsonl.')
+    parser.add_argument('--restart', action='store_true', help='Ignore the checkpoint and run every station.')
+    parser.add_argument('--json-log', help='Append one JSON line per station and a final summary line here.')
+    parser.add_argument('--metrics-file', help='Write stage timings and counters here at the end of the run, '
+                                               'as JSON for .json files and Prometheus text otherwise.')
+    parser.add_argument('--verbose', action='store_true', help="Also print each step's own output, e.g. NWIS links.")
+    parser.add_argument('--quiet', action='store_true', help='Only print the final summary.')
+    return parser
+
+
+def _configure(args):
+    from baseflow.pipeline import DEFAULT_PIPELINE
+
+    pipeline = load_pipeline(args.pipeline) if args.pipeline else DEFAULT_PIPELINE
+    overrides = {'start_date': args.start_date, 'end_date': args.end_date, 'cache_dir': args.cache_dir}
+    overrides = {name: value for name, value in overrides.items() if value is not None}
+    return [(step, {**params, **overrides} if step == 'fetch' else params) for step, params in pipeline]
+
+
+def main(argv=None):
+    """
+    Runs the ``baseflow`` console command.
+
+    Stations come from ``--stations`` or ``--huc-file`` and run through the pipeline on ``--workers``
+    processes with :func:`baseflow.pipeline.run_pipeline`. Every finished station is appended to a
+    checkpoint file, so a rerun of an interrupted run skips the stations that already succeeded.
+    Progress and throughput (stations/s, rows/s, seconds per step) go to stdout, and with
+    ``--json-log`` to a JSON-lines log as well. ``--metrics-file`` adds the finer stage timings and
+    counters of :mod:`baseflow.instrument`, collected from every worker.
+
+    Args:
+        argv (list of str): Command-line arguments; defaults to ``sys.argv[1:]``.
+
+    Returns:
+        int: 0 when every station succeeded, 1 otherwise.
+
+    Example:
+        .. code-block:: bash
+
+            baseflow --huc-file sites.rdb --huc 0207 --start-date 2000-01-01 --end-date 2023-12-31 --workers 16
+            baseflow --stations stations.txt --pipeline pipeline.json --json-log nightly.jsonl
+    """
+    args = _parser().parse_args(argv)
+    from baseflow.instrument import enable_metrics, export_metrics
+    from baseflow.pipeline import run_pipeline
+
+    stations = read_stations(args.stations or args.huc_file, huc=args.huc)
+    pipeline = _configure(args)
+    key = pipeline_key(pipeline)
+    os.makedirs(args.output_dir, exist_ok=True)
+    checkpoint = args.checkpoint or os.path.join(args.output_dir, 'checkpoint.jsonl')
+
+    done = set() if args.restart else read_checkpoint(checkpoint, key)
+    remaining = [station for station in stations if station not in done]
+    if not args.quiet:
+        print(f"{len(stations)} stations, {len(stations) - len(remaining)} already done, {len(remaining)} to run")
+
+    if args.metrics_file:
+        enable_metrics()
+    records = []
+    start = time.perf_counter()
+    log = open(args.json_log, 'a') if args.json_log else None
+    with open(checkpoint, 'a') as checkpoint_file:
+        def on_result(record):
+            records.append(record)
+            _append_json(checkpoint_file, {**record, 'Pipeline': key})
+            if log is not None:
+                _append_json(log, {'event': 'station', **record})
+            if not args.quiet:
+                rate = len(records) / (time.perf_counter() - start)
+                status = record['Status'] if record['Error'] is None else f"{record['Status']} ({record['Error']})"
+                print(f"[{len(records)}/{len(remaining)}] {record['Station']} {status} {record['Rows']} rows "
+                      f"{record['Seconds']:.2f} s | {rate:.2f} stations/s", flush=True)
+
+        try:
+            if remaining:
+                run_pipeline(remaining, pipeline, args.output_dir, workers=args.workers,
+                             filter_cache=args.filter_cache, on_result=on_result,
+                             verbose=args.verbose and not args.quiet)
+        finally:
+            metrics = throughput(records, time.perf_counter() - start)
+            if log is not None:
+                _append_json(log, {'event': 'summary', 'skipped': len(stations) - len(remaining), **metrics})
+                log.close()
+            if args.metrics_file:
+                export_metrics(args.metrics_file)
+
+    stages = ', '.join(f'{step} {spent:.1f} s' for step, spent in metrics['stages'].items())
+    print(f"{metrics['ok']} ok, {metrics['failed']} failed in {metrics['seconds']:.1f} s: "
+          f"{metrics['stations_per_second']:.2f} stations/s, {metrics['rows_per_second']:.0f} rows/s"
+          + (f" | {stages}" if stages else ''))
+    return 1 if metrics['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
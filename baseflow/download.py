@@ -0,0 +1,267 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import os
+import tempfile
+
+import urllib3
+
+from baseflow.instrument import count
+
+NWIS_DV_URL = 'https://nwis.waterdata.usgs.gov/nwis/dv'
+NWIS_IV_URL = 'https://nwis.waterservices.usgs.gov/nwis/iv/'
+
+# Services that can be requested: daily values and instantaneous (e.g. 15-minute) values
+SERVICES = ('dv', 'iv')
+
+# Query string of the daily-values RDB request, between the station number and the date range
+_DV_QUERY = ('&search_site_no_match_type=exact&site_tp_cd=OC&site_tp_cd=OC-CO&site_tp_cd=ES&site_tp_cd='
+             'LK&site_tp_cd=ST&site_tp_cd=ST-CA&site_tp_cd=ST-DCH&site_tp_cd=ST-TS&index_pmcode_00060=1&group_key='
+             'NONE&sitefile_output_format=html_table&column_name=agency_cd&column_name=site_no&column_name=station_nm&range_selection=date_range&begin_date=')
+_DV_SUFFIX = ('&format=rdb&date_format=YYYY-MM-DD&rdb_compression=value&list_of_search_criteria=search_site_no%2Csite_tp_cd%2Crealtime_parameter_selection')
+
+# Responses that are worth retrying: rate limiting and transient server errors
+_RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+def nwis_url(station_number, start_date, end_date, base_url=NWIS_DV_URL):
+    """
+    Builds the NWIS daily-values RDB link for a station and date range.
+
+    Args:
+        station_number (str): The USGS Station ID.
+        start_date (str): The start date in the format 'YYYY-M-D'.
+        end_date (str): The end date in the format 'YYYY-M-D'.
+        base_url (str): The service endpoint, e.g. a local stub server when testing.
+
+    Returns:
+        str: The request URL.
+    """
+    return (base_url + '?referred_module=sw&search_site_no=' + station_number + _DV_QUERY + start_date
+            + '&end_date=' + end_date + _DV_SUFFIX)
+
+
+def nwis_iv_url(station_number, start_date, end_date, base_url=NWIS_IV_URL):
+    """
+    Builds the NWIS instantaneous-values RDB link for a station and date range.
+
+    Instantaneous values are usually recorded every 15 minutes, about 35,000 values per year.
+
+    Args:
+        station_number (str): The USGS Station ID.
+        start_date (str): The start date in the format 'YYYY-MM-DD'.
+        end_date (str): The end date in the format 'YYYY-MM-DD'.
+        base_url (str): The service endpoint, e.g. a local stub server when testing.
+
+    Returns:
+        str: The request URL.
+    """
+    return (base_url + '?format=rdb&sites=' + station_number + '&parameterCd=00060&startDT=' + start_date
+            + '&endDT=' + end_date)
+
+
+def _service_url(service, station_number, start_date, end_date, base_url):
+    if service == 'iv':
+        return nwis_iv_url(station_number, start_date, end_date, base_url or NWIS_IV_URL)
+    return nwis_url(station_number, start_date, end_date, base_url or NWIS_DV_URL)
+
+
+def cache_path(cache_dir, station_number, start_date, end_date, service='dv'):
+    """
+    Returns where the response for (station, start, end) is cached.
+
+    Files are named by the SHA-256 of the request key and fanned out over 256 sub-folders so
+    that no single folder holds tens of thousands of entries.
+
+    Args:
+        cache_dir (str): Root folder of the response cache.
+        station_number (str): The USGS Station ID.
+        start_date (str): The start date of the request.
+        end_date (str): The end date of the request.
+        service (str): 'dv' or 'iv'.
+
+    Returns:
+        str: The path of the cache file, which may not exist yet.
+    """
+    # Daily-values keys keep their original form so existing caches stay valid
+    request = f'{station_number}|{start_date}|{end_date}' + ('' if service == 'dv' else f'|{service}')
+    key = hashlib.sha256(request.encode()).hexdigest()
+    return os.path.join(cache_dir, key[:2], key + '.rdb')
+
+
+def _write_atomic(path, blocks):
+    # Written under a temporary name, so readers never see a partial response
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    try:
+        with os.fdopen(descriptor, 'wb') as file:
+            for block in blocks:
+                file.write(block)
+        os.replace(temporary, path)
+    except BaseException:
+        os.remove(temporary)
+        raise
+
+
+def _pool(concurrency, retries, backoff, verify):
+    return urllib3.PoolManager(
+        maxsize=concurrency,
+        block=True,
+        cert_reqs='CERT_REQUIRED' if verify else 'CERT_NONE',
+        retries=urllib3.Retry(total=retries, backoff_factor=backoff, status_forcelist=_RETRY_STATUSES,
+                              raise_on_status=False),
+    )
+
+
+def _get(http, url):
+    response = http.request('GET', url)
+    if response.status != 200:
+        raise urllib3.exceptions.HTTPError(f'NWIS returned HTTP {response.status} for {url}')
+    return response.data
+
+
+def _counted(blocks):
+    for block in blocks:
+        count('bytes_downloaded', len(block))
+        yield block
+
+
+def download_to_cache(station_number, start_date, end_date, cache_dir, retries=3, backoff=0.5, base_url=None,
+                      verify=True, service='dv', block_size=2 ** 16):
+    """
+    Streams one NWIS response straight into the response cache and returns the cached file.
+
+    Unlike :func:`fetch_rdb`, the response is never held in memory: it is written to disk
+    ``block_size`` bytes at a time, so a long instantaneous-values record can then be parsed from
+    the file in chunks. A response that is already cached is not downloaded again.
+
+    Args:
+        station_number (str): The USGS Station ID.
+        start_date (str): The start date in the format 'YYYY-MM-DD'.
+        end_date (str): The end date in the format 'YYYY-MM-DD'.
+        cache_dir (str): Folder of the on-disk response cache.
+        retries (int): Retries after the first attempt, as for :func:`fetch_rdb`.
+        backoff (float): Backoff factor in seconds, as for :func:`fetch_rdb`.
+        base_url (str): The service endpoint. Defaults to :data:`NWIS_DV_URL` or :data:`NWIS_IV_URL`.
+        verify (bool): Verify TLS certificates.
+        service (str): 'dv' for daily values or 'iv' for instantaneous values.
+        block_size (int): Bytes read from the network and written at a time.
+
+    Returns:
+        str: The path of the cached response, as given by :func:`cache_path`.
+
+    Example:
+        .. code-block:: python
+
+            path = download_to_cache('01636500', '2000-01-01', '2023-12-31', 'nwis_cache', service='iv')
+            with open(path, 'rb') as file:
+                for chunk in iter_rdb(file):
+                    ...
+    """
+    if service not in SERVICES:
+        raise ValueError(f"service must be one of: {', '.join(SERVICES)}.")
+    path = cache_path(cache_dir, station_number, start_date, end_date, service)
+    if os.path.exists(path):
+        count('bytes_from_cache', os.path.getsize(path))
+        return path
+
+    http = _pool(1, retries, backoff, verify)
+    url = _service_url(service, station_number, start_date, end_date, base_url)
+    response = http.request('GET', url, preload_content=False)
+    try:
+        if response.status != 200:
+            raise urllib3.exceptions.HTTPError(f'NWIS returned HTTP {response.status} for {url}')
+        _write_atomic(path, _counted(response.stream(block_size)))
+    finally:
+        response.release_conn()
+        http.clear()
+    return path
+
+
+async def fetch_rdb(station_numbers, start_date, end_date, cache_dir=None, concurrency=8, retries=3,
+                    backoff=0.5, base_url=None, verify=True, service='dv'):
+    """
+    Downloads NWIS daily-values or instantaneous-values RDB responses for many stations concurrently.
+
+    Requests share one keep-alive connection pool with at most ``concurrency`` requests in flight.
+    Connection errors and 429/5xx responses are retried with exponential backoff. When ``cache_dir``
+    is given, responses are stored there and later requests for the same (station, start, end) are
+    served from disk without any network I/O.
+
+    Args:
+        station_numbers (iterable of str): USGS Station IDs.
+        start_date (str): The start date in the format 'YYYY-M-D'.
+        end_date (str): The end date in the format 'YYYY-M-D'.
+        cache_dir (str): Folder of the on-disk response cache, or None to disable caching.
+        concurrency (int): Maximum number of simultaneous requests and pooled connections.
+        retries (int): Retries per request after the first attempt.
+        backoff (float): Backoff factor in seconds; retry n waits ``backoff * 2 ** (n - 1)``.
+        base_url (str): The service endpoint, e.g. a local stub server when testing. Defaults to
+            :data:`NWIS_DV_URL` or :data:`NWIS_IV_URL`.
+        verify (bool): Verify TLS certificates.
+        service (str): 'dv' for daily values or 'iv' for instantaneous values.
+
+    Returns:
+        dict: The raw RDB bytes for each station. A station whose download failed maps to the
+        exception that stopped it.
+    """
+    if service not in SERVICES:
+        raise ValueError(f"service must be one of: {', '.join(SERVICES)}.")
+    http = _pool(concurrency, retries, backoff, verify)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch_one(station_number):
+        path = cache_path(cache_dir, station_number, start_date, end_date, service) if cache_dir else None
+        if path and os.path.exists(path):
+            with open(path, 'rb') as file:
+                data = file.read()
+            count('bytes_from_cache', len(data))
+            return data
+
+        async with semaphore:
+            url = _service_url(service, station_number, start_date, end_date, base_url)
+            data = await asyncio.to_thread(_get, http, url)
+        count('bytes_downloaded', len(data))
+        if path:
+            _write_atomic(path, [data])
+        return data
+
+    station_numbers = list(station_numbers)
+    try:
+        results = await asyncio.gather(*(fetch_one(station) for station in station_numbers), return_exceptions=True)
+    finally:
+        http.clear()
+    return dict(zip(station_numbers, results))
+
+
+def download_stations(station_numbers, start_date, end_date, **kwargs):
+    """
+    Blocking wrapper around :func:`fetch_rdb`.
+
+    It also works where an event loop is already running, e.g. in a Jupyter notebook: the download
+    then runs on its own loop in a worker thread. Code that is itself async should await
+    :func:`fetch_rdb` instead.
+
+    Args:
+        station_numbers (iterable of str): USGS Station IDs.
+        start_date (str): The start date in the format 'YYYY-M-D'.
+        end_date (str): The end date in the format 'YYYY-M-D'.
+        **kwargs: Passed on to :func:`fetch_rdb`.
+
+    Returns:
+        dict: The raw RDB bytes, or the exception raised, for each station.
+
+    Example:
+        .. code-block:: python
+
+            responses = download_stations(['01636500', '01646500'], '2019-06-10', '2023-10-07',
+                                          cache_dir='nwis_cache')
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return asyncio.run(fetch_rdb(station_numbers, start_date, end_date, **kwargs))
+
+    # asyncio.run cannot be nested in a running loop, so the download gets a thread and loop of its own
+    with concurrent.futures.ThreadPoolExecutor(max_workers=1) as executor:
+        return executor.submit(asyncio.run, fetch_rdb(station_numbers, start_date, end_date, **kwargs)).result()
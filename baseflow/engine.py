@@ -0,0 +1,374 @@
+import numpy as np
+
+# Above this many distinct per-column coefficients, the blocked scan beats one lfilter call per coefficient
+_MAX_COEFFICIENT_GROUPS = 16
+
+
+def _blocked_recurrence(x, a, initial, cap=None):
+    """
+    Evaluates y[t] = a * y[t-1] + x[t] for (time, columns) blocks with one coefficient per column,
+    optionally clipped as y[t] = min(a * y[t-1] + x[t], cap[t]).
+
+    The series is cut into about sqrt(time) blocks. Each block is first run from zero, all blocks
+    at once, and the true starting values are then carried from block to block and added back as
+    ``a ** (j + 1) * start``. That needs about 2 * sqrt(time) vectorized steps instead of one per row.
+    With a cap, each block also tracks the tightest cap reachable from its start; since
+    ``min(a * y + x, c)`` composes into the same form for a >= 0, the clip is applied the same way.
+    """
+    steps = len(x) - 1
+    block = max(1, int(np.sqrt(steps)))
+    blocks = -(-steps // block)
+
+    padded = np.zeros((blocks * block, x.shape[1]))
+    padded[:steps] = x[1:]
+    z = padded.reshape(blocks, block, x.shape[1])
+    if cap is not None:
+        caps = np.zeros((blocks * block, x.shape[1]))
+        caps[:steps] = cap[1:]
+        c = caps.reshape(blocks, block, x.shape[1])
+
+    for j in range(1, block):
+        if cap is not None:
+            np.minimum(a * c[:, j - 1] + z[:, j], c[:, j], out=c[:, j])
+        z[:, j] += a * z[:, j - 1]
+
+    powers = a ** np.arange(1, block + 1)[:, np.newaxis]
+    starts = np.empty((blocks, x.shape[1]))
+    previous = initial
+    for b in range(blocks):
+        starts[b] = previous
+        previous = powers[-1] * previous + z[b, -1]
+        if cap is not None:
+            previous = np.minimum(previous, c[b, -1])
+    z += powers * starts[:, np.newaxis, :]
+    if cap is not None:
+        np.minimum(z, c, out=z)
+
+    return padded[:steps]
+
+
+def pack_valid(values):
+    """
+    Moves each column's non-NaN values to the top of a (time, columns) block, keeping their order.
+
+    Rows below a column's last valid value are zero-filled so a recursion never carries a NaN;
+    they are discarded again by :func:`unpack_valid`.
+
+    Args:
+        values (numpy.ndarray): A float64 block of shape (time, columns).
+
+    Returns:
+        tuple: ``(packed, order, valid)``. ``order`` is the row order used for packing, or None
+        when there are no NaNs, in which case ``packed`` is ``values`` itself.
+    """
+    valid = ~np.isnan(values)
+    if valid.all():
+        return values, None, valid
+
+    order = np.argsort(~valid, axis=0, kind='stable')
+    packed = np.take_along_axis(values, order, axis=0)
+    packed[np.arange(len(values))[:, np.newaxis] >= valid.sum(axis=0)] = 0.0
+    return packed, order, valid
+
+
+def unpack_valid(filtered, order, valid):
+    """
+    Puts values computed on a packed block back in their original rows, with NaN at the gaps.
+
+    Args:
+        filtered (numpy.ndarray): Values computed on the block returned by :func:`pack_valid`.
+        order, valid: The other two values returned by :func:`pack_valid`.
+
+    Returns:
+        numpy.ndarray: Values aligned with the original block.
+    """
+    if order is None:
+        return filtered
+
+    unpacked = np.empty_like(filtered)
+    np.put_along_axis(unpacked, order, filtered, axis=0)
+    unpacked[~valid] = np.nan
+    return unpacked
+
+
+def linear_recurrence(x, a, initial):
+    """
+    Evaluates the first-order linear recurrence y[t] = a * y[t-1] + x[t].
+
+    The recurrence is run along the first axis with ``scipy.signal.lfilter``, so the
+    time loop happens in compiled code. ``x`` may be a single series (time,) or a
+    2-D block (time × columns). ``a`` may be a scalar or one coefficient per column;
+    columns that share a coefficient are filtered together in one call, and blocks with
+    many distinct coefficients fall back to a blocked scan vectorized across columns.
+
+    Args:
+        x (array-like): Forcing term of the recurrence. ``x[0]`` is ignored.
+        a (float or array-like): Recurrence coefficient, scalar or one per column.
+        initial (float or array-like): Value of ``y[0]``, scalar or one per column.
+
+    Returns:
+        numpy.ndarray: A float64 array with the same shape as ``x``.
+
+    Example:
+        .. code-block:: python
+
+            import numpy as np
+            y = linear_recurrence(np.ones(10), 0.5, 0.0)
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.empty_like(x)
+    if len(x) == 0:
+        return y
+
+    y[0] = initial
+    if len(x) == 1:
+        return y
+
+    # SciPy is imported on first use so that importing the models only loads NumPy
+    from scipy.signal import lfilter
+
+    a = np.asarray(a, dtype=np.float64)
+    if a.ndim == 0:
+        zi = np.expand_dims(a * y[0], 0)
+        y[1:], _ = lfilter([1.0], [1.0, -a], x[1:], axis=0, zi=zi)
+        return y
+
+    # One lfilter call per distinct coefficient rather than per column
+    coefficients, groups = np.unique(np.broadcast_to(a, x.shape[1:]), return_inverse=True)
+    if len(coefficients) > _MAX_COEFFICIENT_GROUPS:
+        y[1:] = _blocked_recurrence(x, np.broadcast_to(a, x.shape[1:]), y[0])
+        return y
+
+    for group, coefficient in enumerate(coefficients):
+        columns = groups == group
+        zi = coefficient * y[:1, columns]
+        y[1:, columns], _ = lfilter([1.0], [1.0, -coefficient], x[1:, columns], axis=0, zi=zi)
+
+    return y
+
+
+def clipped_recurrence(x, a, cap, initial):
+    """
+    Evaluates the clipped recurrence y[t] = min(a * y[t-1] + x[t], cap[t]).
+
+    Args:
+        x (array-like): Forcing term, shape (time,) or (time, columns). ``x[0]`` is ignored.
+        a (float or array-like): Recurrence coefficient, scalar or one per column. Must be >= 0.
+        cap (array-like): Upper bound of every value, same shape as ``x``.
+        initial (float or array-like): Value of ``y[0]``, scalar or one per column.
+
+    Returns:
+        numpy.ndarray: A float64 array with the same shape as ``x``.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.empty_like(x)
+    if len(x) == 0:
+        return y
+
+    y[0] = initial
+    if len(x) == 1:
+        return y
+
+    columns = x.reshape(len(x), -1)
+    cap = np.asarray(cap, dtype=np.float64).reshape(columns.shape)
+    a = np.broadcast_to(np.asarray(a, dtype=np.float64), columns.shape[1:])
+    y[1:] = _blocked_recurrence(columns, a, y[:1].reshape(-1), cap).reshape(y[1:].shape)
+    return y
+
+
+def multi_pass_filter(streamflow, k, passes, lengths=None):
+    """
+    Runs the HYDRUN digital filter with alternating forward and backward passes.
+
+    Each pass filters the previous pass's baseflow (the streamflow on the first pass) with
+    b[t] = min(k * b[t-1] + (1 - k) * (u[t] + u[t-1]) / 2, u[t]), starting from b[0] = u[0];
+    even-numbered passes run from the end of the record back to the start.
+
+    Args:
+        streamflow (array-like): Streamflow values, shape (time,) or (time, columns).
+        k (float or array-like): Filter coefficient between 0 and 1, scalar or one per column.
+        passes (int): Number of passes.
+        lengths (array-like): Optional number of leading rows that hold data in each column; the
+            rows after it are ignored. Defaults to every row.
+
+    Returns:
+        numpy.ndarray: A float64 array of baseflow values with the same shape as ``streamflow``.
+    """
+    streamflow = np.asarray(streamflow, dtype=np.float64)
+    u = streamflow.reshape(len(streamflow), -1)
+    rows = np.arange(len(u))[:, np.newaxis]
+    lengths = np.full(u.shape[1], len(u)) if lengths is None else np.asarray(lengths)
+    # Row index that reverses the first lengths[c] rows of each column; applying it twice restores the order
+    reverse = np.where(rows < lengths, lengths - 1 - rows, rows)
+
+    for p in range(passes):
+        backward = p % 2 == 1
+        values = np.take_along_axis(u, reverse, axis=0) if backward else u
+        x = np.empty_like(values)
+        x[1:] = np.multiply((1 - np.asarray(k)) / 2, values[1:] + values[:-1])
+        baseflow = clipped_recurrence(x, k, values, values[:1].reshape(-1))
+        u = np.take_along_axis(baseflow, reverse, axis=0) if backward else baseflow
+
+    return u.reshape(streamflow.shape)
+
+
+def first_order_filter(streamflow, a, c0, c1, initial):
+    """
+    Runs a baseflow filter of the form b[t] = a * b[t-1] + c0 * Q[t] + c1 * Q[t-1].
+
+    Every recursive filter in :mod:`baseflow.models` reduces to this form once its
+    parameters are folded into the three coefficients ``a``, ``c0`` and ``c1``.
+
+    Args:
+        streamflow (array-like): Streamflow values, shape (time,) or (time, columns).
+        a (float or array-like): Weight of the previous baseflow value.
+        c0 (float or array-like): Weight of the current streamflow value.
+        c1 (float or array-like): Weight of the previous streamflow value.
+        initial (float or array-like): The first baseflow value.
+
+    Returns:
+        numpy.ndarray: A float64 array of baseflow values with the same shape as ``streamflow``.
+    """
+    streamflow = np.asarray(streamflow, dtype=np.float64)
+    x = np.multiply(c0, streamflow)
+    x[1:] += np.multiply(c1, streamflow[:-1])
+    return linear_recurrence(x, a, initial)
+
+
+def restart_segments(baseflow, a, segments, start_values):
+    """
+    Restarts a first-order filter wherever the segment id changes, given its uninterrupted output.
+
+    Within a segment that starts at row ``s`` the restarted and the uninterrupted filter obey the same
+    recurrence and only differ in their value at ``s``, so the restarted output is
+    ``baseflow[t] + a ** (t - s) * (start_values[s] - baseflow[s])``. That turns any number of restarts
+    into one vectorized correction instead of one filter call per segment.
+
+    Args:
+        baseflow (numpy.ndarray): Output of :func:`first_order_filter`, shape (time, columns).
+        a (float or array-like): The filter's ``a`` coefficient, scalar or one per column.
+        segments (numpy.ndarray): Segment id of every row, shaped like ``baseflow``.
+        start_values (float or array-like): The value a segment starts from: a scalar, one value per
+            column, or one per row and column (e.g. the streamflow itself).
+
+    Returns:
+        numpy.ndarray: The baseflow with every segment started afresh.
+    """
+    restart = np.zeros(segments.shape, dtype=bool)
+    restart[1:] = segments[1:] != segments[:-1]
+    if not restart.any():
+        return baseflow
+
+    rows = np.arange(len(baseflow))[:, np.newaxis]
+    start = np.maximum.accumulate(np.where(restart, rows, 0), axis=0)
+    columns = np.arange(baseflow.shape[1])
+    start_values = np.broadcast_to(np.asarray(start_values, dtype=np.float64), baseflow.shape)
+    offset = np.where(start > 0, start_values[start, columns] - baseflow[start, columns], 0.0)
+    return baseflow + np.power(a, rows - start) * offset
+
+
+def masked_filter(streamflow, a, c0, c1, initial=None, state=None, segments=None):
+    """
+    Runs :func:`first_order_filter` over the non-NaN values of each column, leaving the input untouched.
+
+    NaNs are skipped rather than filled: the recursion steps from one valid value straight to the
+    next. The output has one value per input value, with NaN where the input is NaN.
+
+    Args:
+        streamflow (array-like): Streamflow values, shape (time,) or (time, columns). Any array-like
+            works, e.g. a pandas Series, a NumPy array or a memoryview; float64 input is not copied.
+        a, c0, c1 (float or array-like): The filter coefficients, as for :func:`first_order_filter`.
+        initial (float or array-like): The first baseflow value. Defaults to the first valid
+            streamflow value of each column.
+        state (dict): Optional saved state from :func:`filter_state` to continue a previous run.
+            Columns whose saved values are NaN start afresh from ``initial``.
+        segments (array-like): Optional segment id of every value, shaped like ``streamflow``, e.g. the
+            'Segment' column of :func:`baseflow.processing.clean_gaps`. The filter restarts at the first
+            valid value of each new segment instead of stepping across the gap before it.
+
+    Returns:
+        numpy.ndarray: A float64 array of baseflow values with the same shape as ``streamflow``.
+    """
+    values = np.asarray(streamflow, dtype=np.float64)
+    if len(values) == 0:
+        return np.empty_like(values)
+
+    packed, order, valid = pack_valid(values.reshape(len(values), -1))
+    start_values = packed if initial is None else initial
+    if initial is None:
+        initial = packed[0]
+    if state is not None:
+        # A NaN in the state means that column has no history yet, so it starts afresh
+        resumed = resume_initial(packed, a, c0, c1, state)
+        initial = np.where(np.isnan(resumed), initial, resumed)
+    filtered = first_order_filter(packed, a, c0, c1, initial)
+    if segments is not None:
+        segments = np.asarray(segments).reshape(packed.shape)
+        if order is not None:
+            segments = np.take_along_axis(segments, order, axis=0)
+        filtered = restart_segments(filtered, a, segments, start_values)
+    return unpack_valid(filtered, order, valid).reshape(values.shape)
+
+
+def resume_initial(streamflow, a, c0, c1, state):
+    """
+    Returns the first baseflow value of a filter that continues from a saved state.
+
+    Args:
+        streamflow (array-like): The new streamflow values, shape (time,) or (time, columns).
+        a, c0, c1 (float or array-like): The filter coefficients, as for :func:`first_order_filter`.
+        state (dict): The last 'streamflow' and 'baseflow' values of the previous run,
+            as returned by :func:`filter_state`.
+
+    Returns:
+        float or numpy.ndarray: The starting value to pass to :func:`first_order_filter`.
+    """
+    streamflow = np.asarray(streamflow, dtype=np.float64)
+    return (np.multiply(a, state['baseflow']) + np.multiply(c0, streamflow[0])
+            + np.multiply(c1, state['streamflow']))
+
+
+def filter_state(streamflow, baseflow, previous=None):
+    """
+    Captures the values a filter needs to resume: the last valid streamflow and its baseflow.
+
+    Args:
+        streamflow (array-like): The streamflow the filter ran on, shape (time,) or (time, columns).
+        baseflow (array-like): The filter's output, aligned with ``streamflow``.
+        previous (dict): Optional state the run itself resumed from. Columns without any valid value
+            in ``streamflow`` keep their previous values, so an all-NaN chunk does not break the chain.
+
+    Returns:
+        dict: 'streamflow' and 'baseflow' as floats, or as lists with one value per column. Columns
+        without a valid value and without a previous state hold NaN. The dict is JSON-serializable
+        so it can be saved between runs.
+
+    Example:
+        .. code-block:: python
+
+            baseflow = eckhardt(history['Discharge'], 0.925, 0.8)
+            state = filter_state(history['Discharge'], baseflow)
+            new_baseflow = eckhardt(new_days['Discharge'], 0.925, 0.8, state=state)
+    """
+    streamflow = np.asarray(streamflow, dtype=np.float64)
+    baseflow = np.asarray(baseflow, dtype=np.float64)
+    single = streamflow.ndim == 1
+    if single:
+        streamflow, baseflow = streamflow[:, np.newaxis], baseflow[:, np.newaxis]
+    valid = ~np.isnan(streamflow)
+    found = valid.any(axis=0)
+
+    values = {'streamflow': np.full(streamflow.shape[1], np.nan), 'baseflow': np.full(streamflow.shape[1], np.nan)}
+    if found.any():
+        last = len(streamflow) - 1 - np.argmax(valid[::-1], axis=0)
+        columns = np.flatnonzero(found)
+        values['streamflow'][columns] = streamflow[last[columns], columns]
+        values['baseflow'][columns] = baseflow[last[columns], columns]
+    if previous is not None:
+        for key in values:
+            kept = np.broadcast_to(np.asarray(previous[key], dtype=np.float64), found.shape)
+            values[key] = np.where(found, values[key], kept)
+
+    if single:
+        return {key: float(value[0]) for key, value in values.items()}
+    return {key: value.tolist() for key, value in values.items()}
@@ -0,0 +1,153 @@
+import numpy as np
+
+from baseflow.batch import _filter_name
+from baseflow.cache import memoize
+from baseflow.engine import linear_recurrence, multi_pass_filter, restart_segments
+from baseflow.instrument import stage
+from baseflow.models import LINEAR_FILTERS, check_parameters
+
+# Columns added by ensemble_frame next to the model columns
+STATISTIC_COLUMNS = {'mean': 'Ensemble Mean', 'spread': 'Ensemble Spread', 'min': 'Ensemble Min',
+                     'max': 'Ensemble Max'}
+
+
+def _column_name(name):
+    return '_'.join(part.capitalize() for part in name.split('_'))
+
+
+def _normalize(specs):
+    normalized = []
+    for spec in specs:
+        model, params, *column = spec
+        name = _filter_name(model)
+        check_parameters(name, params)
+        normalized.append((column[0] if column else _column_name(name), name, dict(params)))
+    columns = [column for column, _, _ in normalized]
+    if len(set(columns)) != len(columns):
+        raise ValueError("Every model needs its own column name; pass (filter, params, name) to tell them apart.")
+    return normalized
+
+
+@memoize
+def _filter_stack(values, specs, segments=None):
+    """
+    Filters one series with every spec into a (models, time) block.
+
+    The valid values are gathered once and the forcing terms of all linear filters are built as
+    one (models, time) array, so each model's recurrence runs over contiguous memory and the series
+    itself is only read once however many linear models there are.
+    """
+    valid = ~np.isnan(values)
+    packed = values[valid]
+    stacked = np.empty((len(specs), len(packed)))
+
+    linear = [i for i, (_, name, _) in enumerate(specs) if name != 'hyd_run']
+    if linear and len(packed):
+        coefficients = np.array([LINEAR_FILTERS[specs[i][1]][0](**specs[i][2]) for i in linear], dtype=np.float64)
+        a, c0, c1 = coefficients.T
+        from_streamflow = np.array([LINEAR_FILTERS[specs[i][1]][1] for i in linear])
+        x = np.multiply(c0[:, np.newaxis], packed)
+        x[:, 1:] += np.multiply(c1[:, np.newaxis], packed[:-1])
+        # The transposed view is column-major, so every column handed to lfilter is contiguous
+        block = linear_recurrence(x.T, a, np.where(from_streamflow, packed[0], 0.0))
+        if segments is not None:
+            packed_segments = np.asarray(segments).reshape(values.shape)[valid][:, np.newaxis]
+            start_values = np.where(from_streamflow, packed[:, np.newaxis], 0.0)
+            block = restart_segments(block, a, np.broadcast_to(packed_segments, block.shape), start_values)
+        stacked[linear] = block.T
+
+    for i, (_, name, params) in enumerate(specs):
+        if name == 'hyd_run' and len(packed):
+            if segments is not None:
+                raise ValueError("hyd_run cannot restart on segments: its backward passes cross segment boundaries.")
+            stacked[i] = multi_pass_filter(packed, params['k'], params['passes'])
+
+    if len(packed) == len(values):
+        return stacked
+    filtered = np.full((len(specs), len(values)), np.nan)
+    filtered[:, valid] = stacked
+    return filtered
+
+
+def run_ensemble(streamflow, specs, segments=None):
+    """
+    Evaluates many baseflow filters on one series in a single pass and summarizes their spread.
+
+    Instead of one call per model, each walking and copying the series again, the series is converted
+    and NaN-packed once and all linear filters are computed together as the rows of one stacked
+    recurrence. The result is one contiguous (time, models) array plus the ensemble statistics.
+
+    Args:
+        streamflow (pandas.Series or array-like): Streamflow values, shape (time,). It is not modified.
+        specs (list of tuple): ``(filter, params)`` or ``(filter, params, name)`` per model. ``filter`` is
+            a filter from :mod:`baseflow.models`, by name or the function itself, and ``params`` a dict
+            of its parameters named as in that function. ``name`` defaults to the capitalized filter
+            name, e.g. 'Lyne_Hollick', and must be given when the same filter appears twice.
+        segments (array-like): Optional segment id of every value, e.g. the 'Segment' column of
+            :func:`baseflow.processing.clean_gaps`; every linear filter restarts at each new segment.
+
+    Returns:
+        dict: 'names' (the model names), 'baseflow' (float64 array of shape (time, models), NaN where
+        the streamflow is NaN, stored column-major so each model's series is contiguous), and the
+        row-wise 'mean', 'spread' (max minus min), 'min' and 'max' over the models, each of shape (time,).
+
+    Example:
+        .. code-block:: python
+
+            specs = [('lyne_hollick', {'alpha': 0.925}),
+                     ('chapman', {'alpha': 0.925, 'beta': 0.075}),
+                     ('eckhardt', {'alpha': 0.8, 'bfi_max': 0.6}),
+                     ('eckhardt', {'alpha': 0.98, 'bfi_max': 0.8}, 'Eckhardt_Slow'),
+                     ('chapman_maxwell', {'k': 0.7})]
+            ensemble = run_ensemble(dataset['Discharge'], specs)
+    """
+    values = np.asarray(streamflow, dtype=np.float64)
+    if values.ndim != 1:
+        raise ValueError("streamflow must be a single series of shape (time,); use batch_filter for many gauges.")
+    specs = _normalize(specs)
+    if not specs:
+        raise ValueError("specs must name at least one filter.")
+
+    # Reducing over the leading axis of the (models, time) block is a few whole-row operations
+    with stage('filter.ensemble', rows=len(values)):
+        stacked = _filter_stack(values, specs, segments)
+    low = stacked.min(axis=0)
+    high = stacked.max(axis=0)
+    return {
+        'names': [column for column, _, _ in specs],
+        'baseflow': stacked.T,
+        'mean': stacked.mean(axis=0),
+        'spread': high - low,
+        'min': low,
+        'max': high,
+    }
+
+
+def ensemble_frame(df, specs, segments=None, statistics=True):
+    """
+    Adds one column per model, and optionally the ensemble statistics, to a station's DataFrame.
+
+    Args:
+        df (pandas.DataFrame): A frame with a 'Discharge' column.
+        specs (list of tuple): The models, as for :func:`run_ensemble`.
+        segments (array-like): Optional segment ids, as for :func:`run_ensemble`.
+        statistics (bool): Also add the 'Ensemble Mean', 'Ensemble Spread', 'Ensemble Min' and
+            'Ensemble Max' columns.
+
+    Returns:
+        pandas.DataFrame: The same DataFrame with the new columns, ready for
+        :func:`baseflow.processing.label_agreement` and :func:`baseflow.plots.plot_discharge_and_models`.
+
+    Example:
+        .. code-block:: python
+
+            dataset_models = ensemble_frame(dataset_models, specs)
+            label_agreement(dataset_models, ['Lyne_Hollick', 'Chapman', 'Eckhardt'], 200)
+    """
+    ensemble = run_ensemble(df['Discharge'], specs, segments)
+    for i, name in enumerate(ensemble['names']):
+        df[name] = ensemble['baseflow'][:, i]
+    if statistics:
+        for key, column in STATISTIC_COLUMNS.items():
+            df[column] = ensemble[key]
+    return df
@@ -0,0 +1,315 @@
+import contextlib
+import copy
+import functools
+import json
+import os
+import re
+import tempfile
+import time
+
+# Stage timings, counters and hooks while instrumentation is on, or None while it is off
+_metrics = None
+
+# Shared do-nothing context returned by stage() while instrumentation is off
+_DISABLED = contextlib.nullcontext()
+
+
+def enable_metrics(hooks=()):
+    """
+    Turns on timing of processing stages and counting of rows and bytes.
+
+    While instrumentation is off every hook point costs one global lookup, so it can stay in hot
+    paths. Enabling again replaces the hooks and resets every timing and counter.
+
+    Stages recorded by the package are 'download', 'parse', 'persist', 'clean', 'dates',
+    'calendar', 'quantiles', 'label' and one 'filter.<name>' per filter. Stages can nest, e.g. a filter called
+    inside a pipeline step, and each one records its own inclusive time.
+
+    Args:
+        hooks (iterable of callable): Functions called as ``hook(stage, seconds, rows)`` each time a
+            stage ends, e.g. to forward timings to a tracing system. See :func:`add_hook`.
+
+    Example:
+        .. code-block:: python
+
+            enable_metrics()
+            dataset = fetch_and_process_usgs_data('01636500', '2019-06-10', '2023-10-07')
+            dataset['Eckhardt'] = eckhardt(dataset['Discharge'], 0.925, 0.8)
+            export_metrics('metrics.prom')
+    """
+    global _metrics
+    _metrics = {'stages': {}, 'counters': {}, 'hooks': list(hooks)}
+
+
+def disable_metrics():
+    """Turns instrumentation off and drops everything recorded."""
+    global _metrics
+    _metrics = None
+
+
+def metrics_enabled():
+    """Returns True while instrumentation is on."""
+    return _metrics is not None
+
+
+def clear_metrics():
+    """Resets every stage timing and counter, keeping instrumentation on and the hooks registered."""
+    if _metrics is not None:
+        _metrics['stages'].clear()
+        _metrics['counters'].clear()
+
+
+def add_hook(hook):
+    """
+    Registers a function called as ``hook(stage, seconds, rows)`` each time a stage ends.
+
+    Args:
+        hook (callable): The function. ``rows`` is None for stages that do not report rows.
+    """
+    if _metrics is not None:
+        _metrics['hooks'].append(hook)
+
+
+def metrics_info(reset=False):
+    """
+    Reports everything recorded so far.
+
+    Args:
+        reset (bool): Also clear the timings and counters, e.g. to hand a worker's metrics to the
+            parent process once per task.
+
+    Returns:
+        dict: 'enabled'; 'stages', with 'calls', 'seconds', 'max_seconds' and 'rows' per stage; and
+        'counters', e.g. 'bytes_downloaded' and 'filter.<name>.rejected' for calls whose parameters
+        failed validation.
+    """
+    if _metrics is None:
+        return {'enabled': False}
+    snapshot = {'enabled': True, 'stages': copy.deepcopy(_metrics['stages']), 'counters': dict(_metrics['counters'])}
+    if reset:
+        clear_metrics()
+    return snapshot
+
+
+def merge_metrics(snapshot):
+    """
+    Adds a snapshot from :func:`metrics_info`, e.g. one taken in a worker process, to this process's metrics.
+
+    Args:
+        snapshot (dict): The snapshot to add. Disabled snapshots are ignored.
+    """
+    if _metrics is None or not snapshot.get('enabled'):
+        return
+    for name, values in snapshot['stages'].items():
+        stage_metrics = _stage_metrics(name)
+        stage_metrics['calls'] += values['calls']
+        stage_metrics['seconds'] += values['seconds']
+        stage_metrics['max_seconds'] = max(stage_metrics['max_seconds'], values['max_seconds'])
+        stage_metrics['rows'] += values['rows']
+    for name, value in snapshot['counters'].items():
+        count(name, value)
+
+
+def _stage_metrics(name):
+    stages = _metrics['stages']
+    if name not in stages:
+        stages[name] = {'calls': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'rows': 0}
+    return stages[name]
+
+
+def _record(name, seconds, rows):
+    stage_metrics = _stage_metrics(name)
+    stage_metrics['calls'] += 1
+    stage_metrics['seconds'] += seconds
+    stage_metrics['max_seconds'] = max(stage_metrics['max_seconds'], seconds)
+    if rows is not None:
+        stage_metrics['rows'] += rows
+    for hook in _metrics['hooks']:
+        hook(name, seconds, rows)
+
+
+@contextlib.contextmanager
+def _timer(name, rows):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        # Instrumentation may have been turned off inside the stage
+        if _metrics is not None:
+            _record(name, time.perf_counter() - start, rows)
+
+
+def stage(name, rows=None):
+    """
+    Times a block of code as one call of a stage.
+
+    Args:
+        name (str): The stage, e.g. 'parse' or 'filter.eckhardt'.
+        rows (int): Optional number of rows the block processes, added to the stage's row count.
+
+    Returns:
+        A context manager; a shared no-op one while instrumentation is off.
+
+    Example:
+        .. code-block:: python
+
+            with stage('quantiles', rows=len(df)):
+                df = quantiles(df, 'Month', 0.9)
+    """
+    if _metrics is None:
+        return _DISABLED
+    return _timer(name, rows)
+
+
+def count(name, value=1):
+    """
+    Adds to a counter, e.g. 'bytes_downloaded'. Does nothing while instrumentation is off.
+
+    Args:
+        name (str): The counter.
+        value (int or float): The amount to add.
+    """
+    if _metrics is not None:
+        counters = _metrics['counters']
+        counters[name] = counters.get(name, 0) + value
+
+
+def _length(value):
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def timed(name):
+    """
+    Decorates a function so each call is timed as one call of a stage.
+
+    The number of rows is taken from the length of the first argument. A call that returns None, which
+    is how the filters in :mod:`baseflow.models` report invalid parameters, also increments the
+    '<name>.rejected' counter.
+
+    Args:
+        name (str): The stage.
+
+    Returns:
+        callable: The decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _metrics is None:
+                return function(*args, **kwargs)
+            with _timer(name, _length(args[0]) if args else None):
+                result = function(*args, **kwargs)
+            if result is None:
+                count(f'{name}.rejected')
+            return result
+
+        return wrapper
+
+    return decorator
+
+
+class _CountingStream:
+    """A read-only stream wrapper that adds every byte read to a counter."""
+
+    def __init__(self, stream, counter):
+        self._stream = stream
+        self._counter = counter
+
+    def read(self, *args):
+        data = self._stream.read(*args)
+        count(self._counter, len(data))
+        return data
+
+    def readline(self, *args):
+        data = self._stream.readline(*args)
+        count(self._counter, len(data))
+        return data
+
+    def __iter__(self):
+        return iter(self.readline, b'')
+
+    def __enter__(self):
+        self._stream.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self._stream.__exit__(*exc_info)
+
+    def __getattr__(self, name):
+        return getattr(self._stream, name)
+
+
+def counting_stream(stream, counter='bytes_downloaded'):
+    """
+    Wraps a binary stream so the bytes read from it are counted.
+
+    Args:
+        stream (file-like): The stream, e.g. an HTTP response.
+        counter (str): The counter the bytes are added to.
+
+    Returns:
+        file-like: The wrapped stream, or ``stream`` itself while instrumentation is off.
+    """
+    if _metrics is None:
+        return stream
+    return _CountingStream(stream, counter)
+
+
+def _metric_name(name):
+    return re.sub(r'[^a-zA-Z0-9_]', '_', name)
+
+
+def prometheus_text(snapshot=None):
+    """
+    Formats metrics in the Prometheus text exposition format.
+
+    Args:
+        snapshot (dict): A snapshot from :func:`metrics_info`; defaults to the current metrics.
+
+    Returns:
+        str: Stage metrics as ``baseflow_stage_*{stage="..."}`` series and every counter as
+        ``baseflow_<counter>_total``.
+    """
+    snapshot = snapshot or metrics_info()
+    if not snapshot.get('enabled'):
+        return ''
+
+    families = [
+        ('calls', 'baseflow_stage_calls_total', 'counter', 'Number of times each stage ran.'),
+        ('seconds', 'baseflow_stage_seconds_total', 'counter', 'Seconds spent in each stage.'),
+        ('max_seconds', 'baseflow_stage_max_seconds', 'gauge', 'Longest single run of each stage.'),
+        ('rows', 'baseflow_stage_rows_total', 'counter', 'Rows processed by each stage.'),
+    ]
+    lines = []
+    for key, metric, kind, description in families:
+        lines += [f'# HELP {metric} {description}', f'# TYPE {metric} {kind}']
+        lines += [f'{metric}{{stage="{name}"}} {values[key]}' for name, values in sorted(snapshot['stages'].items())]
+    for name, value in sorted(snapshot['counters'].items()):
+        metric = f'baseflow_{_metric_name(name)}_total'
+        lines += [f'# TYPE {metric} counter', f'{metric} {value}']
+    return '\n'.join(lines) + '\n'
+
+
+def export_metrics(path, format=None):
+    """
+    Writes the current metrics to a file, replacing it atomically so a scraper never reads half a file.
+
+    Args:
+        path (str): The output file.
+        format (str): 'json' or 'prometheus'. Defaults to 'json' for '.json' files and 'prometheus'
+            otherwise, e.g. for '.prom' files read by the node exporter's textfile collector.
+    """
+    format = format or ('json' if path.endswith('.json') else 'prometheus')
+    if format not in ('json', 'prometheus'):
+        raise ValueError("format must be 'json' or 'prometheus'.")
+    text = json.dumps(metrics_info(), indent=2) if format == 'json' else prometheus_text()
+
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=folder, suffix='.part')
+    with os.fdopen(descriptor, 'w') as file:
+        file.write(text)
+    os.replace(temporary, path)
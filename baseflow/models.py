@@ -1,34 +1,63 @@
 import numpy as np
 
+from baseflow.cache import memoize
+from baseflow.engine import filter_state, masked_filter, multi_pass_filter, pack_valid, unpack_valid
+from baseflow.instrument import stage, timed
 
-def lyne_hollick(streamflow_list, alpha):
-"""
-    Calculates baseflow approximations using the Lyne and Hollick equation.
-    
-    Args:
-        streamflow_list (pandas series): A list of streamflow values
-        alpha (float): Catchment constant between 0 and 1
-    
-    Returns:
-        list: A timeseries list of baseflow values
-    
-    Example:
-        .. code-block:: python
-    
-            import pandas as pd
-            discharge_time_series = pd.read_csv("/my/sample/file.csv")
-            alpha = 0.925
-            baseflow = lyne_hollick(discharge_time_series['Discharge'], alpha)
+
+def _run_filter(streamflow_list, coefficients, initial=None, state=None, segments=None):
+    # NaNs are skipped in place rather than dropped, so the input is never modified and the output
+    # keeps one value per streamflow value
+    return masked_filter(streamflow_list, *coefficients, initial, state, segments)
+
+
+def _lyne_hollick_coefficients(alpha):
+    return alpha, (1 - alpha) / 2, (1 - alpha) / 2
+
+
+def _chapman_coefficients(alpha, beta=None):
+    return (3 * alpha - 1) / (3 - alpha), (1 - alpha) / (3 - alpha), (1 - alpha) / (3 - alpha)
+
+
+def _eckhardt_coefficients(alpha, bfi_max):
+    denominator = 1 - alpha * bfi_max
+    return (1 - bfi_max) * alpha / denominator, (1 - alpha) * bfi_max / denominator, 0.0
+
+
+def _what_coefficients(BFImax, alpha):
+    return _eckhardt_coefficients(alpha, BFImax)
+
+
+def _chapman_maxwell_coefficients(k):
+    return 1 / (2 - k), (1 - k) / (2 - k), 0.0
+
+
+def _boughton_coefficients(k, C):
+    return k / (1 + C), C / (1 + C), 0.0
+
+
+def _furey_gupta_coefficients(gamma, c1, c3):
+    return 1 - gamma - gamma * (c3 / c1), 0.0, gamma * (c3 / c1)
+
+
+@timed('filter.lyne_hollick')
+@memoize
+def lyne_hollick(streamflow_list, alpha, state=None, segments=None):
     """
-        """
     Calculates baseflow approximations using the Lyne and Hollick equation.
 
     Args:
-        streamflow_list (pandas series): A list of streamflow values
+        streamflow_list (pandas series): A list of streamflow values. Any array-like works; it is not
+            modified.
         alpha (float): Catchment constant between 0 and 1
+        state (dict): Optional saved state from :func:`baseflow.engine.filter_state`. When given, the
+            filter continues from the previous run instead of starting at the first streamflow value.
+        segments (array-like): Optional segment id of every streamflow value, e.g. the 'Segment' column
+            of :func:`baseflow.processing.clean_gaps`. The filter restarts at each new segment.
 
     Returns:
-        list: A timeseries list of baseflow values
+        numpy.ndarray: A timeseries array of baseflow values, one per streamflow value and NaN where
+        the streamflow is NaN
 
     Example:
         .. code-block:: python
@@ -44,35 +73,28 @@ def lyne_hollick(streamflow_list, alpha):
         print("Alpha must be between 0 and 1.")
 
     else:
-        # Get rid of all NaNs in dataframe and then reset the new first row to the first index
-        streamflow_list.dropna(inplace=True)
-        streamflow_list.reset_index(drop=True, inplace=True)
-
         # Assume the first baseflow value is equal to the first streamflow value to give you a starting point
-        baseflow_value = streamflow_list[0]
-        baseflow_list = [baseflow_value]
+        return _run_filter(streamflow_list, _lyne_hollick_coefficients(alpha), state=state, segments=segments)
 
-        # zip makes a list of pairs so that the function can use current and previous streamflow at the same time
-        for currentStreamflow, prevStreamflow in zip((streamflow_list)[1:], (streamflow_list)[:-1]):
-            # Equation
-            baseflow_value = currentStreamflow - (alpha * (prevStreamflow - baseflow_value) + ((1 + alpha) / 2) * (
-                    currentStreamflow - prevStreamflow))
-            baseflow_list.append(baseflow_value)
 
-        # Create the new column in the dataframe
-        return baseflow_list
-
-
-def chapman(streamflow_list, alpha, beta):
+@timed('filter.chapman')
+@memoize
+def chapman(streamflow_list, alpha, beta, state=None, segments=None):
     '''
     Calculates baseflow approximations using the Chapman equation.
-    
+
     Args:
-        streamflow_list (pandas series): A list of streamflow values
+        streamflow_list (pandas series): A list of streamflow values. Any array-like works; it is not
+            modified.
         alpha (float): Hydrological recession constant between 0 and 1
+        state (dict): Optional saved state from :func:`baseflow.engine.filter_state`. When given, the
+            filter continues from the previous run instead of starting at the first streamflow value.
+        segments (array-like): Optional segment id of every streamflow value, e.g. the 'Segment' column
+            of :func:`baseflow.processing.clean_gaps`. The filter restarts at each new segment.
 
     Returns:
-        list: A timeseries list of baseflow values
+        numpy.ndarray: A timeseries array of baseflow values, one per streamflow value and NaN where
+        the streamflow is NaN
 
     Example:
         .. code-block:: python
@@ -86,31 +108,28 @@ def chapman(streamflow_list, alpha, beta):
         print("Alpha must be between 0 and 1.")
 
     else:
-        streamflow_list.dropna(inplace=True)
-        streamflow_list.reset_index(drop=True, inplace=True)
+        return _run_filter(streamflow_list, _chapman_coefficients(alpha), state=state, segments=segments)
 
-        baseflow_value = streamflow_list[0]
-        baseflow_list = [baseflow_value]
 
-        for currentStreamflow, prevStreamflow in zip((streamflow_list)[1:], (streamflow_list)[:-1]):
-            baseflow_value = ((3 * alpha - 1) / (3 - alpha)) * baseflow_value + ((1 - alpha) / (3 - alpha)) * (
-                    currentStreamflow + prevStreamflow)
-            baseflow_list.append(baseflow_value)
-
-        return baseflow_list
-
-
-def eckhardt(streamflow_list, alpha, bfi_max):
+@timed('filter.eckhardt')
+@memoize
+def eckhardt(streamflow_list, alpha, bfi_max, state=None, segments=None):
     '''
     Calculates baseflow approximations using the Eckhardt equation.
-    
+
     Args:
-        streamflow_list (pandas series): A list of streamflow values
+        streamflow_list (pandas series): A list of streamflow values. Any array-like works; it is not
+            modified.
         alpha (float): Hydrological recession constant between 0 and 1
         bfi_max: BFImax is the maximum attainable value of the baseflow index, indicating the long-term ratio of baseflow to total streamflow computed using a filtering algorithm. It's always less than 1, implying the absence of direct runoff in a catchment. This suggests either highly permeable soil or flat terrain.
+        state (dict): Optional saved state from :func:`baseflow.engine.filter_state`. When given, the
+            filter continues from the previous run instead of starting at the first streamflow value.
+        segments (array-like): Optional segment id of every streamflow value, e.g. the 'Segment' column
+            of :func:`baseflow.processing.clean_gaps`. The filter restarts at each new segment.
 
     Returns:
-        list: A timeseries list of baseflow values
+        numpy.ndarray: A timeseries array of baseflow values, one per streamflow value and NaN where
+        the streamflow is NaN
 
     Example:
         .. code-block:: python
@@ -120,37 +139,34 @@ def eckhardt(streamflow_list, alpha, bfi_max):
             alpha = 0.925
             bfi_max = 0.8
             baseflow = eckhardt(discharge_time_series['Discharge'], alpha, bfi_max)
-    '''    
+    '''
     if alpha <= 0 or alpha >= 1:
         print("Alpha must be between 0 and 1.")
     if bfi_max <= 0 or bfi_max >= 1:
         print("BFI max must be between 0 and 1.")
 
     else:
-        streamflow_list.dropna(inplace=True)
-        streamflow_list.reset_index(drop=True, inplace=True)
-
-        baseflow_value = streamflow_list[0]
-        baseflow_list = [baseflow_value]
-
-        for currentStreamflow in streamflow_list[1:]:
-            baseflow_value = ((1 - bfi_max) * alpha * baseflow_value + (1 - alpha) * bfi_max * currentStreamflow) / (
-                    1 - (alpha * bfi_max))
-            baseflow_list.append(baseflow_value)
-
-        return baseflow_list
+        return _run_filter(streamflow_list, _eckhardt_coefficients(alpha, bfi_max), state=state, segments=segments)
 
 
-def chapman_maxwell(streamflow_list, k):
+@timed('filter.chapman_maxwell')
+@memoize
+def chapman_maxwell(streamflow_list, k, state=None, segments=None):
     """
     Separates baseflow from a streamflow hydrograph using the Chapman & Maxwell method.
 
     Args:
-        streamflow_list (pandas series): A list of streamflow values in chronological order.
+        streamflow_list (pandas series): A list of streamflow values in chronological order. Any
+            array-like works; it is not modified.
         k (float): A smoothing parameter between 0 and 1.
+        state (dict): Optional saved state from :func:`baseflow.engine.filter_state`. When given, the
+            filter continues from the previous run instead of starting at the first streamflow value.
+        segments (array-like): Optional segment id of every streamflow value, e.g. the 'Segment' column
+            of :func:`baseflow.processing.clean_gaps`. The filter restarts at each new segment.
 
     Returns:
-        list: A timeseries list of baseflow values.
+        numpy.ndarray: A timeseries array of baseflow values, one per streamflow value and NaN where
+        the streamflow is NaN.
 
     Example:
         .. code-block:: python
@@ -165,37 +181,27 @@ def chapman_maxwell(streamflow_list, k):
         return None
 
     else:
-        streamflow_list.dropna(inplace=True)
-        streamflow_list.reset_index(drop=True, inplace=True)
+        return _run_filter(streamflow_list, _chapman_maxwell_coefficients(k), state=state, segments=segments)
 
-        baseflow_value = streamflow_list[0]
-        baseflow_list = [baseflow_value]
-        quickflow_list = []
-
-        for currentStreamflow in streamflow_list[1:]:
-            baseflow_value = (1 / (2 - k)) * baseflow_value + ((1 - k) / (2 - k)) * currentStreamflow
-            baseflow_list.append(baseflow_value)
-
-        for streamflow, baseflow in zip(streamflow_list, baseflow_list):
-            quickflow = streamflow - baseflow
-            # Check if quickflow is negative and set it to zero if it is
-            quickflow = max(0, quickflow)
-            quickflow_list.append(quickflow)
-
-        return baseflow_list
-    
 
+@timed('filter.hyd_run')
+@memoize
 def hyd_run(streamflow_list, k, passes):
     """
     Separates baseflow from a streamflow hydrograph using a digital filter method.
 
+    Passes alternate forward and backward, and each pass filters the baseflow of the one before
+    (see :func:`baseflow.engine.multi_pass_filter`).
+
     Args:
         streamflow_list (pandas.Series): A pandas Series of streamflow values in chronological order.
+            Any array-like works; it is not modified.
         k (float): A filter coefficient between 0 and 1 (typically 0.9).
         passes (int): Number of times the filter passes through the data (typically 4).
 
     Returns:
-        list: A list of baseflow values.
+        numpy.ndarray: An array of baseflow values, one per streamflow value and NaN where the
+        streamflow is NaN.
 
     Example:
         .. code-block:: python
@@ -206,94 +212,158 @@ def hyd_run(streamflow_list, k, passes):
             passes = 4
             baseflow_list = hyd_run(discharge_time_series['Discharge'], k, passes)
     """
-    # Convert to numpy array and handle NaN values
-    Q = streamflow_list.to_numpy()
-    Q = Q[~np.isnan(Q)]
+    Q = np.asarray(streamflow_list, dtype=np.float64)
+    if len(Q) == 0:
+        return np.empty(Q.shape)
 
-    # Initialize baseflow list
-    baseflow_list = []
-    baseflow_list.append(Q[0])  # Set first baseflow value to first streamflow value
+    # Filter the non-NaN values as one contiguous series, then put the results back in place
+    packed, order, valid = pack_valid(Q.reshape(len(Q), -1))
+    baseflow = multi_pass_filter(packed, k, passes, lengths=valid.sum(axis=0))
+    return unpack_valid(baseflow, order, valid).reshape(Q.shape)
 
-    for p in range(1, passes + 1):
-        # Forward and backward pass
-        if p % 2 == 1:
-            start, end, step = 0, len(Q), 1
-        else:
-            start, end, step = len(Q) - 1, -1, -1
 
-        for i in range(start + step, end, step):
-            tmp = k * baseflow_list[i - step] + (1 - k) * (Q[i] + Q[i - step]) / 2
-            baseflow_list.append(min(tmp, Q[i]))
+@timed('filter.what')
+@memoize(series=lambda df: df['streamflow'])
+def what(df, BFImax, alpha, state=None, segments=None):
+    streamflow = df['streamflow'].to_numpy(dtype=np.float64)
 
-    return baseflow_list
-
-def what(df, BFImax, alpha):
-    streamflow = df['streamflow'].values
-    baseflow = np.zeros_like(streamflow)
-
-    for t in range(1, len(streamflow)):
-        baseflow[t] = ((1 - BFImax) * alpha * baseflow[t-1] + (1 - alpha) * BFImax * streamflow[t]) / (1 - alpha * BFImax)
+    # WHAT starts from zero baseflow and then follows the Eckhardt recursion
+    baseflow = _run_filter(streamflow, _what_coefficients(BFImax, alpha), 0.0, state, segments)
 
     quickflow = streamflow - baseflow
 
     return baseflow, quickflow
 
+@timed('filter.tr55')
 def tr55(streamflow_list, precipitation, CN, Ia = None):
-    if Ia == None:
+    if Ia is None:
         Ia = 200/CN - 2
 
-    streamflow_list.dropna(inplace=True)
-    streamflow_list.reset_index(drop=True, inplace=True)
-
-    baseflow_value = streamflow_list[0]
-    baseflow_list = [baseflow_value]
+    Q = np.asarray(streamflow_list, dtype=np.float64)
+    P = np.asarray(precipitation, dtype=np.float64)[:len(Q)]
 
-    for currentStreamflow, prec_value in zip((streamflow_list)[1:], precipitation[1:]):
-        baseflow_value = currentStreamflow - ((prec_value - Ia)**2 / (prec_value - Ia + (1000/CN - 10)))
-
-        baseflow_list.append(baseflow_value)
+    # Subtract the TR-55 runoff from every value after the first; NaN streamflow stays NaN
+    baseflow_list = np.empty_like(Q)
+    baseflow_list[1:] = Q[1:] - (P[1:] - Ia)**2 / (P[1:] - Ia + (1000/CN - 10))
+    baseflow_list[:1] = Q[:1]
 
     return baseflow_list
 
-def boughton(streamflow_list, k, C):
+@timed('filter.boughton')
+@memoize
+def boughton(streamflow_list, k, C, state=None, segments=None):
     if k < 0 or k > 1:
         print("k must be between 0 and 1.")
     if C < 0:
         print("C must be a positive value.")
 
     else:
-        streamflow_list.dropna(inplace=True)
-        streamflow_list.reset_index(drop=True, inplace=True)
-
-        baseflow_value = streamflow_list[0]
-        baseflow_list = [baseflow_value]
-
-        for currentStreamflow in streamflow_list[1:]:
-            baseflow_value = (k/(1 + C)) * baseflow_value + (C/(1 + C)) * currentStreamflow
-            baseflow_list.append(baseflow_value)
-
-        return baseflow_list
+        return _run_filter(streamflow_list, _boughton_coefficients(k, C), state=state, segments=segments)
 
-def furey_gupta(streamflow_list, gamma, c1, c3):
+@timed('filter.furey_gupta')
+@memoize
+def furey_gupta(streamflow_list, gamma, c1, c3, state=None, segments=None):
     if gamma < 0 or gamma > 1:
         print("Gamma must be between 0 and 1.")
 
     else:
-        baseflow_list = []
+        # Initial baseflow value assumed to be same as streamflow
+        return _run_filter(streamflow_list, _furey_gupta_coefficients(gamma, c1, c3), state=state, segments=segments)
+
+
+# Linear filters by name: (coefficient function, whether the first baseflow value is the first streamflow value)
+LINEAR_FILTERS = {
+    'lyne_hollick': (_lyne_hollick_coefficients, True),
+    'chapman': (_chapman_coefficients, True),
+    'eckhardt': (_eckhardt_coefficients, True),
+    'chapman_maxwell': (_chapman_maxwell_coefficients, True),
+    'boughton': (_boughton_coefficients, True),
+    'furey_gupta': (_furey_gupta_coefficients, True),
+    'what': (_what_coefficients, False),
+}
+
+
+# Parameter ranges of the linear filters as (low, high, whether the bounds are allowed), the same checks the
+# filter functions make; WHAT shares Eckhardt's recursion and so its bounds
+PARAMETER_RANGES = {
+    'lyne_hollick': {'alpha': (0, 1, True)},
+    'chapman': {'alpha': (0, 1, True)},
+    'eckhardt': {'alpha': (0, 1, False), 'bfi_max': (0, 1, False)},
+    'chapman_maxwell': {'k': (0, 1, True)},
+    'boughton': {'k': (0, 1, True), 'C': (0, np.inf, True)},
+    'furey_gupta': {'gamma': (0, 1, True)},
+    'what': {'BFImax': (0, 1, False), 'alpha': (0, 1, False)},
+}
+
+
+def check_parameters(name, params):
+    """
+    Checks the parameters of a linear filter against :data:`PARAMETER_RANGES`.
 
-        streamflow_list.dropna(inplace=True)
-        streamflow_list.reset_index(drop=True, inplace=True)
+    The vectorized paths (:func:`baseflow.batch.batch_filter`, :func:`baseflow.ensemble.run_ensemble`,
+    :func:`baseflow.sweep.parameter_sweep` and :func:`iter_filter`) build the recursion coefficients
+    directly, so they call this instead of the checks in the filter functions.
 
-        # Initial baseflow value assumed to be same as streamflow
-        baseflow_list.append(streamflow_list[0])
+    Args:
+        name (str): A filter named in :data:`LINEAR_FILTERS`.
+        params (dict): Its parameters; each may be a scalar or an array, e.g. one value per column.
 
-        for i in range(1, len(streamflow_list)):
-            Q_t_minus_1 = streamflow_list.at[i - 1]
-            b_t_minus_1 = baseflow_list[-1]
+    Raises:
+        ValueError: If any value is out of range or NaN, naming the positions of array values.
+    """
+    for parameter, (low, high, closed) in PARAMETER_RANGES.get(name, {}).items():
+        if parameter not in params:
+            continue
+        values = np.asarray(params[parameter], dtype=np.float64)
+        inside = (values >= low) & (values <= high) if closed else (values > low) & (values < high)
+        if not inside.all():
+            bounds = f'at least {low}' if high == np.inf else f"between {low} and {high}{'' if closed else ', exclusive'}"
+            where = '' if values.ndim == 0 else f" (positions {', '.join(map(str, np.flatnonzero(~inside.ravel())))})"
+            raise ValueError(f"{name}: {parameter} must be {bounds}{where}.")
+
+
+def iter_filter(chunks, model, state=None, **params):
+    """
+    Runs a linear filter over a record that arrives in chunks, carrying the filter state across chunks.
 
-            bt = (1 - gamma) * b_t_minus_1 + gamma * (c3 / c1) * (Q_t_minus_1 - b_t_minus_1)
-            baseflow_list.append(bt)
+    Only one chunk is held at a time, so memory stays bounded however long the record is, and the
+    result is the same as filtering the whole record at once. Chunks can come from
+    :func:`baseflow.rdb.iter_rdb`, from the years of :func:`baseflow.store.open_station` or from any
+    other reader.
 
-        return baseflow_list
+    Args:
+        chunks (iterable of array-like): Consecutive pieces of the streamflow record, each of shape
+            (time,) or (time, gauges).
+        model (str or function): A filter named in :data:`LINEAR_FILTERS`, or the function itself.
+            hyd_run is not supported: its backward passes need the whole record.
+        state (dict): Optional saved state from :func:`baseflow.engine.filter_state` to continue an
+            earlier run.
+        **params: The filter's parameters, named as in the filter function.
 
+    Yields:
+        numpy.ndarray: The baseflow of each chunk, aligned with it and NaN where it is NaN.
 
+    Example:
+        .. code-block:: python
+
+            import urllib.request
+            from baseflow.download import nwis_iv_url
+            from baseflow.rdb import iter_rdb
+            with urllib.request.urlopen(nwis_iv_url('01636500', '2000-01-01', '2023-12-31')) as response:
+                chunks = (chunk['Discharge'] for chunk in iter_rdb(response))
+                for baseflow in iter_filter(chunks, 'eckhardt', alpha=0.995, bfi_max=0.8):
+                    ...
+    """
+    name = getattr(model, '__name__', model)
+    if name not in LINEAR_FILTERS:
+        raise ValueError(f"Chunked filtering supports: {', '.join(LINEAR_FILTERS)}. Got '{name}'.")
+    check_parameters(name, params)
+    coefficient_function, start_from_streamflow = LINEAR_FILTERS[name]
+    coefficients = coefficient_function(**params)
+
+    for chunk in chunks:
+        streamflow = np.asarray(chunk, dtype=np.float64)
+        with stage(f'filter.{name}', rows=len(streamflow)):
+            baseflow = masked_filter(streamflow, *coefficients, None if start_from_streamflow else 0.0, state)
+        state = filter_state(streamflow, baseflow, previous=state)
+        yield baseflow
@@ -0,0 +1,239 @@
+import collections
+
+import numpy as np
+import pandas as pd
+
+from baseflow.instrument import stage
+
+# Period keys of a calendar index and the compact dtypes they are stored in
+PERIOD_KEYS = {'year': np.int16, 'month': np.int8, 'day': np.int8, 'week': np.int8, 'day_of_year': np.int16,
+               'season': np.int8}
+
+# Day-of-year bounds of seasons 2, 3 and 4 (March 20, June 20, September 22, December 21); other days are season 1
+SEASON_BOUNDS = [80, 172, 266, 356]
+
+# Calendar indexes shared by every caller with the same dates, most recently used last
+_indexes = collections.OrderedDict()
+MAX_INDEXES = 32
+
+
+def _season(day_of_year):
+    return np.array([1, 2, 3, 4, 1], dtype=np.int8)[np.digitize(day_of_year, SEASON_BOUNDS)]
+
+
+def _decode(days):
+    """Decodes days since 1970-01-01 into every period key without going through datetime objects."""
+    months = days.astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)
+    year = months // 12 + 1970
+    year_start = (year - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+    day_of_year = days - year_start + 1
+
+    # ISO weeks belong to the year of their Thursday; 1970-01-01 was a Thursday
+    thursday = days - (days + 3) % 7 + 3
+    iso_year_start = thursday.astype('datetime64[D]').astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+
+    keys = {
+        'year': year,
+        'month': months % 12 + 1,
+        'day': days - months.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64) + 1,
+        'week': (thursday - iso_year_start) // 7 + 1,
+        'day_of_year': day_of_year,
+        'season': _season(day_of_year),
+    }
+    return {key: values.astype(PERIOD_KEYS[key]) for key, values in keys.items()}
+
+
+def _index_key(values):
+    stamps = values.view(np.int64)
+    steps = np.diff(stamps)
+    # A regular range, e.g. daily values, is identified by its start, step and length without hashing it
+    if len(stamps) > 1 and (steps == steps[0]).all():
+        return values.dtype.str, int(stamps[0]), int(steps[0]), len(stamps)
+    from baseflow.cache import fingerprint
+    return values.dtype.str, fingerprint(stamps)
+
+
+def calendar_index(dates):
+    """
+    Decodes dates into compact period keys once and shares the result across callers.
+
+    Every key is a small integer array: 'year' and 'day_of_year' as int16; 'month', 'day' (of the
+    month), 'week' (ISO week) and 'season' (1 to 4, split at :data:`SEASON_BOUNDS`) as int8. Indexes
+    are kept per date range, so stations with the same dates, and every step run on one station,
+    reuse the same arrays instead of decoding datetimes again. Time zone-aware dates are decoded in
+    their local time, like the ``.dt`` accessors.
+
+    Args:
+        dates (pandas.Series, pandas.DatetimeIndex or array-like): The dates.
+
+    Returns:
+        dict: 'size', 'valid' (False for NaT, whose keys are 0) and one read-only array per period
+        key. Do not modify it; it is shared.
+
+    Example:
+        .. code-block:: python
+
+            calendar = calendar_index(dataset['Date'])
+            monthly = period_groups(calendar, 'year', 'month')
+            dataset['Monthly Mean'] = broadcast_groups(monthly, reduce_groups(monthly, dataset['Discharge']))
+    """
+    index = pd.DatetimeIndex(dates)
+    if index.tz is not None:
+        index = index.tz_localize(None)
+    values = index.to_numpy()
+
+    key = _index_key(values)
+    calendar = _indexes.get(key)
+    if calendar is not None:
+        _indexes.move_to_end(key)
+        return calendar
+
+    with stage('calendar', rows=len(values)):
+        valid = ~np.isnat(values)
+        days = np.zeros(len(values), dtype=np.int64)
+        days[valid] = values[valid].astype('datetime64[D]').astype(np.int64)
+        calendar = {'size': len(values), 'valid': valid, **_decode(days), 'groups': {}}
+        for name in PERIOD_KEYS:
+            calendar[name][~valid] = 0
+        for name in ['valid', *PERIOD_KEYS]:
+            calendar[name].flags.writeable = False
+
+    _indexes[key] = calendar
+    while len(_indexes) > MAX_INDEXES:
+        _indexes.popitem(last=False)
+    return calendar
+
+
+def clear_calendar_indexes():
+    """Drops every shared calendar index."""
+    _indexes.clear()
+
+
+def _dense_groups(combined, valid, labels):
+    """
+    Numbers the distinct values of non-negative integer keys 0, 1, ... in increasing order.
+
+    ``labels`` maps the distinct values to the label arrays of their groups.
+    """
+    present = np.bincount(combined[valid]) > 0 if valid.any() else np.zeros(0, dtype=bool)
+    count = int(present.sum())
+    dtype = np.int16 if count < 2 ** 15 else np.int32
+    remap = (np.cumsum(present) - 1).astype(dtype)
+    codes = np.full(len(combined), count, dtype=dtype)
+    codes[valid] = remap[combined[valid]]
+
+    counts = np.bincount(codes, minlength=count + 1)[:count]
+    return {
+        'codes': codes,
+        'count': count,
+        'labels': labels(np.flatnonzero(present)),
+        'counts': counts,
+        'offsets': np.concatenate(([0], np.cumsum(counts)[:-1])),
+    }
+
+
+def period_groups(calendar, *keys):
+    """
+    Groups the rows of a calendar index by one or more period keys, e.g. ('year', 'month').
+
+    Groups are numbered in increasing key order by offsetting and counting the integer keys, without
+    hashing or sorting, and are kept on the shared index so each grouping is only built once.
+
+    Args:
+        calendar (dict): An index from :func:`calendar_index`.
+        *keys (str): Period keys from :data:`PERIOD_KEYS`.
+
+    Returns:
+        dict: 'codes' (the group of every row; NaT rows get ``count``), 'count' (the number of groups),
+        'labels' (the value of every key for each group), 'counts' (rows per group) and 'offsets'
+        (where each group starts once rows are sorted by group). Do not modify it; it is shared.
+    """
+    unknown = [key for key in keys if key not in PERIOD_KEYS]
+    if not keys or unknown:
+        raise ValueError(f"keys must be one or more of: {', '.join(PERIOD_KEYS)}.")
+
+    groups = calendar['groups'].get(keys)
+    if groups is None:
+        valid = calendar['valid']
+        lows = [int(calendar[key][valid].min()) if valid.any() else 0 for key in keys]
+        widths = [int(calendar[key][valid].max()) - low + 1 if valid.any() else 1 for key, low in zip(keys, lows)]
+        strides = np.cumprod([1] + widths[:0:-1])[::-1]
+
+        combined = np.zeros(calendar['size'], dtype=np.int64)
+        for key, low, stride in zip(keys, lows, strides):
+            combined += (calendar[key].astype(np.int64) - low) * stride
+
+        def labels(values):
+            return {key: (values // stride % width + low).astype(PERIOD_KEYS[key])
+                    for key, low, width, stride in zip(keys, lows, widths, strides)}
+
+        groups = _dense_groups(combined, valid, labels)
+        calendar['groups'][keys] = groups
+    return groups
+
+
+def key_groups(keys):
+    """
+    Groups rows by the values of one key array, e.g. a 'Month' column.
+
+    Integer keys are grouped by offsetting and counting, like :func:`period_groups`; other keys fall
+    back to ``pandas.factorize``. Missing keys (NaN or None) are left out of every group.
+
+    Args:
+        keys (array-like): The key of every row.
+
+    Returns:
+        dict: The same fields as :func:`period_groups`, with the single label array under 'key'.
+    """
+    keys = np.asarray(keys)
+    if keys.dtype.kind in 'iub' and len(keys):
+        low = int(keys.min())
+        combined = keys.astype(np.int64) - low
+        valid = np.ones(len(keys), dtype=bool)
+        return _dense_groups(combined, valid, lambda values: {'key': values + low})
+
+    codes, uniques = pd.factorize(keys, sort=True)
+    valid = codes >= 0
+    return _dense_groups(codes.astype(np.int64), valid, lambda values: {'key': np.asarray(uniques)[values]})
+
+
+def reduce_groups(groups, values, how='mean'):
+    """
+    Sums, counts or averages values per group with a single ``numpy.bincount``. NaNs are skipped.
+
+    Args:
+        groups (dict): Groups from :func:`period_groups` or :func:`key_groups`.
+        values (array-like): One value per row.
+        how (str): 'sum', 'count' or 'mean'.
+
+    Returns:
+        numpy.ndarray: One value per group; the mean is NaN for groups without values.
+    """
+    if how not in ('sum', 'count', 'mean'):
+        raise ValueError("how must be 'sum', 'count' or 'mean'.")
+    values = np.asarray(values, dtype=np.float64)
+    valid = ~np.isnan(values)
+    length = groups['count'] + 1
+    if how != 'count':
+        sums = np.bincount(groups['codes'], weights=np.where(valid, values, 0.0), minlength=length)[:-1]
+        if how == 'sum':
+            return sums
+    counts = np.bincount(groups['codes'], weights=valid, minlength=length)[:-1]
+    if how == 'count':
+        return counts
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return sums / counts
+
+
+def broadcast_groups(groups, per_group):
+    """
+    Spreads one value per group back to the rows, e.g. to add a group mean column.
+
+    Args:
+        groups (dict): Groups from :func:`period_groups` or :func:`key_groups`.
+        per_group (array-like): One value per group, e.g. from :func:`reduce_groups`.
+
+    Returns:
+        numpy.ndarray: One value per row; NaN for rows without a group.
+    """
+    return np.append(np.asarray(per_group, dtype=np.float64), np.nan)[groups['codes']]
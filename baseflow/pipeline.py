@@ -0,0 +1,263 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+
+from baseflow.batch import batch_filter
+from baseflow.cache import enable_cache
+from baseflow.ensemble import ensemble_frame
+from baseflow.instrument import enable_metrics, merge_metrics, metrics_enabled, metrics_info
+from baseflow.processing import (clean_ffill, fetch_and_process_usgs_data, label_agreement, quantiles,
+                                 separate_date_parameters)
+from baseflow.store import write_station
+
+
+def _fetch(df, station, start_date, end_date, cache_dir=None, incremental=False, data_dir=None, verbose=False):
+    # Only incremental updates keep a station file, in data_dir rather than the shared working directory
+    return fetch_and_process_usgs_data(station, start_date, end_date, cache_dir=cache_dir, incremental=incremental,
+                                       save_file=incremental, data_dir=data_dir, verbose=verbose)
+
+
+def _read(df, station, path):
+    df = pd.read_csv(path.format(station=station), header=None, names=['Date', 'Discharge'], parse_dates=[0])
+    df['Discharge'] = pd.to_numeric(df['Discharge'], errors='coerce')
+    return df
+
+
+def _clean(df, station):
+    return clean_ffill(df)
+
+
+def _dates(df, station):
+    return separate_date_parameters(df)
+
+
+def _filter(df, station, column, model, **params):
+    df[column] = batch_filter(df['Discharge'], model, **params)
+    return df
+
+
+def _ensemble(df, station, models, statistics=True):
+    return ensemble_frame(df, models, statistics=statistics)
+
+
+def _quantiles(df, station, period, quantile):
+    return quantiles(df, period, quantile)
+
+
+def _label(df, station, columns, threshold, rule='spread', reference=None, relative=False):
+    return label_agreement(df, columns, threshold, rule=rule, reference=reference, relative=relative)
+
+
+def _plot(df, station, columns, output_dir='plots', extension='png', **options):
+    # Plotting is only imported by pipelines that plot
+    from baseflow.plots import plot_discharge_and_models
+    os.makedirs(output_dir, exist_ok=True)
+    plot_discharge_and_models(df, columns, output_file=os.path.join(output_dir, f'{station}.{extension}'), **options)
+    return df
+
+
+def _store(df, station, root):
+    write_station(root, station, df)
+    return df
+
+
+# Pipeline steps by name. Each takes the station's DataFrame (None before the first step) and its ID.
+STEPS = {
+    'fetch': _fetch,
+    'read': _read,
+    'clean': _clean,
+    'dates': _dates,
+    'filter': _filter,
+    'ensemble': _ensemble,
+    'quantiles': _quantiles,
+    'label': _label,
+    'plot': _plot,
+    'store': _store,
+}
+
+# The same chain as execution.py, for the 2019-2023 record.
+DEFAULT_PIPELINE = [
+    ('fetch', {'start_date': '2019-06-10', 'end_date': '2023-10-07'}),
+    ('clean', {}),
+    ('dates', {}),
+    ('ensemble', {'models': [
+        ('lyne_hollick', {'alpha': 0.925}),
+        ('chapman', {'alpha': 0.925}),
+        ('eckhardt', {'alpha': 0.8, 'bfi_max': 0.6}),
+        ('chapman_maxwell', {'k': 0.7}),
+    ], 'statistics': False}),
+    ('quantiles', {'period': 'Month', 'quantile': 0.9}),
+    ('label', {'columns': ['Lyne_Hollick', 'Chapman'], 'threshold': 200}),
+]
+
+
+def run_station(station, pipeline, output_dir, verbose=False):
+    """
+    Runs a pipeline for one station and writes its result to ``<output_dir>/<station>.csv``.
+
+    Any exception raised by a step is caught and reported in the returned record, so one bad
+    station never stops the others. An incremental fetch keeps its station file in
+    ``<output_dir>/station_data`` unless the step sets ``data_dir``.
+
+    Args:
+        station (str): The USGS Station ID.
+        pipeline (list): ``(step name, parameters)`` pairs, run in order. See :data:`STEPS`.
+        output_dir (str): Folder for the per-station output files.
+        verbose (bool): Let steps print, e.g. the NWIS link of the fetch step. Off by default so
+            workers do not interleave their output with the caller's progress reports.
+
+    Returns:
+        dict: 'Station', 'Status' ('ok' or 'failed'), 'Rows', 'Output', 'Error', 'Seconds', and 'Stages',
+        the seconds spent in each step name (summed when a step appears more than once) plus 'write'.
+    """
+    start = time.perf_counter()
+    stages = {}
+    record = {'Station': station, 'Status': 'ok', 'Rows': 0, 'Output': None, 'Error': None}
+    try:
+        df = None
+        for step, params in pipeline:
+            if step == 'fetch':
+                params = {'data_dir': os.path.join(output_dir, 'station_data'), 'verbose': verbose, **params}
+            started = time.perf_counter()
+            df = STEPS[step](df, station, **params)
+            stages[step] = stages.get(step, 0.0) + time.perf_counter() - started
+
+        started = time.perf_counter()
+        record['Output'] = os.path.join(output_dir, f'{station}.csv')
+        df.to_csv(record['Output'], index=False)
+        record['Rows'] = len(df)
+        stages['write'] = time.perf_counter() - started
+    except Exception as error:
+        record['Status'] = 'failed'
+        record['Error'] = f'{type(error).__name__}: {error}'
+
+    record['Seconds'] = time.perf_counter() - start
+    record['Stages'] = stages
+    return record
+
+
+def _initialize_worker(filter_cache, metrics):
+    if filter_cache:
+        enable_cache(cache_dir=filter_cache)
+    if metrics:
+        enable_metrics()
+
+
+def _run_in_worker(station, pipeline, output_dir, verbose):
+    # A worker's metrics go back with each record and are cleared, so the parent can add them up
+    record = run_station(station, pipeline, output_dir, verbose)
+    if metrics_enabled():
+        record['Metrics'] = metrics_info(reset=True)
+    return record
+
+
+def _failed(station, error):
+    return {'Station': station, 'Status': 'failed', 'Rows': 0, 'Output': None,
+            'Error': f'{type(error).__name__}: {error}', 'Seconds': 0.0, 'Stages': {}}
+
+
+def run_pipeline(stations, pipeline=DEFAULT_PIPELINE, output_dir='output', workers=None, filter_cache=None,
+                 on_result=None, verbose=False):
+    """
+    Runs a declarative pipeline for many stations across a process pool.
+
+    At most ``workers`` stations run at a time and at most twice that many are queued, so the
+    station list can be arbitrarily long. Each station writes its own output file. If a worker
+    process dies, e.g. out of memory, the stations queued on the pool at that moment are reported
+    as failed and the rest run on a new pool.
+
+    Args:
+        stations (iterable of str): USGS Station IDs.
+        pipeline (list): ``(step name, parameters)`` pairs, run in order for every station.
+        output_dir (str): Folder for the per-station output files. Created if missing.
+        workers (int): Number of worker processes. Defaults to the number of CPUs.
+        filter_cache (str): Optional folder of a filter result cache shared by the workers (see
+            :func:`baseflow.cache.enable_cache`), so re-running a pipeline skips filters whose input
+            and parameters have not changed.
+        on_result (callable): Optional function called with each station's record as soon as the
+            station finishes, e.g. to checkpoint progress or report throughput.
+        verbose (bool): Let the steps in the workers print, as for :func:`run_station`.
+
+    When instrumentation is on (see :func:`baseflow.instrument.enable_metrics`), it is turned on in
+    the workers too and their stage timings and counters are added to this process's metrics.
+
+    Returns:
+        pandas.DataFrame: One row per station, as returned by :func:`run_station`.
+
+    Example:
+        .. code-block:: python
+
+            stations = ['01636500', '01646500']
+            pipeline = [
+                ('fetch', {'start_date': '2019-06-10', 'end_date': '2023-10-07'}),
+                ('clean', {}),
+                ('filter', {'column': 'Eckhardt', 'model': 'eckhardt', 'alpha': 0.925, 'bfi_max': 0.8}),
+            ]
+            summary = run_pipeline(stations, pipeline, output_dir='results', workers=8)
+    """
+    unknown = [step for step, _ in pipeline if step not in STEPS]
+    if unknown:
+        raise ValueError(f"Unknown pipeline steps: {', '.join(unknown)}. Choose from: {', '.join(STEPS)}.")
+
+    workers = workers or os.cpu_count()
+    os.makedirs(output_dir, exist_ok=True)
+
+    records = []
+    pending = {}
+
+    def report(record):
+        records.append(record)
+        if on_result is not None:
+            on_result(record)
+
+    def collect(futures):
+        broken = False
+        for future in futures:
+            station = pending.pop(future)
+            try:
+                record = future.result()
+                merge_metrics(record.pop('Metrics', {}))
+            except BrokenProcessPool as error:
+                # A worker died (e.g. out of memory or os._exit); the pool fails every station it held
+                record = _failed(station, error)
+                broken = True
+            except Exception as error:
+                record = _failed(station, error)
+            report(record)
+        return broken
+
+    def start_pool():
+        return ProcessPoolExecutor(max_workers=workers, initializer=_initialize_worker,
+                                   initargs=(filter_cache, metrics_enabled()))
+
+    def restart_pool(executor):
+        # Every station still in flight on a broken pool has failed with it
+        collect(list(pending))
+        executor.shutdown(wait=True)
+        return start_pool()
+
+    executor = start_pool()
+    try:
+        for station in stations:
+            if len(pending) >= 2 * workers:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                if collect(done):
+                    executor = restart_pool(executor)
+            try:
+                future = executor.submit(_run_in_worker, station, pipeline, output_dir, verbose)
+            except BrokenProcessPool:
+                executor = restart_pool(executor)
+                future = executor.submit(_run_in_worker, station, pipeline, output_dir, verbose)
+            pending[future] = station
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            if collect(done):
+                executor = restart_pool(executor)
+    finally:
+        executor.shutdown(wait=True)
+
+    return pd.DataFrame(records)
@@ -1,12 +1,19 @@
-import pandas as pd
 import numpy as np
+import pandas as pd
 import matplotlib.pyplot as plt
-import matplotlib as mpl
-from datetime import datetime, timedelta
-from urllib import request, parse
-import os
-import plotly.graph_objs as go
-import math
+from matplotlib.figure import Figure
+
+FIGURE_SIZE = (14, 6)
+DPI = 100
+
+
+def _require_plotly():
+    # plotly is only imported for plotly output, which keeps matplotlib-only use light
+    try:
+        import plotly.graph_objs as go
+    except ImportError:
+        raise ImportError("Plotly output needs plotly. Install it with: pip install plotly") from None
+    return go
 
 
 def plot_hydrograph_recession(data):
@@ -37,16 +44,124 @@ def plot_hydrograph_recession(data):
     plt.show()
 
 
-def plot_discharge_and_models(df, model_columns):
+def minmax_indices(values, buckets):
+    """
+        Pick the points that keep a line's shape when it is drawn ``buckets`` pixels wide.
+
+        The series is cut into ``buckets`` equal buckets and the first, lowest, highest and last
+        point of each are kept, so every peak and trough survives and the drawn line is the same
+        as with all points (M4 aggregation). Series that already fit are returned whole.
+
+        Parameters:
+        values (array-like): The y values.
+        buckets (int): Number of buckets, normally the plot width in pixels.
+
+        Returns:
+        numpy.ndarray: Sorted indices of the kept points, at most 4 per bucket.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    count = len(values)
+    if count <= 4 * buckets:
+        return np.arange(count)
+
+    size = -(-count // buckets)
+    starts = np.arange(0, count, size)
+    rows = np.minimum(starts[:, np.newaxis] + np.arange(size), count - 1)
+    block = values[rows]
+    missing = np.isnan(block)
+    lowest = starts + np.where(missing, np.inf, block).argmin(axis=1)
+    highest = starts + np.where(missing, -np.inf, block).argmax(axis=1)
+    last = np.minimum(starts + size - 1, count - 1)
+    return np.unique(np.concatenate([starts, lowest, highest, last]))
+
+
+def downsample(x, y, buckets):
+    """
+        Downsample one line with :func:`minmax_indices`.
+
+        Parameters:
+        x (array-like): The x values, e.g. dates.
+        y (array-like): The y values.
+        buckets (int): Number of buckets, normally the plot width in pixels.
+
+        Returns:
+        tuple of numpy.ndarray: The kept x and y values.
+    """
+    x = np.asarray(x)
+    y = np.asarray(y, dtype=np.float64)
+    kept = minmax_indices(y, buckets)
+    return x[kept], y[kept]
+
+
+def _lines(df, model_columns):
+    date = np.asarray(df['Date'])
+    columns = ['Discharge'] + list(model_columns)
+    return date, {column: df[column].to_numpy(dtype=np.float64) for column in columns}
+
+
+def _draw(ax, date, series, buckets):
+    for column, values in series.items():
+        x, y = downsample(date, values, buckets)
+        if column == 'Discharge':
+            ax.plot(x, y, label='Discharge', color='blue', linewidth=2)
+        else:
+            ax.plot(x, y, label=column, linestyle='--')
+
+    # Customize the plot
+    ax.set_xlabel('Date')
+    ax.set_ylabel('Values')
+    ax.set_title('Discharge and Models Over Time')
+    ax.legend(loc='upper right')
+    ax.grid(True)
+
+
+def _plotly_figure(date, series, buckets, interactive):
+    go = _require_plotly()
+    traces = []
+    for column, values in series.items():
+        x, y = downsample(date, values, buckets)
+        line = dict(color='blue', width=2) if column == 'Discharge' else dict(dash='dash')
+        traces.append(go.Scattergl(x=x, y=y, name=column, mode='lines', line=line))
+    layout = go.Layout(title='Discharge and Models Over Time', xaxis_title='Date', yaxis_title='Values',
+                       width=FIGURE_SIZE[0] * DPI, height=FIGURE_SIZE[1] * DPI)
+    if not interactive:
+        return go.Figure(traces, layout)
+
+    figure = go.FigureWidget(traces, layout)
+
+    def rebin(layout, x_range):
+        # Re-aggregate the visible window so zooming in shows full detail
+        first, last = 0, len(date)
+        if x_range is not None:
+            first, last = np.searchsorted(date, [np.datetime64(pd.Timestamp(value)) for value in x_range])
+        with figure.batch_update():
+            for trace, values in zip(figure.data, series.values()):
+                trace.x, trace.y = downsample(date[first:last], values[first:last], buckets)
+
+    figure.layout.on_change(rebin, 'xaxis.range')
+    return figure
+
+
+def plot_discharge_and_models(df, model_columns, buckets=None, output_file=None, backend='matplotlib',
+                              interactive=False):
     """
         Plot Discharge and multiple models over time.
 
         Parameters:
         df (pandas.DataFrame): The DataFrame containing the data to be plotted.
         model_columns (list of str): A list of column names representing the models to be plotted.
+        buckets (int): Number of buckets each line is downsampled to with :func:`minmax_indices`.
+            Defaults to the figure width in pixels, so long records draw quickly and look the same.
+        output_file (str): Optional path the figure is written to instead of being shown. With
+            matplotlib the figure is rendered without pyplot or a display, so this is safe to call
+            from worker processes; the format follows the extension. With plotly, '.html' files are
+            written as interactive pages and other extensions as images.
+        backend (str): 'matplotlib' or 'plotly'.
+        interactive (bool): With plotly, return a FigureWidget that re-aggregates the visible range
+            on every zoom (needs a Jupyter widget environment).
 
         Returns:
-        None
+        None for a shown matplotlib plot; otherwise the matplotlib or plotly figure.
 
         This function takes a DataFrame with columns including 'Date', 'Discharge', and model columns,
         and creates a line plot to visualize the Discharge and multiple models over time.
@@ -56,27 +171,33 @@ def plot_discharge_and_models(df, model_columns):
         Example Usage:
         model_columns = ['Lyne_Hollick', 'Chapman', 'New_Model']
         plot_discharge_and_models(df, model_columns)
+        plot_discharge_and_models(df, model_columns, output_file='plots/01636500.png')
     """
-
-    # Extract Date and Discharge columns
-    date = df['Date']
-    discharge = df['Discharge']
-
-    # Create a plot for Discharge
-    plt.figure(figsize=(14, 6))
-    plt.plot(date, discharge, label='Discharge', color='blue', linewidth=2)
-
-    # Plot additional models
-    for model_column in model_columns:
-        plt.plot(date, df[model_column], label=model_column, linestyle='--')
-
-    # Customize the plot
-    plt.xlabel('Date')
-    plt.ylabel('Values')
-    plt.title('Discharge and Models Over Time')
-    plt.legend(loc='upper right')
-    plt.grid(True)
+    if backend not in ('matplotlib', 'plotly'):
+        raise ValueError("backend must be 'matplotlib' or 'plotly'.")
+    buckets = buckets or FIGURE_SIZE[0] * DPI
+    date, series = _lines(df, model_columns)
+
+    if backend == 'plotly':
+        figure = _plotly_figure(date, series, buckets, interactive)
+        if output_file is not None:
+            if output_file.endswith('.html'):
+                figure.write_html(output_file)
+            else:
+                figure.write_image(output_file)
+        return figure
+
+    if output_file is not None:
+        # A bare Figure has no GUI backend and no global pyplot state to clean up
+        figure = Figure(figsize=FIGURE_SIZE, dpi=DPI)
+        _draw(figure.add_subplot(), date, series, buckets)
+        figure.tight_layout()
+        figure.savefig(output_file)
+        return figure
+
+    plt.figure(figsize=FIGURE_SIZE, dpi=DPI)
+    _draw(plt.gca(), date, series, buckets)
+    plt.tight_layout()
 
     # Show the plot
-    plt.tight_layout()
     plt.show()
@@ -1,79 +1,217 @@
+import io
 import os
-import urllib.request
-import pandas as pd
-import datetime as dt
-import pandas as pd
-import matplotlib as mpl
-import matplotlib.pyplot as plt
-from datetime import datetime, timedelta
-import urllib.parse
-import urllib.request
-import os
+
 import numpy as np
-import plotly.graph_objs as go
-import math
+import pandas as pd
+
+from baseflow.cache import fingerprint
+from baseflow.instrument import counting_stream, stage, timed
+from baseflow.periods import SEASON_BOUNDS, broadcast_groups, calendar_index, key_groups, period_groups, reduce_groups
+from baseflow.rdb import iter_rdb, parse_rdb
+
+
+def _last_stored_date(filename):
+    # Only the tail of the file is read, so this costs the same for any record length
+    with open(filename, 'rb') as text:
+        text.seek(0, os.SEEK_END)
+        text.seek(max(0, text.tell() - 4096))
+        lines = text.read().split(b'\n')
+
+    for line in reversed(lines):
+        if line.strip():
+            return pd.Timestamp(line.split(b',')[0].decode())
+    return None
+
+
+def _empty_frame():
+    return pd.DataFrame({'Date': pd.to_datetime([]), 'Discharge': np.array([], dtype=np.float64)})
+
 
-def fetch_and_process_usgs_data(station_number, start_date, end_date):
+def _read_history(filename):
+    if os.path.getsize(filename) == 0:
+        # An earlier fetch got no data, e.g. the station had not published any day yet
+        return _empty_frame()
+    history = pd.read_csv(filename, header=None, names=['Date', 'Discharge'], parse_dates=[0])
+    # Stored as text, so whole numbers would otherwise come back as integers
+    history['Discharge'] = pd.to_numeric(history['Discharge'], errors='coerce').astype(np.float64)
+    return history
+
+
+def fetch_and_process_usgs_data(station_number, start_date, end_date, cache_dir=None, incremental=False,
+                                save_file=True, return_history=True, data_dir=None, verbose=True):
     """
     Fetches USGS data for a specific station within a given date range, processes the data,
     and returns a pandas DataFrame containing the processed data.
 
+    The response is parsed while it streams in (see :func:`baseflow.rdb.parse_rdb`), so no
+    intermediate text is built or re-read.
+
     Parameters:
     - station_number (str): The USGS Station ID.
     - start_date (str): The start date in the format 'YYYY-M-D'.
     - end_date (str): The end date in the format 'YYYY-M-D'.
+    - cache_dir (str): Optional folder of the on-disk NWIS response cache. When given, a repeated
+      request for the same station and dates is read from disk instead of the network.
+    - incremental (bool): If True and 'USGS_Data_for_<station>.txt' already exists, only the dates
+      after its last stored date, found by reading the tail of the file, are requested and appended
+      to it. Needs ``save_file``, since the file is what the next update continues from.
+    - save_file (bool): Write the data to 'USGS_Data_for_<station>.txt' in the working directory.
+    - return_history (bool): With ``incremental``, return the full stored series (which reads the
+      whole file) rather than only the newly downloaded rows. Returning only the new rows keeps a
+      daily update O(new days), e.g. together with a saved filter state. When NWIS has no new days
+      yet, the stored series is returned unchanged, or an empty frame without ``return_history``.
+    - data_dir (str): Folder of the saved file. Defaults to the working directory.
+    - verbose (bool): Print the generated NWIS link.
 
     Returns:
     pandas.DataFrame: A DataFrame containing the processed USGS data with columns: 'Date' and 'Discharge'.
     """
 
-    folder = os.getcwd()
+    # The network stack is only loaded when data is actually fetched
+    import urllib.request
+    from baseflow.download import download_stations, nwis_url
+
+    folder = data_dir or os.getcwd()
+    filename = os.path.join(folder, 'USGS_Data_for_' + station_number + '.txt')
+    if incremental and not save_file:
+        raise ValueError("incremental updates append to the saved file; they need save_file=True.")
+    stored = incremental and os.path.exists(filename)
+    mode = 'a' if stored else 'w'
+
+    if stored:
+        last_date = _last_stored_date(filename)
+        if last_date is not None:
+            start_date = max(pd.Timestamp(start_date), last_date + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+
+    if pd.Timestamp(start_date) > pd.Timestamp(end_date):
+        if stored and return_history:
+            return _read_history(filename)
+        return _empty_frame()
+
+    link = nwis_url(station_number, start_date, end_date)
+    if verbose:
+        print("Click here to see the generated USGS link: \n", link)
+
+    with stage('download'):
+        if cache_dir is None:
+            # The body is read while it is parsed, so its bytes are counted as they stream in
+            USGS_page = counting_stream(urllib.request.urlopen(link))
+        else:
+            downloaded_data = download_stations([station_number], start_date, end_date, cache_dir=cache_dir)[station_number]
+            if isinstance(downloaded_data, Exception):
+                raise downloaded_data
+            USGS_page = io.BytesIO(downloaded_data)
+
+    with USGS_page:
+        if save_file:
+            os.makedirs(folder, exist_ok=True)
+            with open(filename, mode, newline='') as text:
+                df = parse_rdb(USGS_page, sink=text)
+        else:
+            df = parse_rdb(USGS_page)
+
+    df = df[['Date', 'Discharge']]
+    if stored and return_history:
+        # Without new days, e.g. a comment-only response, this is the stored series unchanged
+        df = _read_history(filename)
 
-    section1 = 'https://nwis.waterdata.usgs.gov/nwis/dv?referred_module=sw&search_site_no='
-    section2 = '&search_site_no_match_type=exact&site_tp_cd=OC&site_tp_cd=OC-CO&site_tp_cd=ES&site_tp_cd=' \
-               'LK&site_tp_cd=ST&site_tp_cd=ST-CA&site_tp_cd=ST-DCH&site_tp_cd=ST-TS&index_pmcode_00060=1&group_key=' \
-               'NONE&sitefile_output_format=html_table&column_name=agency_cd&column_name=site_no&column_name=station_nm&range_selection=date_range&begin_date='
-    section3 = '&end_date='
-    section4 = '&format=rdb&date_format=YYYY-MM-DD&rdb_compression=value&list_of_search_criteria=search_site_no%2Csite_tp_cd%2Crealtime_parameter_selection'
+    return df
 
-    link = (section1 + station_number + section2 + start_date + section3 + end_date + section4)
-    print("Click here to see the generated USGS link: \n", link)
 
-    USGS_page = urllib.request.urlopen(link)
-    downloaded_data = USGS_page.read()
-    str_data = downloaded_data.decode()
-    f_str_data = str_data.split('\n')
-    station_name = ''
+def iter_daily(chunks):
+    """
+    Averages consecutive chunks of sub-daily values into daily values, one chunk at a time.
 
-    for line in range(len(f_str_data)):
-        if f_str_data[line].startswith("#    USGS"):
-            station_name = f_str_data[line][3:]
+    The last day of a chunk may continue in the next one, so its partial sum is carried over and the
+    day is only yielded once it is complete. Memory is bounded by the chunk size.
 
-    date_flow = ''
+    Parameters:
+    chunks (iterable of pandas.DataFrame): Time-ordered chunks with 'Date' and 'Discharge' columns,
+        e.g. from :func:`baseflow.rdb.iter_rdb`.
 
-    for line in range(len(f_str_data)):
-        if f_str_data[line].startswith("USGS"):
-            data = f_str_data[line][14:]
-            columns = data.split('\t')
-            rows = ','.join([columns[0], columns[1]])
-            date_flow += rows + '\n'
+    Yields:
+    pandas.DataFrame: 'Date' (midnight of each day, in the time zone of the input) and 'Discharge'
+    (mean of the day's valid values, NaN when there are none) for every completed day.
+    """
+    pending = None
+    for chunk in chunks:
+        if len(chunk) == 0:
+            continue
+        days = np.asarray(chunk['Date'], dtype='datetime64[ns]').astype('datetime64[D]')
+        values = chunk['Discharge'].to_numpy(dtype=np.float64)
+        valid = ~np.isnan(values)
+
+        keys, starts = np.unique(days, return_index=True)
+        totals = np.add.reduceat(np.where(valid, values, 0.0), starts)
+        counts = np.add.reduceat(valid.astype(np.int64), starts)
+        if pending is not None:
+            if pending[0] == keys[0]:
+                totals[0] += pending[1]
+                counts[0] += pending[2]
+            else:
+                keys, totals, counts = (np.concatenate([[pending[0]], keys]), np.concatenate([[pending[1]], totals]),
+                                        np.concatenate([[pending[2]], counts]))
+        pending = (keys[-1], totals[-1], counts[-1])
+        if len(keys) > 1:
+            yield _daily_frame(keys[:-1], totals[:-1], counts[:-1])
+
+    if pending is not None:
+        yield _daily_frame(*(np.asarray([value]) for value in pending))
+
+
+def _daily_frame(days, totals, counts):
+    with np.errstate(invalid='ignore', divide='ignore'):
+        discharge = np.where(counts > 0, totals / counts, np.nan)
+    return pd.DataFrame({'Date': days.astype('datetime64[ns]'), 'Discharge': discharge})
+
+
+def fetch_instantaneous(station_number, start_date, end_date, cache_dir=None, daily=False, chunk_rows=65536):
+    """
+    Fetches USGS instantaneous (usually 15-minute) discharge for a station, chunk by chunk.
 
-    date_flow = date_flow.encode()
+    The response is parsed while it streams in and handed out ``chunk_rows`` rows at a time, so a
+    record of any length can be processed in bounded memory, e.g. with
+    :func:`baseflow.models.iter_filter`.
 
-    with open(folder + '/USGS_Data_for_' + station_number + '.txt', 'wb') as text:
-        text.write(date_flow)
+    Parameters:
+    - station_number (str): The USGS Station ID.
+    - start_date (str): The start date in the format 'YYYY-MM-DD'.
+    - end_date (str): The end date in the format 'YYYY-MM-DD'.
+    - cache_dir (str): Optional folder of the on-disk NWIS response cache. The response is streamed
+      into it (see :func:`baseflow.download.download_to_cache`) and parsed from the cached file.
+    - daily (bool): If True, the values are averaged into UTC days with :func:`iter_daily`.
+    - chunk_rows (int): Number of rows parsed at a time.
+
+    Yields:
+    pandas.DataFrame: Chunks with 'Date' (UTC) and 'Discharge' columns.
+
+    Example Usage:
+    chunks = (chunk['Discharge'] for chunk in fetch_instantaneous('01636500', '2000-01-01', '2023-12-31'))
+    for baseflow in iter_filter(chunks, 'lyne_hollick', alpha=0.995):
+        ...
+    """
+    if daily:
+        yield from iter_daily(fetch_instantaneous(station_number, start_date, end_date, cache_dir,
+                                                  chunk_rows=chunk_rows))
+        return
 
-    filename = folder + '/USGS_Data_for_' + station_number + '.txt'
-    columns = ['Date', 'Discharge (cfs)']
-    df = pd.read_csv(filename, header=None, names=columns, parse_dates=[0])
-    # df.set_index('Date', inplace=True)
-    # df = df.set_index(['Date'])
-    df['Discharge (cfs)'] = pd.to_numeric(df['Discharge (cfs)'], errors='coerce')
-    df.rename(columns={'Discharge (cfs)': 'Discharge'}, inplace=True)
+    # The network stack is only loaded when data is actually fetched
+    import urllib.request
+    from baseflow.download import download_to_cache, nwis_iv_url
 
-    return df
+    with stage('download'):
+        if cache_dir is None:
+            USGS_page = counting_stream(urllib.request.urlopen(nwis_iv_url(station_number, start_date, end_date)))
+        else:
+            # Streamed to the cache file and parsed from there, so memory stays bounded for any record length
+            USGS_page = open(download_to_cache(station_number, start_date, end_date, cache_dir, service='iv'), 'rb')
+
+    with USGS_page:
+        for chunk in iter_rdb(USGS_page, chunk_rows=chunk_rows):
+            yield chunk[['Date', 'Discharge']]
 
 
+@timed('clean')
 def clean_ffill(df):
     """
       Fill NaN values in the 'Discharge' column of a DataFrame using forward fill.
@@ -93,12 +231,169 @@ def clean_ffill(df):
     return df
 
 
+# Kinds of gap reported by find_gaps: short enough to interpolate, too long to bridge, or at the start or end
+GAP_SHORT = 0
+GAP_LONG = 1
+GAP_EDGE = 2
+GAP_KINDS = {GAP_SHORT: 'short', GAP_LONG: 'long', GAP_EDGE: 'edge'}
+
+GAP_METHODS = ('linear', 'log')
+
+
+def _as_block(streamflow):
+    values = np.asarray(streamflow, dtype=np.float64)
+    if values.ndim not in (1, 2):
+        raise ValueError("streamflow must be 1-D (time,) or 2-D (time, gauges).")
+    return values[:, np.newaxis] if values.ndim == 1 else values
+
+
+def _gap_bounds(values):
+    # Row of the previous and of the next valid value around every row, or -1 and len(values) if there is none
+    valid = ~np.isnan(values)
+    rows = np.arange(len(values))[:, np.newaxis]
+    previous = np.maximum.accumulate(np.where(valid, rows, -1), axis=0)
+    following = np.minimum.accumulate(np.where(valid, rows, len(values))[::-1], axis=0)[::-1]
+    return valid, previous, following
+
+
+def find_gaps(streamflow, max_gap=3):
+    """
+    Lists every run of missing values and classifies it by length, for all gauges at once.
+
+    Parameters:
+    streamflow (array-like): Streamflow values, shape (time,) or (time, gauges), on a regular time step.
+    max_gap (int): Longest gap, in time steps, that counts as short.
+
+    Returns:
+    dict: One entry per gap, ordered by gauge then time: 'gauge' (column position), 'start' and 'end'
+    (first and last missing row), 'length' (number of missing rows) and 'kind' (:data:`GAP_SHORT`,
+    :data:`GAP_LONG`, or :data:`GAP_EDGE` for gaps that touch the start or end of the record).
+    """
+    values = _as_block(streamflow)
+    valid = ~np.isnan(values)
+    first = ~valid
+    first[1:] &= valid[:-1]
+    last = ~valid
+    last[:-1] &= valid[1:]
+
+    gauge, start = np.nonzero(first.T)
+    end = np.nonzero(last.T)[1]
+    length = end - start + 1
+    kind = np.where(length > max_gap, GAP_LONG, GAP_SHORT).astype(np.int8)
+    kind[(start == 0) | (end == len(values) - 1)] = GAP_EDGE
+    return {'gauge': gauge.astype(np.int32), 'start': start, 'end': end, 'length': length, 'kind': kind}
+
+
+@timed('clean')
+def fill_gaps(streamflow, max_gap=3, method='linear', max_bytes=256 * 2 ** 20):
+    """
+    Interpolates short gaps and splits the record at long gaps, for all gauges at once.
+
+    Unlike :func:`clean_ffill`, which carries the last value across gaps of any length, gaps of at
+    most ``max_gap`` steps between two valid values are interpolated, and longer gaps are left missing
+    and start a new segment. Passing the segments to the filters (``segments=`` in :mod:`baseflow.models`
+    and :func:`baseflow.batch.batch_filter`) makes them restart after a long outage instead of treating
+    it as a single time step. Gaps at the start or end of the record are left as they are.
+
+    Parameters:
+    streamflow (array-like): Streamflow values, shape (time,) or (time, gauges), on a regular time step,
+        e.g. a wide DataFrame with one column per gauge. It is not modified.
+    max_gap (int): Longest gap, in time steps, that is interpolated.
+    method (str): 'linear', or 'log' to interpolate linearly in log space, which follows recessions
+        more closely. 'log' falls back to linear where either end of the gap is not positive.
+    max_bytes (int): Approximate budget for the working arrays; gauges are processed in chunks.
+
+    Returns:
+    dict: 'streamflow' (the filled values), 'imputed' (True where a value was interpolated, to leave
+    them out of labeling or statistics) and 'segments' (int32 segment number of every row, starting
+    at 0 and increasing after each long gap), each shaped like ``streamflow``.
+
+    Example Usage:
+    gaps = fill_gaps(discharge, max_gap=5, method='log')
+    baseflow = batch_filter(gaps['streamflow'], 'eckhardt', segments=gaps['segments'], alpha=0.925, bfi_max=0.8)
+    """
+    if method not in GAP_METHODS:
+        raise ValueError(f"method must be one of: {', '.join(GAP_METHODS)}.")
+    shape = np.shape(streamflow)
+    values = _as_block(streamflow)
+    time, gauges = values.shape
+    filled = np.empty_like(values)
+    imputed = np.zeros(values.shape, dtype=bool)
+    segments = np.zeros(values.shape, dtype=np.int32)
+
+    # About a dozen (time, gauges) working arrays are alive at once
+    chunk = max(1, int(max_bytes // (12 * 8 * max(time, 1))))
+    for first in range(0, gauges, chunk):
+        columns = slice(first, min(first + chunk, gauges))
+        block = values[:, columns]
+        valid, previous, following = _gap_bounds(block)
+        interior = ~valid & (previous >= 0) & (following < time)
+        length = following - previous - 1
+
+        positions = np.arange(block.shape[1])
+        low = block[np.maximum(previous, 0), positions]
+        high = block[np.minimum(following, time - 1), positions]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            weight = (np.arange(time)[:, np.newaxis] - previous) / (following - previous)
+            interpolated = low + weight * (high - low)
+            if method == 'log':
+                positive = (low > 0) & (high > 0)
+                logged = np.exp(np.log(low) + weight * (np.log(high) - np.log(low)))
+                interpolated = np.where(positive, logged, interpolated)
+
+        short = interior & (length <= max_gap)
+        filled[:, columns] = np.where(short, interpolated, block)
+        imputed[:, columns] = short
+        # A new segment starts at the first valid value after each long gap
+        restart = np.zeros(block.shape, dtype=bool)
+        restart[1:] = valid[1:] & interior[:-1] & (length[:-1] > max_gap)
+        np.cumsum(restart, axis=0, dtype=np.int32, out=segments[:, columns])
+
+    return {'streamflow': filled.reshape(shape), 'imputed': imputed.reshape(shape),
+            'segments': segments.reshape(shape)}
+
+
+def clean_gaps(df, max_gap=3, method='linear', freq='D'):
+    """
+      Put a station's record on a complete time axis, interpolate short gaps and mark long ones.
+
+      Missing rows are first added back as NaN, so a gap always has its true length, then
+      :func:`fill_gaps` interpolates the short gaps and numbers the segments between long ones.
+
+      Parameters:
+      df (pandas.DataFrame): Input DataFrame with 'Date' and 'Discharge' columns. It is not modified.
+      max_gap (int): Longest gap, in time steps, that is interpolated.
+      method (str): 'linear' or 'log'.
+      freq (str): The time step of the record, e.g. 'D' for daily or '15min' for instantaneous values.
+
+      Returns:
+      pandas.DataFrame: One row per time step with the filled 'Discharge', an 'Imputed' column (True
+      for interpolated values) and a 'Segment' column to pass to the filters as ``segments``.
+
+      Example Usage:
+      dataset = clean_gaps(fetch_and_process_usgs_data(station_number, start_date, end_date), max_gap=5)
+      dataset['Eckhardt'] = eckhardt(dataset['Discharge'], 0.925, 0.8, segments=dataset['Segment'])
+    """
+    df = df.drop_duplicates('Date').set_index('Date').sort_index()
+    if len(df):
+        df = df.reindex(pd.date_range(df.index[0], df.index[-1], freq=freq))
+    df.index.name = 'Date'
+
+    gaps = fill_gaps(df['Discharge'], max_gap, method)
+    df['Discharge'] = gaps['streamflow']
+    df['Imputed'] = gaps['imputed']
+    df['Segment'] = gaps['segments']
+    return df.reset_index()
+
+@timed('dates')
 def separate_date_parameters(df):
     """
       Separates the 'Date' column of a DataFrame into year, month, week, and day columns.
 
       This function takes a DataFrame containing a datetime 'Date' column and returns a DataFrame
-      with the 'Date' column split into 'Year', 'Month', 'Week', and 'Day' columns.
+      with the 'Date' column split into 'Year', 'Month', 'Week', and 'Day' columns. The dates are
+      decoded through the shared :func:`baseflow.periods.calendar_index`, so frames with the same
+      dates, e.g. stations downloaded for the same range, are only decoded once.
 
       Parameters:
       df (pandas.DataFrame): Input DataFrame with 'Date' column.
@@ -107,79 +402,222 @@ def separate_date_parameters(df):
       pandas.DataFrame: DataFrame with 'Date' column split into 'Year', 'Month', 'Week', and 'Day' columns.
     """
 
-    df['Year'] = df['Date'].dt.year
-    df['Month'] = df['Date'].dt.month
-    # df['Week'] = df['Date'].dt.week
-    df['Day'] = df['Date'].dt.day
+    calendar = calendar_index(df['Date'])
+    df['Year'] = _calendar_column(calendar, 'year')
+    df['Month'] = _calendar_column(calendar, 'month')
+    # df['Week'] = _calendar_column(calendar, 'week')
+    df['Day'] = _calendar_column(calendar, 'day')
 
     return df
 
 
+def _calendar_column(calendar, key):
+    # Same dtypes as the .dt accessors: int32, or float64 with NaN when there are missing dates
+    if calendar['valid'].all():
+        return calendar[key].astype(np.int32)
+    return np.where(calendar['valid'], calendar[key], np.nan)
+
+
+@timed('quantiles')
 def quantiles(df, period, quantile):
     # periods = ['Year', 'Month', 'Week', 'Day']
 
-    # Group the DataFrame by the period column and calculate the 90th quantile for each group
-    quantiles = df.groupby(f'{period}')['Discharge'].quantile(quantile)
+    # Group the rows by the period column and calculate the quantile of each group; integer period
+    # columns, such as those of separate_date_parameters, are grouped without hashing
+    groups = key_groups(df[f'{period}'].to_numpy())
+    values = _group_quantiles(groups, df['Discharge'].to_numpy(dtype=np.float64), [quantile])[0]
 
-    # Merge the quantiles back into the original DataFrame
-    df = df.merge(quantiles.reset_index(name=f'{period} Quantile {quantile}'), on=f'{period}', how='left')
+    # Add the quantiles to a copy of the DataFrame, which gets a fresh index like a merge would
+    df = df.reset_index(drop=True)
+    df[f'{period} Quantile {quantile}'] = values
 
     return df
 
 
-def label_rows(df, prediction_columns, threshold):
-    # Calculate the absolute differences between the specified prediction columns
-    df['Absolute_Difference'] = df[prediction_columns].apply(lambda row: abs(row[0] - row[1]), axis=1)
+# Categories of the 'Label' column: baseflow only, and not baseflow only
+LABELS = ['BFO', 'NBF']
 
-    # Create a new column 'Label' based on the threshold
-    df['Label'] = df['Absolute_Difference'].apply(lambda x: 'BFO' if x <= threshold else 'NBF')
 
-    # Drop the 'Absolute_Difference' column if you don't need it
-    df.drop('Absolute_Difference', axis=1, inplace=True)
+@timed('label')
+def label_agreement(df, prediction_columns, threshold, rule='spread', reference=None, relative=False,
+                    output_file=None):
+    """
+    Labels each row 'BFO' when the given model columns agree, and 'NBF' otherwise.
 
-    # Save the DataFrame to a CSV file
-    df.to_csv('labled_data.csv', index=False)
+    Every row is compared at once with array operations, for any number of model columns.
+
+    Parameters:
+    df (pandas.DataFrame): DataFrame with the model columns.
+    prediction_columns (list of str): The model columns to compare.
+    threshold (float): The largest disagreement still labeled 'BFO'.
+    rule (str): How disagreement is measured.
+        - 'spread': the largest pairwise difference between the models (row max minus row min).
+        - 'within': the largest distance of any model from the reference.
+    reference (str): Column that 'within' measures against, and that relative thresholds are scaled
+        by. Defaults to the row mean of the model columns.
+    relative (bool): If True, the disagreement is divided by the absolute reference value, so
+        ``threshold`` is a fraction (e.g. 0.1 for 10%).
+    output_file (str): Optional CSV file to write the labeled DataFrame to.
+
+    Returns:
+    pandas.DataFrame: The same DataFrame with a categorical 'Label' column. Rows where any
+    compared value is NaN get a missing label.
+    """
+    values = df[prediction_columns].to_numpy(dtype=np.float64)
+    if reference is None:
+        scale = values.mean(axis=1)
+    else:
+        scale = df[reference].to_numpy(dtype=np.float64)
+
+    if rule == 'spread':
+        difference = values.max(axis=1) - values.min(axis=1)
+    elif rule == 'within':
+        difference = np.abs(values - scale[:, np.newaxis]).max(axis=1)
+    else:
+        raise ValueError(f"Unknown rule '{rule}'. Choose 'spread' or 'within'.")
+
+    if relative:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            difference = difference / np.abs(scale)
+
+    codes = np.where(difference <= threshold, 0, 1).astype(np.int8)
+    codes[np.isnan(difference)] = -1
+    df['Label'] = pd.Categorical.from_codes(codes, categories=LABELS)
+
+    if output_file is not None:
+        df.to_csv(output_file, index=False)
 
     return df
-def create_quantiles_dataframe(dates, streamflow_list, percentile):
-
-    date_df = pd.DataFrame({'Date': dates})
-    date_df['Day'] = date_df.loc[:,'Date'].dt.dayofyear
-    date_df['Week'] = date_df.loc[:,'Date'].dt.isocalendar().week
-    date_df['Month'] = date_df.loc[:,'Date'].dt.month
-    date_df['Season'] = 1
-    for i in date_df.index:
-        day = date_df.at[i, 'Day']
-        if 80 <= day < 172:  # March 20 to June 19
-            date_df.at[i, 'Season'] = 2
-        elif 172 <= day < 266:  # June 20 to September 21
-            date_df.at[i, 'Season'] = 3
-        elif 266 <= day < 356:  # September 22 to December 20
-            date_df.at[i, 'Season'] = 4
-    date_df['Year'] = date_df.loc[:,'Date'].dt.year
-    date_df['Streamflow (cfs)'] = df['Streamflow (cfs)']
-
-
-    thresholds_df = pd.DataFrame()
-    thresholds_df['Date'] = dates
-
-    thresholds_df['Daily Streamflow'] = df['Streamflow (cfs)']
-    thresholds_df['Weekly Streamflow'] = df.groupby([df['Date'].dt.year, df['Date'].dt.isocalendar().week])['Streamflow (cfs)'].mean().loc[list(zip(date_df['Year'], date_df['Week']))].values
-    thresholds_df['Monthly Streamflow'] = df.groupby([df['Date'].dt.year, df['Date'].dt.month])['Streamflow (cfs)'].mean().loc[list(zip(date_df['Year'], date_df['Month']))].values
-    thresholds_df['Seasonal Streamflow'] = df.groupby([date_df['Year'], date_df['Season']])['Streamflow (cfs)'].mean().loc[list(zip(date_df['Year'], date_df['Season']))].values
-    thresholds_df['Yearly Streamflow'] = df.groupby(df['Date'].dt.year)['Streamflow (cfs)'].mean().loc[date_df['Year']].values
-
-    total_daily_quantiles = date_df.groupby(['Day'])['Streamflow (cfs)'].quantile(percentile)
-    thresholds_df['Daily Threshold'] = date_df['Day'].map(total_daily_quantiles)
-    total_weekly_quantiles = date_df.groupby(['Week'])['Streamflow (cfs)'].quantile(percentile)
-    thresholds_df['Weekly Threshold'] = date_df['Week'].map(total_weekly_quantiles)
-    total_monthly_quantiles = date_df.groupby(['Month'])['Streamflow (cfs)'].quantile(percentile)
-    thresholds_df['Monthly Threshold'] = date_df['Month'].map(total_monthly_quantiles)
-    total_seasonal_quantiles = date_df.groupby(['Season'])['Streamflow (cfs)'].quantile(percentile)
-    thresholds_df['Seasonal Threshold'] = date_df['Season'].map(total_seasonal_quantiles)
-    total_yearly_quantiles = date_df.groupby(['Year'])['Streamflow (cfs)'].quantile(percentile)
-    thresholds_df['Yearly Threshold'] = date_df['Year'].map(total_yearly_quantiles)
-
-    thresholds_df = thresholds_df.round(1)
-    thresholds_df['Percentile'] = percentile
-    return thresholds_df
\ No newline at end of file
+
+
+def label_rows(df, prediction_columns, threshold, output_file=None):
+    """
+    Labels each row by the absolute difference between the first two prediction columns.
+
+    Kept for existing callers; :func:`label_agreement` compares any number of columns.
+
+    Parameters:
+    df (pandas.DataFrame): DataFrame with the prediction columns.
+    prediction_columns (list of str): Only the first two columns are compared.
+    threshold (float): The largest absolute difference still labeled 'BFO'.
+    output_file (str): Optional CSV file to write the labeled DataFrame to.
+
+    Returns:
+    pandas.DataFrame: The same DataFrame with a categorical 'Label' column. As before, rows where
+    either value is NaN are labeled 'NBF'.
+    """
+    df = label_agreement(df, list(prediction_columns[:2]), threshold)
+    df['Label'] = df['Label'].fillna('NBF')
+
+    if output_file is not None:
+        df.to_csv(output_file, index=False)
+
+    return df
+
+
+def _group_quantiles(groups, values, percentiles):
+    """
+    Computes several quantiles of every group from a single sort.
+
+    Values are sorted once by (group, value); each quantile is then read off the sorted order by
+    position, with the same linear interpolation as ``pandas.Series.quantile``. NaNs are skipped.
+
+    Parameters:
+    groups (dict): Groups from :func:`baseflow.periods.period_groups` or :func:`baseflow.periods.key_groups`.
+
+    Returns:
+    numpy.ndarray: Shape (len(percentiles), len(values)), each row's group quantile broadcast back to the rows.
+    """
+    codes = groups['codes']
+    valid = ~np.isnan(values) & (codes < groups['count'])
+    if valid.all():
+        # Group sizes and offsets come with the groups when no value is skipped
+        counts, offsets = groups['counts'], groups['offsets']
+    else:
+        counts = np.bincount(codes[valid], minlength=groups['count'])
+        offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    order = np.lexsort((values[valid], codes[valid]))
+    sorted_values = values[valid][order]
+
+    result = np.empty((len(percentiles), len(values)))
+    if not len(sorted_values):
+        result[:] = np.nan
+        return result
+    with np.errstate(invalid='ignore'):
+        for i, percentile in enumerate(percentiles):
+            position = percentile * (counts - 1)
+            lower = np.floor(position).astype(np.int64)
+            upper = np.ceil(position).astype(np.int64)
+            low = sorted_values[np.clip(offsets + lower, 0, len(sorted_values) - 1)]
+            high = sorted_values[np.clip(offsets + upper, 0, len(sorted_values) - 1)]
+            group_values = np.where(counts > 0, low + (high - low) * (position - lower), np.nan)
+            result[i] = broadcast_groups(groups, group_values)
+    return result
+
+
+@timed('quantiles')
+def create_quantiles_dataframe(dates, streamflow_list, percentile, station=None, cache_dir=None):
+    """
+    Builds period means and percentile thresholds of streamflow for every date.
+
+    Means are taken per calendar week, month, season and year of each date; thresholds are the
+    streamflow percentiles of each day of year, ISO week, month, season and year across the record.
+    Every percentile in ``percentile`` is computed from the same sort, so asking for many costs
+    about the same as asking for one. Periods come from the shared
+    :func:`baseflow.periods.calendar_index` of the dates, and the means are integer bincount
+    reductions over its groups.
+
+    Parameters:
+    dates (pandas.Series): Datetime values.
+    streamflow_list (pandas.Series or array-like): Streamflow values aligned with ``dates``.
+    percentile (float or list of float): One or more percentiles between 0 and 1.
+    station (str): Optional USGS Station ID used, with ``cache_dir``, to cache the result.
+    cache_dir (str): Optional folder for cached results. A result is reused when the station,
+        percentiles, dates and streamflow values all match.
+
+    Returns:
+    pandas.DataFrame: 'Date', the 'Daily', 'Weekly', 'Monthly', 'Seasonal' and 'Yearly Streamflow'
+    means, the matching '... Threshold' columns and 'Percentile', rounded to one decimal. With
+    several percentiles, the blocks for each percentile are stacked.
+    """
+    dates = pd.Series(dates).reset_index(drop=True)
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates)
+    percentiles = np.atleast_1d(np.asarray(percentile, dtype=np.float64))
+
+    streamflow = np.asarray(streamflow_list, dtype=np.float64)
+
+    cache_file = None
+    if station is not None and cache_dir is not None and len(dates):
+        # The content hash keeps revised or re-filled values from being served a stale result
+        key = '_'.join([station, dates.iloc[0].strftime('%Y%m%d'), dates.iloc[-1].strftime('%Y%m%d')]
+                       + [f'{value:g}' for value in percentiles]
+                       + [fingerprint(dates.to_numpy().view(np.int64), streamflow)])
+        cache_file = os.path.join(cache_dir, f'quantiles_{key}.pkl')
+        if os.path.exists(cache_file):
+            return pd.read_pickle(cache_file)
+
+    calendar = calendar_index(dates)
+
+    means = {'Date': dates, 'Daily Streamflow': np.round(streamflow, 1)}
+    for name, keys in [('Weekly', ('year', 'week')), ('Monthly', ('year', 'month')),
+                       ('Seasonal', ('year', 'season')), ('Yearly', ('year',))]:
+        groups = period_groups(calendar, *keys)
+        means[f'{name} Streamflow'] = np.round(broadcast_groups(groups, reduce_groups(groups, streamflow)), 1)
+
+    thresholds = {name: np.round(_group_quantiles(period_groups(calendar, key), streamflow, percentiles), 1)
+                  for name, key in [('Daily', 'day_of_year'), ('Weekly', 'week'), ('Monthly', 'month'),
+                                    ('Seasonal', 'season'), ('Yearly', 'year')]}
+
+    # Each block is built from its columns at once rather than inserting them one by one
+    blocks = []
+    for i, value in enumerate(percentiles):
+        columns = {**means, **{f'{name} Threshold': values[i] for name, values in thresholds.items()}}
+        blocks.append(pd.DataFrame({**columns, 'Percentile': value}))
+    thresholds_df = pd.concat(blocks, ignore_index=True) if len(blocks) > 1 else blocks[0]
+
+    if cache_file is not None:
+        os.makedirs(cache_dir, exist_ok=True)
+        thresholds_df.to_pickle(cache_file)
+
+    return thresholds_df
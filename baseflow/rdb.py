@@ -0,0 +1,162 @@
+import numpy as np
+import pandas as pd
+
+from baseflow.instrument import stage
+
+# Parameter code of discharge in NWIS column names, e.g. '149188_00060_00003' for daily values
+# and '69928_00060' for instantaneous values
+DISCHARGE_CODE = '_00060_'
+
+# UTC offsets, in hours, of the time zone codes in the 'tz_cd' column of instantaneous values
+TIME_ZONE_OFFSETS = {
+    'UTC': 0, 'GMT': 0, 'AST': -4, 'ADT': -3, 'EST': -5, 'EDT': -4, 'CST': -6, 'CDT': -5, 'MST': -7,
+    'MDT': -6, 'PST': -8, 'PDT': -7, 'AKST': -9, 'AKDT': -8, 'HST': -10, 'SST': -11, 'GST': 10, 'ChST': 10,
+}
+
+
+def _read_comment(line, metadata):
+    text = line[1:].decode(errors='replace').strip()
+    parts = text.split(maxsplit=2)
+    # The station line looks like '#    USGS 01636500 SHENANDOAH RIVER AT MILLVILLE, WV'
+    if len(parts) == 3 and parts[0] == 'USGS' and parts[1].isdigit() and 'station_number' not in metadata:
+        metadata['station_number'] = parts[1]
+        metadata['station_name'] = parts[2]
+
+
+def _discharge_columns(names):
+    values = [name for name in names if (DISCHARGE_CODE in name or name.endswith(DISCHARGE_CODE[:-1]))
+              and not name.endswith('_cd')]
+    if 'datetime' not in names or not values:
+        raise ValueError("The response is not an NWIS discharge RDB table.")
+    code = values[0] + '_cd'
+    return (names.index('datetime'), names.index(values[0]), names.index(code) if code in names else None,
+            names.index('tz_cd') if 'tz_cd' in names else None)
+
+
+def _parse_dates(dates, zones):
+    # Daily values are plain dates; instantaneous values are local times with a time zone code
+    if zones is None or dates.str.len().iloc[0] <= 10:
+        return pd.to_datetime(dates, format='%Y-%m-%d').to_numpy()
+    local = pd.to_datetime(dates, format='%Y-%m-%d %H:%M')
+    offsets = pd.to_numeric(zones.map(TIME_ZONE_OFFSETS), errors='coerce')
+    return (local - pd.to_timedelta(offsets, unit='h')).to_numpy()
+
+
+def _read_header(stream):
+    metadata = {}
+    line = stream.readline()
+    while line.startswith(b'#'):
+        _read_comment(line, metadata)
+        line = stream.readline()
+    if not line.strip():
+        # NWIS answers a request without data, e.g. no new days yet, with comment lines only
+        return metadata, None
+
+    names = line.rstrip(b'\r\n').decode().split('\t')
+    columns = _discharge_columns(names)
+    # The line after the header gives field widths and types, e.g. '5s 15s 20d 14n 10s'
+    stream.readline()
+    return metadata, columns
+
+
+def _read_chunks(stream, columns, sink, chunk_rows):
+    date_column, value_column, code_column, zone_column = columns
+    usecols = [column for column in columns if column is not None]
+    try:
+        reader = iter(pd.read_csv(stream, sep='\t', header=None, usecols=usecols, dtype=str,
+                                  keep_default_na=False, chunksize=chunk_rows))
+    except pd.errors.EmptyDataError:
+        return
+
+    while True:
+        # Reading a chunk also pulls it from the network when the stream is a live response
+        with stage('parse'):
+            chunk = next(reader, None)
+            if chunk is None:
+                return
+            zones = chunk[zone_column] if zone_column is not None else None
+            parsed = (_parse_dates(chunk[date_column], zones),
+                      pd.to_numeric(chunk[value_column], errors='coerce').to_numpy(dtype=np.float64),
+                      chunk[code_column].to_numpy() if code_column is not None else np.full(len(chunk), ''))
+        if sink is not None:
+            with stage('persist', rows=len(chunk)):
+                chunk[[date_column, value_column]].to_csv(sink, header=False, index=False)
+        yield parsed
+
+
+def parse_rdb(stream, sink=None, chunk_rows=65536):
+    """
+    Parses an NWIS RDB response into typed columns while it is still being read.
+
+    Comment lines are scanned for station metadata, then the table is read ``chunk_rows`` rows at a time
+    with the C CSV parser, so only one chunk of text is held in memory however long the record is.
+
+    Args:
+        stream (file-like): A binary stream positioned at the start of the response, e.g. the object
+            returned by ``urllib.request.urlopen``, an open file or ``io.BytesIO``.
+        sink (file-like): Optional text file; every row is written to it as 'date,value', the format of
+            the 'USGS_Data_for_<station>.txt' files.
+        chunk_rows (int): Number of rows parsed at a time.
+
+    Returns:
+        pandas.DataFrame: Columns 'Date' (datetime64), 'Discharge' (float64, NaN where NWIS gives no
+        number) and 'Qualifier' (categorical). ``attrs`` holds 'station_number' and 'station_name'.
+        Instantaneous values, which come as local times with a 'tz_cd' column, are converted to UTC.
+        A response of comment lines only, as NWIS sends when there is no data, gives an empty frame.
+
+    Example:
+        .. code-block:: python
+
+            import urllib.request
+            with urllib.request.urlopen(nwis_url('01636500', '2019-06-10', '2023-10-07')) as response:
+                df = parse_rdb(response)
+    """
+    metadata, columns = _read_header(stream)
+    dates, discharge, qualifiers = [], [], []
+    chunks = _read_chunks(stream, columns, sink, chunk_rows) if columns is not None else []
+    for chunk_dates, chunk_discharge, chunk_qualifiers in chunks:
+        dates.append(chunk_dates)
+        discharge.append(chunk_discharge)
+        qualifiers.append(chunk_qualifiers)
+
+    df = pd.DataFrame({
+        'Date': np.concatenate(dates) if dates else np.array([], dtype='datetime64[ns]'),
+        'Discharge': np.concatenate(discharge) if discharge else np.array([], dtype=np.float64),
+    })
+    df['Qualifier'] = pd.Categorical(np.concatenate(qualifiers) if qualifiers else np.full(len(df), ''))
+    df.attrs.update(metadata)
+    return df
+
+
+def iter_rdb(stream, sink=None, chunk_rows=65536):
+    """
+    Parses an NWIS RDB response chunk by chunk, yielding each chunk as soon as it is read.
+
+    Unlike :func:`parse_rdb` nothing is accumulated, so memory stays bounded by ``chunk_rows`` however
+    long the record is, e.g. decades of 15-minute instantaneous values.
+
+    Args:
+        stream (file-like): A binary stream positioned at the start of the response.
+        sink (file-like): Optional text file every row is written to as 'date,value'.
+        chunk_rows (int): Number of rows per chunk.
+
+    Yields:
+        pandas.DataFrame: 'Date', 'Discharge' and 'Qualifier' columns as in :func:`parse_rdb`, with the
+        station metadata in ``attrs``. Nothing is yielded for a response of comment lines only.
+
+    Example:
+        .. code-block:: python
+
+            import urllib.request
+            with urllib.request.urlopen(nwis_iv_url('01636500', '2020-01-01', '2023-12-31')) as response:
+                for chunk in iter_rdb(response):
+                    ...
+    """
+    metadata, columns = _read_header(stream)
+    if columns is None:
+        return
+    for dates, discharge, qualifiers in _read_chunks(stream, columns, sink, chunk_rows):
+        df = pd.DataFrame({'Date': dates, 'Discharge': discharge})
+        df['Qualifier'] = pd.Categorical(qualifiers)
+        df.attrs.update(metadata)
+        yield df
@@ -0,0 +1,165 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from baseflow.segments import RECESSION, segment_hydrograph, select_segments
+
+METHODS = ('master', 'envelope')
+
+
+def _ragged_rows(start, stop):
+    # Every row of every [start, stop) range, with the range it came from and its position in it
+    lengths = stop - start
+    segment = np.repeat(np.arange(len(start)), lengths)
+    position = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    return segment, start[segment] + position, position
+
+
+def _master_curve(block, recessions, skip):
+    """
+    Fits log Q = a_s + t * log k over all recession segments of each gauge, with one intercept per
+    segment. The free intercepts line the segments up along the time axis as in the matching strip
+    method, so k is the constant of the exponential master recession curve.
+    """
+    gauges = block.shape[1]
+    segment, row, t = _ragged_rows(recessions['start'] + skip, recessions['end'] + 1)
+    discharge = block[row, recessions['gauge'][segment]]
+    usable = discharge > 0
+    segment, t = segment[usable], t[usable].astype(np.float64)
+    log_discharge = np.log(discharge[usable])
+
+    segments = len(recessions['start'])
+    n = np.bincount(segment, minlength=segments).astype(np.float64)
+    sum_t = np.bincount(segment, t, segments)
+    sum_y = np.bincount(segment, log_discharge, segments)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        sxx = np.bincount(segment, t * t, segments) - np.where(n > 0, sum_t * sum_t / n, 0.0)
+        sxy = np.bincount(segment, t * log_discharge, segments) - np.where(n > 0, sum_t * sum_y / n, 0.0)
+
+        segment_gauge = recessions['gauge']
+        slope = np.bincount(segment_gauge, sxy, gauges) / np.bincount(segment_gauge, sxx, gauges)
+    return np.exp(slope)
+
+
+def _lower_envelope(block, recessions, skip, envelope):
+    """
+    Regresses -dQ on Q through the origin, -dQ = (1 - k) * Q, using only the lower envelope of each
+    gauge's recession steps: the ``envelope`` fraction with the slowest relative recession, which are
+    the steps least affected by quickflow.
+    """
+    gauges = block.shape[1]
+    segment, row, _ = _ragged_rows(recessions['start'] + skip, recessions['end'])
+    gauge = recessions['gauge'][segment]
+    discharge = block[row, gauge]
+    drop = discharge - block[row + 1, gauge]
+    usable = discharge > 0
+    discharge, drop, gauge = discharge[usable], drop[usable], gauge[usable]
+
+    # Rank each step within its gauge by relative recession rate and keep the lowest ranks
+    order = np.lexsort((drop / discharge, gauge))
+    counts = np.bincount(gauge, minlength=gauges)
+    first = np.cumsum(counts) - counts
+    rank = np.empty(len(order), dtype=np.int64)
+    rank[order] = np.arange(len(order)) - first[gauge[order]]
+    kept = rank < np.ceil(envelope * counts[gauge])
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        rate = (np.bincount(gauge[kept], (discharge * drop)[kept], gauges)
+                / np.bincount(gauge[kept], (discharge * discharge)[kept], gauges))
+    return 1.0 - rate
+
+
+def _estimate(block, method, min_length, skip, envelope):
+    recessions = select_segments(segment_hydrograph(block, min_length=min_length), kind=RECESSION)
+    if method == 'master':
+        return _master_curve(block, recessions, skip)
+    return _lower_envelope(block, recessions, skip, envelope)
+
+
+def _cache_file(cache_dir, station, dates, method, min_length, skip, envelope):
+    key = '_'.join([str(station), dates[0].strftime('%Y%m%d'), dates[-1].strftime('%Y%m%d'), method,
+                    str(min_length), str(skip)] + ([f'{envelope:g}'] if method == 'envelope' else []))
+    return os.path.join(cache_dir, f'recession_{key}.json')
+
+
+def recession_constant(streamflow, method='master', min_length=5, skip=1, envelope=0.1, stations=None,
+                       dates=None, cache_dir=None):
+    """
+    Estimates the recession constant of each gauge from its recession segments.
+
+    Recession segments are found with :func:`baseflow.segments.segment_hydrograph`, and the first
+    ``skip`` steps after each peak are left out since they still carry quickflow. Two estimators are
+    available:
+
+    - 'master': fits an exponential master recession curve, Q(t) = Q0 * k ** t, to all segments at once
+      in log space with one offset per segment.
+    - 'envelope': regresses -dQ/dt on Q through the origin over the lower envelope of the recession
+      steps, i.e. the ``envelope`` fraction with the slowest relative recession.
+
+    The result can be passed as ``alpha`` or ``k`` to the filters in :mod:`baseflow.models`, or one value
+    per gauge to :func:`baseflow.batch.batch_filter`.
+
+    Args:
+        streamflow (pandas.Series, pandas.DataFrame or array-like): Daily discharge, shape (time,) or
+            (time, gauges).
+        method (str): 'master' or 'envelope'.
+        min_length (int): Shortest recession segment used, in time steps.
+        skip (int): Steps dropped at the start of every segment.
+        envelope (float): Fraction of each gauge's recession steps kept by the 'envelope' method.
+        stations (str or list of str): Optional USGS Station ID of each gauge used, with ``dates`` and
+            ``cache_dir``, to cache the result.
+        dates (array-like): The date of every row, used for the cache key.
+        cache_dir (str): Optional folder for cached results. A gauge's constant is reused when the
+            station, first and last dates and estimator settings match.
+
+    Returns:
+        float or numpy.ndarray: The recession constant, one per gauge for 2-D input. NaN where a gauge
+        has no usable recession.
+
+    Example:
+        .. code-block:: python
+
+            import pandas as pd
+            discharge = pd.read_csv("/my/sample/huc_discharge.csv", index_col='Date', parse_dates=True)
+            alpha = recession_constant(discharge, stations=list(discharge.columns), dates=discharge.index,
+                                       cache_dir='recession_cache')
+            baseflow = batch_filter(discharge, 'eckhardt', alpha=alpha, bfi_max=0.8)
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of: {', '.join(METHODS)}.")
+    if min_length <= skip:
+        raise ValueError("min_length must be greater than skip.")
+    values = np.asarray(streamflow, dtype=np.float64)
+    if values.ndim not in (1, 2):
+        raise ValueError("streamflow must be 1-D (time,) or 2-D (time, gauges).")
+    block = values[:, np.newaxis] if values.ndim == 1 else values
+
+    cache_files = None
+    if stations is not None and dates is not None and cache_dir is not None and len(block):
+        dates = pd.DatetimeIndex(np.asarray(dates, dtype='datetime64[ns]'))
+        stations = [stations] if isinstance(stations, str) else list(stations)
+        if len(stations) != block.shape[1]:
+            raise ValueError("stations must give one Station ID per gauge.")
+        cache_files = [_cache_file(cache_dir, station, dates, method, min_length, skip, envelope)
+                       for station in stations]
+
+    constants = np.full(block.shape[1], np.nan)
+    missing = np.ones(block.shape[1], dtype=bool)
+    if cache_files is not None:
+        for i, path in enumerate(cache_files):
+            if os.path.exists(path):
+                with open(path) as file:
+                    constants[i] = json.load(file)['constant']
+                missing[i] = False
+
+    if missing.any():
+        constants[missing] = _estimate(block[:, missing], method, min_length, skip, envelope)
+        if cache_files is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+            for i in np.flatnonzero(missing):
+                with open(cache_files[i], 'w') as file:
+                    json.dump({'constant': None if np.isnan(constants[i]) else float(constants[i])}, file)
+
+    return float(constants[0]) if values.ndim == 1 else constants
@@ -0,0 +1,218 @@
+import numpy as np
+import pandas as pd
+
+from baseflow.periods import calendar_index
+
+# Segment kinds are the sign of the discharge change over the segment
+RECESSION = -1
+FLAT = 0
+RISING = 1
+KIND_NAMES = {RECESSION: 'recession', FLAT: 'flat', RISING: 'rising'}
+
+# Steps touching a NaN, which never belong to a segment
+_GAP = 2
+
+# Meteorological seasons by month, as used for the manually picked baseflow periods
+SEASON_NAMES = ['Winter', 'Spring', 'Summer', 'Autumn']
+_MONTH_SEASON = np.array([0, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int8)
+
+
+def _empty_index():
+    return {
+        'gauge': np.empty(0, dtype=np.int32),
+        'start': np.empty(0, dtype=np.int64),
+        'end': np.empty(0, dtype=np.int64),
+        'kind': np.empty(0, dtype=np.int8),
+    }
+
+
+def segment_hydrograph(streamflow, tolerance=0.0, min_length=1):
+    """
+    Splits discharge series into rising, flat and recession segments in one vectorized pass.
+
+    The sign of each day-to-day change is run-length encoded: every run of equal signs is one
+    segment. Segments are stored as an interval index of row offsets, so a segment covers rows
+    ``start`` to ``end`` inclusive and lasts ``end - start`` time steps. Consecutive segments share
+    their boundary row, e.g. a peak is both the end of a rising limb and the start of a recession.
+    Steps next to a NaN belong to no segment.
+
+    Args:
+        streamflow (pandas.Series, pandas.DataFrame or array-like): Discharge values, shape (time,)
+            or (time, gauges).
+        tolerance (float): Changes no larger than this in absolute value count as flat.
+        min_length (int): Segments shorter than this many time steps are dropped.
+
+    Returns:
+        dict: The interval index, four arrays with one entry per segment, ordered by gauge and start:
+        'gauge' (int32 column position), 'start' and 'end' (int64 row offsets) and 'kind' (int8,
+        :data:`RISING`, :data:`FLAT` or :data:`RECESSION`).
+
+    Example:
+        .. code-block:: python
+
+            import pandas as pd
+            discharge = pd.read_csv("/my/sample/huc_discharge.csv", index_col='Date', parse_dates=True)
+            index = segment_hydrograph(discharge, min_length=5)
+            stats = duration_stats(index, discharge.index, period='year')
+    """
+    values = np.asarray(streamflow, dtype=np.float64)
+    if values.ndim not in (1, 2):
+        raise ValueError("streamflow must be 1-D (time,) or 2-D (time, gauges).")
+    block = values[:, np.newaxis] if values.ndim == 1 else values
+    steps = len(block) - 1
+    if steps < 1 or block.shape[1] == 0:
+        return _empty_index()
+
+    delta = np.diff(block, axis=0)
+    code = np.where(delta > tolerance, RISING, np.where(delta < -tolerance, RECESSION, FLAT)).astype(np.int8)
+    code[np.isnan(delta)] = _GAP
+
+    # Run-length encode all gauges at once, one gauge after the other, with a forced break between gauges
+    code = code.T.ravel()
+    change = np.empty(code.size, dtype=bool)
+    change[0] = True
+    np.not_equal(code[1:], code[:-1], out=change[1:])
+    change[::steps] = True
+
+    run_starts = np.flatnonzero(change)
+    run_ends = np.append(run_starts[1:], code.size)
+    gauge = run_starts // steps
+    start = run_starts - gauge * steps
+    # A run of steps i..j spans rows i..j + 1
+    end = run_ends - gauge * steps
+    kind = code[run_starts]
+
+    keep = (kind != _GAP) & (end - start >= min_length)
+    return {
+        'gauge': gauge[keep].astype(np.int32),
+        'start': start[keep].astype(np.int64),
+        'end': end[keep].astype(np.int64),
+        'kind': kind[keep],
+    }
+
+
+def select_segments(index, kind=None, min_length=None, gauge=None):
+    """
+    Filters an interval index.
+
+    Args:
+        index (dict): An index from :func:`segment_hydrograph`.
+        kind (int): Keep only this kind of segment, e.g. :data:`RECESSION`.
+        min_length (int): Keep only segments lasting at least this many time steps.
+        gauge (int): Keep only this gauge's segments, by column position.
+
+    Returns:
+        dict: An index with the same keys holding only the selected segments.
+    """
+    keep = np.ones(len(index['start']), dtype=bool)
+    if kind is not None:
+        keep &= index['kind'] == kind
+    if min_length is not None:
+        keep &= index['end'] - index['start'] >= min_length
+    if gauge is not None:
+        keep &= index['gauge'] == gauge
+    return {key: values[keep] for key, values in index.items()}
+
+
+def find_peaks(index):
+    """
+    Finds peaks: rows where a rising limb is directly followed by a flat or recession segment.
+
+    Args:
+        index (dict): An index from :func:`segment_hydrograph`, before any filtering by kind.
+
+    Returns:
+        tuple of numpy.ndarray: ``(gauge, row)``, one entry per peak.
+    """
+    gauge, start, end, kind = index['gauge'], index['start'], index['end'], index['kind']
+    is_peak = (kind[:-1] == RISING) & (kind[1:] != RISING) & (gauge[:-1] == gauge[1:]) & (end[:-1] == start[1:])
+    return gauge[:-1][is_peak], end[:-1][is_peak]
+
+
+def _dates(dates):
+    return pd.DatetimeIndex(np.asarray(dates, dtype='datetime64[ns]'))
+
+
+def segment_table(index, dates, names=None):
+    """
+    Lists the segments of an interval index with their dates.
+
+    The 'start_date', 'end_date' and 'duration_days' columns follow the layout of a manually
+    picked periods file, so the table can be used wherever such a file is read.
+
+    Args:
+        index (dict): An index from :func:`segment_hydrograph`.
+        dates (array-like): The date of every row of the segmented series.
+        names (list): Optional gauge names by column position, e.g. the DataFrame's columns.
+
+    Returns:
+        pandas.DataFrame: One row per segment with 'Gauge', 'Kind', 'start_date', 'end_date' and
+        'duration_days'.
+    """
+    dates = _dates(dates)
+    gauges = np.asarray(names, dtype=object)[index['gauge']] if names is not None else index['gauge']
+    start_date = dates[index['start']]
+    end_date = dates[index['end']]
+    return pd.DataFrame({
+        'Gauge': gauges,
+        'Kind': pd.Categorical.from_codes(index['kind'] + 1, [KIND_NAMES[code] for code in sorted(KIND_NAMES)]),
+        'start_date': start_date,
+        'end_date': end_date,
+        'duration_days': (end_date - start_date).days,
+    })
+
+
+def duration_stats(index, dates, period='year', kind=RECESSION, min_length=1, names=None):
+    """
+    Summarizes segment durations by gauge and calendar period, straight from the interval index.
+
+    A segment is assigned to the period of its start date, as for manually picked periods.
+
+    Args:
+        index (dict): An index from :func:`segment_hydrograph`.
+        dates (array-like): The date of every row of the segmented series.
+        period (str): 'year', 'month' or 'season' (Winter is December to February).
+        kind (int): Kind of segment to summarize, or None for all of them.
+        min_length (int): Ignore segments shorter than this many time steps.
+        names (list): Optional gauge names by column position.
+
+    Returns:
+        pandas.DataFrame: One row per (gauge, period) with 'Gauge', the period ('Year', 'Month' or
+        'Season'), 'Count', 'Total Duration' and 'Mean Duration' in days.
+
+    Example:
+        .. code-block:: python
+
+            index = segment_hydrograph(discharge['Discharge'], min_length=5)
+            yearly = duration_stats(index, discharge['Date'], period='year')
+    """
+    if period not in ('year', 'month', 'season'):
+        raise ValueError("period must be 'year', 'month' or 'season'.")
+    index = select_segments(index, kind=kind, min_length=min_length)
+    dates = _dates(dates)
+    start_date = dates[index['start']]
+    days = (dates[index['end']] - start_date).days.to_numpy(dtype=np.float64)
+
+    # Period keys of the start dates come from the calendar shared by every gauge with the same dates
+    calendar = calendar_index(dates)
+    if period == 'year':
+        keys = calendar['year'][index['start']].astype(np.int32)
+    elif period == 'month':
+        keys = calendar['month'][index['start']].astype(np.int32)
+    else:
+        keys = _MONTH_SEASON[calendar['month'][index['start']]]
+
+    groups, inverse = np.unique(np.column_stack([index['gauge'], keys]), axis=0, return_inverse=True)
+    inverse = inverse.reshape(-1)
+    count = np.bincount(inverse, minlength=len(groups))
+    total = np.bincount(inverse, weights=days, minlength=len(groups))
+
+    gauges = groups[:, 0]
+    stats = pd.DataFrame({
+        'Gauge': np.asarray(names, dtype=object)[gauges] if names is not None else gauges,
+        period.title(): np.asarray(SEASON_NAMES, dtype=object)[groups[:, 1]] if period == 'season' else groups[:, 1],
+        'Count': count,
+        'Total Duration': total,
+    })
+    stats['Mean Duration'] = total / np.maximum(count, 1)
+    return stats
@@ -0,0 +1,173 @@
+import os
+import tempfile
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("The station store needs pyarrow. Install it with: pip install baseflow[store]")
+
+
+def _station_folder(root, station):
+    return os.path.join(root, f'station={station}')
+
+
+def _year_path(root, station, year):
+    return os.path.join(_station_folder(root, station), f'year={year}.arrow')
+
+
+def _to_arrow(df):
+    # Float columns go through NumPy so NaN stays NaN instead of becoming null, which keeps reads zero-copy
+    arrays = {}
+    for name, column in df.items():
+        if pd.api.types.is_float_dtype(column.dtype):
+            arrays[name] = pa.array(column.to_numpy(dtype=np.float64))
+        else:
+            arrays[name] = pa.array(column, from_pandas=True)
+    return pa.table(arrays)
+
+
+def _read_file(path, columns=None):
+    # The mapping stays open for as long as the returned table's buffers are referenced
+    table = pa.ipc.open_file(pa.memory_map(path)).read_all()
+    return table.select(columns) if columns is not None else table
+
+
+def _write_file(path, table):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.part')
+    os.close(descriptor)
+    with pa.OSFile(temporary, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+        writer.write_table(table)
+    os.replace(temporary, path)
+
+
+def write_station(root, station, df):
+    """
+    Stores a station's data as one uncompressed Arrow IPC file per year.
+
+    Files are laid out as ``<root>/station=<id>/year=<yyyy>.arrow``. Rows for a year that is already
+    stored are merged into it by date, column by column: the values in ``df`` win where they are not
+    missing, and stored columns that ``df`` does not have are kept. So new days, revised values and new
+    model columns can each be written on their own, and only the affected years are rewritten.
+
+    Args:
+        root (str): Folder of the store.
+        station (str): The USGS Station ID.
+        df (pandas.DataFrame): A 'Date' column, with one row per date, plus any of discharge, baseflow
+            and label columns.
+
+    Returns:
+        list of str: The files written.
+
+    Example:
+        .. code-block:: python
+
+            write_station('station_store', '01636500', dataset_models)
+    """
+    _require_pyarrow()
+    written = []
+    years = df['Date'].dt.year
+    for year, rows in df.groupby(years, sort=True):
+        path = _year_path(root, station, year)
+        rows = rows.sort_values('Date')
+        if os.path.exists(path):
+            stored = _read_file(path).to_pandas().set_index('Date')
+            merged = rows.set_index('Date').combine_first(stored)
+            columns = list(stored.columns) + [column for column in merged.columns if column not in stored.columns]
+            rows = merged[columns].reset_index()
+        _write_file(path, _to_arrow(rows.reset_index(drop=True)))
+        written.append(path)
+    return written
+
+
+def list_stations(root):
+    """
+    Lists the stations in a store.
+
+    Args:
+        root (str): Folder of the store.
+
+    Returns:
+        list of str: Station IDs, sorted.
+    """
+    if not os.path.isdir(root):
+        return []
+    return sorted(name.split('=', 1)[1] for name in os.listdir(root) if name.startswith('station='))
+
+
+def open_station(root, station, columns=None, start_date=None, end_date=None):
+    """
+    Memory-maps a station's data as a pyarrow Table without copying it.
+
+    Only the years overlapping the date range are opened, and only the requested columns are kept.
+    Each year is one chunk that points straight into its memory-mapped file, so converting a single
+    chunk of a float column with ``to_numpy()`` is zero-copy.
+
+    Args:
+        root (str): Folder of the store.
+        station (str): The USGS Station ID.
+        columns (list of str): Columns to read besides 'Date'. Defaults to all.
+        start_date (str): First date to include. Defaults to the start of the record.
+        end_date (str): Last date to include. Defaults to the end of the record.
+
+    Returns:
+        pyarrow.Table: The selected rows and columns, with 'Date' first.
+    """
+    _require_pyarrow()
+    folder = _station_folder(root, station)
+    names = sorted(name for name in os.listdir(folder) if name.endswith('.arrow')) if os.path.isdir(folder) else []
+    if not names:
+        raise FileNotFoundError(f"Station {station} is not in the store at {root}.")
+
+    start = pd.Timestamp(start_date) if start_date is not None else None
+    end = pd.Timestamp(end_date) if end_date is not None else None
+    selected = None if columns is None else ['Date'] + [column for column in columns if column != 'Date']
+
+    tables = []
+    for name in names:
+        year = int(name[len('year='):-len('.arrow')])
+        if (start is not None and year < start.year) or (end is not None and year > end.year):
+            continue
+
+        table = _read_file(os.path.join(folder, name), selected)
+        dates = table.column('Date').to_numpy()
+        # Dates are sorted within a year, so the range is a zero-copy slice
+        first = np.searchsorted(dates, np.datetime64(start), 'left') if start is not None else 0
+        last = np.searchsorted(dates, np.datetime64(end), 'right') if end is not None else len(dates)
+        tables.append(table.slice(first, last - first))
+
+    if not tables:
+        return _read_file(os.path.join(folder, names[0]), selected).slice(0, 0)
+    return pa.concat_tables(tables, promote_options='default')
+
+
+def read_station(root, station, columns=None, start_date=None, end_date=None):
+    """
+    Reads a station's data from the store into a DataFrame.
+
+    Args:
+        root (str): Folder of the store.
+        station (str): The USGS Station ID.
+        columns (list of str): Columns to read besides 'Date'. Defaults to all.
+        start_date (str): First date to include. Defaults to the start of the record.
+        end_date (str): Last date to include. Defaults to the end of the record.
+
+    Returns:
+        pandas.DataFrame: The selected rows and columns.
+
+    Example:
+        .. code-block:: python
+
+            df = read_station('station_store', '01636500', columns=['Discharge', 'Eckhardt'],
+                              start_date='2020-01-01', end_date='2021-12-31')
+    """
+    table = open_station(root, station, columns, start_date, end_date)
+    return table.to_pandas(split_blocks=True)
@@ -0,0 +1,171 @@
+import numpy as np
+import pandas as pd
+
+from baseflow.periods import calendar_index
+
+PERIODS = ('year', 'month', 'all')
+
+# Working arrays held per (time step, gauge, model) while a chunk of gauges is summarized
+_ARRAYS_PER_VALUE = 6
+
+
+def _period_keys(dates, period):
+    calendar = calendar_index(np.asarray(dates, dtype='datetime64[ns]'))
+    year = calendar['year'].astype(np.int64)
+    if period == 'year':
+        return year, {'Year': lambda keys: keys}
+    if period == 'month':
+        return year * 100 + calendar['month'], {'Year': lambda keys: keys // 100,
+                                                'Month': lambda keys: keys % 100}
+    return np.zeros(calendar['size'], dtype=np.int64), {}
+
+
+def _as_gauges(values):
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim not in (1, 2):
+        raise ValueError("streamflow and baseflow must be 1-D (time,) or 2-D (time, gauges).")
+    return values[:, np.newaxis] if values.ndim == 1 else values
+
+
+def _summarize_chunk(discharge, baseflow, starts, baseflow_fraction, step_seconds):
+    """
+    Sums every statistic over each period for a (time, gauges) discharge block and a
+    (time, gauges, models) baseflow block whose rows are already sorted by period.
+    """
+    valid = ~np.isnan(baseflow) & ~np.isnan(discharge)[..., np.newaxis]
+    discharge = np.where(valid, discharge[..., np.newaxis], 0.0)
+    baseflow = np.where(valid, baseflow, 0.0)
+
+    # Divergence is measured against the mean of the models valid at each step
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ensemble = baseflow.sum(axis=-1, keepdims=True) / valid.sum(axis=-1, keepdims=True)
+    deviation = np.where(valid, np.abs(baseflow - ensemble), 0.0)
+    baseflow_only = valid & (baseflow >= baseflow_fraction * discharge)
+
+    steps = np.add.reduceat(valid.astype(np.int64), starts, axis=0)
+    discharge_total = np.add.reduceat(discharge, starts, axis=0)
+    baseflow_total = np.add.reduceat(baseflow, starts, axis=0)
+    deviation_total = np.add.reduceat(deviation, starts, axis=0)
+    baseflow_steps = np.add.reduceat(baseflow_only.astype(np.int64), starts, axis=0)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return {
+            'Steps': steps,
+            'BFI': baseflow_total / discharge_total,
+            'Baseflow Volume': baseflow_total * step_seconds,
+            'Percent Baseflow': 100.0 * baseflow_steps / steps,
+            'Divergence': deviation_total / baseflow_total,
+        }
+
+
+def baseflow_summary(streamflow, baseflow, dates, period='year', baseflow_fraction=0.9, step_seconds=86400,
+                     names=None, max_bytes=256 * 2 ** 20):
+    """
+    Computes baseflow statistics for every gauge, model and period in one grouped pass.
+
+    Rows are sorted by period once, then every statistic is summed per period with
+    ``numpy.add.reduceat`` for all gauges and models at once, a chunk of gauges at a time so the
+    working arrays stay within ``max_bytes``. Steps where the streamflow or a model's baseflow is NaN
+    are left out of that model's statistics.
+
+    The statistics are:
+
+    - 'BFI': total baseflow over total streamflow.
+    - 'Baseflow Volume': total baseflow times ``step_seconds``, e.g. cubic feet for daily values in ft³/s.
+    - 'Percent Baseflow': percentage of steps where baseflow is at least ``baseflow_fraction`` of the
+      streamflow.
+    - 'Divergence': total absolute difference from the mean of all models over the model's total
+      baseflow, i.e. how far the model strays from the others.
+
+    Args:
+        streamflow (pandas.Series, pandas.DataFrame or array-like): Streamflow values, shape (time,)
+            or (time, gauges).
+        baseflow (dict): Baseflow by model name, each shaped like ``streamflow``, e.g. the outputs of
+            :mod:`baseflow.models` or :func:`baseflow.batch.batch_filter`.
+        dates (array-like): The date of every row.
+        period (str): 'year', 'month' or 'all' for one row per gauge and model over the whole record.
+        baseflow_fraction (float): Share of the streamflow above which a step counts as baseflow.
+        step_seconds (float): Length of a time step in seconds, for the volumes.
+        names (list): Optional gauge names by column position, e.g. the DataFrame's columns.
+        max_bytes (int): Approximate budget for the working arrays of one chunk of gauges.
+
+    Returns:
+        pandas.DataFrame: One row per (gauge, period, model) with 'Gauge', the period columns ('Year',
+        plus 'Month' for monthly), 'Model', 'Steps' and the statistics above.
+
+    Example:
+        .. code-block:: python
+
+            import pandas as pd
+            discharge = pd.read_csv("/my/sample/huc_discharge.csv", index_col='Date', parse_dates=True)
+            models = {name: batch_filter(discharge, name, alpha=0.925) for name in ['lyne_hollick', 'chapman']}
+            summary = baseflow_summary(discharge, models, discharge.index, period='year',
+                                       names=list(discharge.columns))
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of: {', '.join(PERIODS)}.")
+    streamflow = _as_gauges(streamflow)
+    model_names = list(baseflow)
+    models = [_as_gauges(values) for values in baseflow.values()]
+    if any(values.shape != streamflow.shape for values in models):
+        raise ValueError("Every baseflow series must have the same shape as streamflow.")
+    time, gauges = streamflow.shape
+    if names is None:
+        names = list(range(gauges))
+
+    keys, columns = _period_keys(dates, period)
+    if len(keys) != time:
+        raise ValueError("dates must have one value per row of streamflow.")
+    if time == 0 or gauges == 0 or not models:
+        raise ValueError("Nothing to summarize: streamflow has no rows or gauges, or baseflow has no models.")
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    periods, starts = np.unique(keys, return_index=True)
+    sorted_rows = slice(None) if np.all(order[1:] > order[:-1]) else order
+
+    chunk = max(1, int(max_bytes // (_ARRAYS_PER_VALUE * 8 * time * len(models))))
+    frames = []
+    for first in range(0, gauges, chunk):
+        columns_in_chunk = slice(first, min(first + chunk, gauges))
+        discharge = streamflow[sorted_rows, columns_in_chunk]
+        block = np.stack([values[sorted_rows, columns_in_chunk] for values in models], axis=-1)
+        statistics = _summarize_chunk(discharge, block, starts, baseflow_fraction, step_seconds)
+
+        count = block.shape[1]
+        frame = {'Gauge': np.tile(np.repeat(np.asarray(names, dtype=object)[columns_in_chunk], len(models)),
+                                  len(periods))}
+        for name, from_key in columns.items():
+            frame[name] = np.repeat(from_key(periods), count * len(models))
+        frame['Model'] = np.tile(model_names, len(periods) * count)
+        frame.update({name: values.ravel() for name, values in statistics.items()})
+        frames.append(pd.DataFrame(frame))
+
+    summary = pd.concat(frames, ignore_index=True)
+    summary['Gauge'] = summary['Gauge'].astype('category')
+    summary['Model'] = pd.Categorical(summary['Model'], categories=model_names)
+    return summary
+
+
+def summarize_models(df, model_columns, period='year', station=None, **kwargs):
+    """
+    Computes :func:`baseflow_summary` statistics for one station's model columns.
+
+    Args:
+        df (pandas.DataFrame): A frame with 'Date', 'Discharge' and one column per model, e.g. the
+            output of :func:`baseflow.processing.separate_date_parameters` with model columns added.
+        model_columns (list of str): The model columns to summarize.
+        period (str): 'year', 'month' or 'all'.
+        station (str): Optional USGS Station ID put in the 'Gauge' column.
+        **kwargs: Passed on to :func:`baseflow_summary`.
+
+    Returns:
+        pandas.DataFrame: One row per (period, model).
+
+    Example:
+        .. code-block:: python
+
+            summary = summarize_models(dataset_models, ['Lyne_Hollick', 'Chapman', 'Eckhardt'], period='month')
+    """
+    baseflow = {column: df[column] for column in model_columns}
+    names = [station if station is not None else 0]
+    return baseflow_summary(df['Discharge'], baseflow, df['Date'], period, names=names, **kwargs)
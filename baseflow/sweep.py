@@ -0,0 +1,160 @@
+import itertools
+
+import numpy as np
+import pandas as pd
+
+from baseflow.batch import _filter_name
+from baseflow.engine import first_order_filter, pack_valid, unpack_valid
+from baseflow.models import LINEAR_FILTERS, check_parameters
+
+# Working arrays held per filtered column: the tiled streamflow, the forcing term and the baseflow
+_ARRAYS_PER_COLUMN = 3
+
+
+def parameter_grid(**values):
+    """
+    Builds every combination of the given parameter values.
+
+    Args:
+        **values: One iterable of candidate values per filter parameter.
+
+    Returns:
+        pandas.DataFrame: One row per parameter set and one column per parameter.
+
+    Example:
+        .. code-block:: python
+
+            grid = parameter_grid(alpha=np.linspace(0.9, 0.99, 10), bfi_max=[0.25, 0.5, 0.8])
+    """
+    names = list(values)
+    return pd.DataFrame(list(itertools.product(*values.values())), columns=names, dtype=np.float64)
+
+
+def _as_block(streamflow):
+    if isinstance(streamflow, pd.DataFrame):
+        return streamflow.to_numpy(dtype=np.float64), list(streamflow.columns)
+    if isinstance(streamflow, pd.Series):
+        return streamflow.to_numpy(dtype=np.float64)[:, np.newaxis], [streamflow.name if streamflow.name is not None else 0]
+
+    values = np.asarray(streamflow, dtype=np.float64)
+    if values.ndim not in (1, 2):
+        raise ValueError("streamflow must be 1-D (time,) or 2-D (time, gauges).")
+    values = values.reshape(len(values), -1)
+    return values, list(range(values.shape[1]))
+
+
+def _linear_filter_name(model):
+    name = _filter_name(model)
+    # Sweeps broadcast the parameter sets through one linear recurrence, which hyd_run is not
+    if name not in LINEAR_FILTERS:
+        raise ValueError(f"Parameter sweeps support the linear filters only: {', '.join(LINEAR_FILTERS)}.")
+    return name
+
+
+def _chunk_size(values, max_bytes):
+    per_set = _ARRAYS_PER_COLUMN * values.size * values.itemsize
+    return max(1, int(max_bytes // max(per_set, 1)))
+
+
+def _sweep_chunks(values, name, grid, max_bytes):
+    """
+    Filters every gauge with every parameter set, ``chunk`` parameter sets at a time.
+
+    Gauges are NaN-packed once and then tiled side by side for each chunk, so one chunk is one
+    (time, sets × gauges) block with one coefficient per column.
+    """
+    # Positions in an error are the offending rows of the grid
+    check_parameters(name, {key: grid[key].to_numpy() for key in grid})
+    coefficients, start_from_streamflow = LINEAR_FILTERS[name]
+    packed, order, valid = pack_valid(values)
+    rows = np.arange(len(values))[:, np.newaxis] < valid.sum(axis=0)
+    gauges = values.shape[1]
+    chunk = _chunk_size(values, max_bytes)
+
+    for start in range(0, len(grid), chunk):
+        params = grid.iloc[start:start + chunk]
+        sets = len(params)
+        block = np.tile(packed, (1, sets))
+        column_params = {key: np.repeat(params[key].to_numpy(dtype=np.float64), gauges) for key in params}
+        initial = block[0] if start_from_streamflow else 0.0
+        filtered = first_order_filter(block, *coefficients(**column_params), initial)
+        yield params, packed, rows, filtered.reshape(len(values), sets, gauges), order, valid
+
+
+def iter_sweep(streamflow, model, grid, max_bytes=256 * 2 ** 20):
+    """
+    Yields baseflow for every parameter set in memory-bounded chunks.
+
+    Args:
+        streamflow (pandas.Series, pandas.DataFrame or array-like): One series, or a wide block with
+            one column per gauge.
+        model (str or function): A linear filter from :mod:`baseflow.models`, by name or the function
+            itself; see :data:`baseflow.models.LINEAR_FILTERS`.
+        grid (dict or pandas.DataFrame): Parameter sets, either candidate values per parameter (every
+            combination is evaluated) or a DataFrame with one row per parameter set.
+        max_bytes (int): Approximate budget for the working arrays of one chunk.
+
+    Yields:
+        tuple: ``(params, baseflow)`` where ``params`` is the slice of the grid in this chunk and
+        ``baseflow`` is an array of shape (parameter sets, time, gauges) aligned with the input rows,
+        NaN wherever the input is NaN.
+    """
+    name = _linear_filter_name(model)
+    if isinstance(grid, dict):
+        grid = parameter_grid(**grid)
+    values, _ = _as_block(streamflow)
+
+    for params, _, _, filtered, order, valid in _sweep_chunks(values, name, grid, max_bytes):
+        cube = np.stack([unpack_valid(filtered[:, i], order, valid) for i in range(len(params))])
+        yield params, cube
+
+
+def parameter_sweep(streamflow, model, grid, max_bytes=256 * 2 ** 20):
+    """
+    Evaluates a filter for a grid of parameter sets over one or many gauges.
+
+    All parameter sets in a chunk are filtered together in one broadcasted computation rather than
+    one call per set, and chunks are sized so the working arrays stay within ``max_bytes``.
+
+    Args:
+        streamflow (pandas.Series, pandas.DataFrame or array-like): One series, or a wide block with
+            one column per gauge.
+        model (str or function): A linear filter from :mod:`baseflow.models`, by name or the function
+            itself; see :data:`baseflow.models.LINEAR_FILTERS`.
+        grid (dict or pandas.DataFrame): Parameter sets, either candidate values per parameter (every
+            combination is evaluated) or a DataFrame with one row per parameter set.
+        max_bytes (int): Approximate budget for the working arrays of one chunk.
+
+    Returns:
+        pandas.DataFrame: A tidy table with one row per (parameter set, gauge) holding the parameters,
+        'Gauge', 'BFI' (total baseflow over total streamflow) and 'Mean Baseflow'.
+
+    Example:
+        .. code-block:: python
+
+            import pandas as pd
+            discharge = pd.read_csv("/my/sample/file.csv")
+            grid = {'alpha': np.linspace(0.9, 0.99, 10), 'bfi_max': np.linspace(0.2, 0.8, 7)}
+            summary = parameter_sweep(discharge['Discharge'], 'eckhardt', grid)
+    """
+    name = _linear_filter_name(model)
+    if isinstance(grid, dict):
+        grid = parameter_grid(**grid)
+    values, gauge_names = _as_block(streamflow)
+    gauges = values.shape[1]
+
+    summaries = []
+    for params, packed, rows, filtered, _, _ in _sweep_chunks(values, name, grid, max_bytes):
+        baseflow_total = np.where(rows[:, np.newaxis, :], filtered, 0.0).sum(axis=0)
+        counts = rows.sum(axis=0)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            bfi = baseflow_total / packed.sum(axis=0)
+            mean_baseflow = baseflow_total / counts
+
+        summary = params.loc[params.index.repeat(gauges)].reset_index(drop=True)
+        summary['Gauge'] = np.tile(gauge_names, len(params))
+        summary['BFI'] = bfi.ravel()
+        summary['Mean Baseflow'] = mean_baseflow.ravel()
+        summaries.append(summary)
+
+    return pd.concat(summaries, ignore_index=True)
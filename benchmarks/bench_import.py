@@ -0,0 +1,75 @@
+"""
+Import-time benchmark and guard for the lightweight core import path.
+
+Each module is imported in a fresh interpreter. `import baseflow` and `import baseflow.models` must not
+load pandas, SciPy, matplotlib, plotly or the network stack; the script exits with status 1 if they do.
+
+Run from the repository root:
+
+    python benchmarks/bench_import.py
+    python benchmarks/bench_import.py --repeat 10
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# Modules that must stay out of the core import path
+HEAVY_MODULES = ('pandas', 'scipy', 'matplotlib', 'plotly', 'urllib3', 'pyarrow')
+
+# Module to import and whether it must stay free of HEAVY_MODULES
+IMPORTS = {
+    'baseflow': True,
+    'baseflow.models': True,
+    'baseflow.batch': False,
+    'baseflow.processing': False,
+    'baseflow.plots': False,
+}
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted({{name.split('.')[0] for name in sys.modules}})}}))
+"""
+
+
+def import_time(module):
+    """
+    Imports a module in a fresh interpreter.
+
+    Returns:
+        tuple: (seconds spent in the import statement, list of top-level packages loaded afterwards).
+    """
+    output = subprocess.run([sys.executable, '-c', _PROBE.format(module=module)], cwd=ROOT, check=True,
+                            capture_output=True, text=True).stdout
+    result = json.loads(output)
+    return result['seconds'], result['modules']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Fresh interpreters per module; the best is kept.')
+    args = parser.parse_args()
+
+    failures = []
+    print(f"{'module':<24}{'import (ms)':>12}  heavy modules loaded")
+    for module, must_be_light in IMPORTS.items():
+        runs = [import_time(module) for _ in range(args.repeat)]
+        seconds = min(run[0] for run in runs)
+        heavy = sorted(set(runs[0][1]) & set(HEAVY_MODULES))
+        print(f"{module:<24}{seconds * 1000:>12.1f}  {', '.join(heavy) or '-'}")
+        if must_be_light and heavy:
+            failures.append((module, heavy))
+
+    for module, heavy in failures:
+        print(f"FAIL {module} loads {', '.join(heavy)}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+"""
+Times every recursive filter in baseflow.models against the pure-Python loops it replaced.
+
+Run from the repository root:
+
+    python benchmarks/bench_models.py --length 36500 --repeat 5
+"""
+import argparse
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from baseflow import models
+
+
+def _loop_lyne_hollick(streamflow, alpha):
+    baseflow_value = streamflow[0]
+    baseflow_list = [baseflow_value]
+    for current, previous in zip(streamflow[1:], streamflow[:-1]):
+        baseflow_value = current - (alpha * (previous - baseflow_value) + ((1 + alpha) / 2) * (current - previous))
+        baseflow_list.append(baseflow_value)
+    return baseflow_list
+
+
+def _loop_chapman(streamflow, alpha):
+    baseflow_value = streamflow[0]
+    baseflow_list = [baseflow_value]
+    for current, previous in zip(streamflow[1:], streamflow[:-1]):
+        baseflow_value = ((3 * alpha - 1) / (3 - alpha)) * baseflow_value + ((1 - alpha) / (3 - alpha)) * (
+                current + previous)
+        baseflow_list.append(baseflow_value)
+    return baseflow_list
+
+
+def _loop_eckhardt(streamflow, alpha, bfi_max):
+    baseflow_value = streamflow[0]
+    baseflow_list = [baseflow_value]
+    for current in streamflow[1:]:
+        baseflow_value = ((1 - bfi_max) * alpha * baseflow_value + (1 - alpha) * bfi_max * current) / (
+                1 - (alpha * bfi_max))
+        baseflow_list.append(baseflow_value)
+    return baseflow_list
+
+
+def _loop_chapman_maxwell(streamflow, k):
+    baseflow_value = streamflow[0]
+    baseflow_list = [baseflow_value]
+    for current in streamflow[1:]:
+        baseflow_value = (1 / (2 - k)) * baseflow_value + ((1 - k) / (2 - k)) * current
+        baseflow_list.append(baseflow_value)
+    return baseflow_list
+
+
+def _loop_boughton(streamflow, k, C):
+    baseflow_value = streamflow[0]
+    baseflow_list = [baseflow_value]
+    for current in streamflow[1:]:
+        baseflow_value = (k / (1 + C)) * baseflow_value + (C / (1 + C)) * current
+        baseflow_list.append(baseflow_value)
+    return baseflow_list
+
+
+def _loop_furey_gupta(streamflow, gamma, c1, c3):
+    baseflow_list = [streamflow[0]]
+    for i in range(1, len(streamflow)):
+        b_t_minus_1 = baseflow_list[-1]
+        baseflow_list.append((1 - gamma) * b_t_minus_1 + gamma * (c3 / c1) * (streamflow[i - 1] - b_t_minus_1))
+    return baseflow_list
+
+
+def _loop_what(streamflow, BFImax, alpha):
+    baseflow = np.zeros_like(streamflow)
+    for t in range(1, len(streamflow)):
+        baseflow[t] = ((1 - BFImax) * alpha * baseflow[t - 1] + (1 - alpha) * BFImax * streamflow[t]) / (
+                1 - alpha * BFImax)
+    return baseflow
+
+
+def _loop_hyd_run(streamflow, k, passes):
+    values = list(streamflow)
+    for p in range(passes):
+        values = values if p % 2 == 0 else values[::-1]
+        baseflow_list = [values[0]]
+        for i in range(1, len(values)):
+            baseflow_list.append(min(k * baseflow_list[-1] + (1 - k) * (values[i] + values[i - 1]) / 2, values[i]))
+        values = baseflow_list if p % 2 == 0 else baseflow_list[::-1]
+    return values
+
+
+# name: (vectorized call, loop reference, parameters)
+CASES = {
+    'lyne_hollick': (lambda q, p: models.lyne_hollick(pd.Series(q), *p), _loop_lyne_hollick, (0.925,)),
+    'chapman': (lambda q, p: models.chapman(pd.Series(q), *p, 0.075), _loop_chapman, (0.925,)),
+    'eckhardt': (lambda q, p: models.eckhardt(pd.Series(q), *p), _loop_eckhardt, (0.925, 0.8)),
+    'chapman_maxwell': (lambda q, p: models.chapman_maxwell(pd.Series(q), *p), _loop_chapman_maxwell, (0.7,)),
+    'boughton': (lambda q, p: models.boughton(pd.Series(q), *p), _loop_boughton, (0.925, 0.1)),
+    'furey_gupta': (lambda q, p: models.furey_gupta(pd.Series(q), *p), _loop_furey_gupta, (0.1, 1.0, 0.5)),
+    'what': (lambda q, p: models.what(pd.DataFrame({'streamflow': q}), *p)[0], _loop_what, (0.8, 0.925)),
+    'hyd_run': (lambda q, p: models.hyd_run(pd.Series(q), *p), _loop_hyd_run, (0.925, 4)),
+}
+
+
+def synthetic_streamflow(length, seed=0):
+    """
+    Builds a positive, autocorrelated daily discharge series with storm peaks.
+
+    Args:
+        length (int): Number of time steps.
+        seed (int): Seed for the random generator.
+
+    Returns:
+        numpy.ndarray: A float64 array of discharge values.
+    """
+    rng = np.random.default_rng(seed)
+    seasonal = 1000 + 500 * np.sin(np.arange(length) * 2 * np.pi / 365.25)
+    storms = rng.exponential(1.0, length) ** 3 * 50
+    return seasonal + pd.Series(storms).ewm(alpha=0.3).mean().to_numpy()
+
+
+def run(length, repeat):
+    streamflow = synthetic_streamflow(length)
+    print(f"{'filter':<16}{'loop (s)':>12}{'vectorized (s)':>16}{'speedup':>10}{'max abs err':>14}")
+    for name, (vectorized, loop, params) in CASES.items():
+        expected = np.asarray(loop(streamflow, *params), dtype=np.float64)
+        result = vectorized(streamflow, params)
+        error = np.max(np.abs(result - expected))
+        loop_time = min(timeit.repeat(lambda: loop(streamflow, *params), number=1, repeat=repeat))
+        vectorized_time = min(timeit.repeat(lambda: vectorized(streamflow, params), number=1, repeat=repeat))
+        print(f"{name:<16}{loop_time:>12.4f}{vectorized_time:>16.5f}{loop_time / vectorized_time:>9.0f}x{error:>14.2e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--length', type=int, default=36500, help='Number of daily values per series.')
+    parser.add_argument('--repeat', type=int, default=5, help='Timing repetitions; the best is reported.')
+    args = parser.parse_args()
+    run(args.length, args.repeat)
@@ -0,0 +1,216 @@
+"""
+Offline benchmark suite and regression check for baseflow.models and baseflow.processing.
+
+Every filter is timed on synthetic series over a range of lengths and gauge counts, and every
+processing step over a range of lengths; one case also runs on the bundled
+USGS_Data_for_01636500.txt. Results are appended to a JSON history, and each run is compared with the
+previous one so slowdowns between releases are caught.
+
+Run from the repository root:
+
+    python benchmarks/suite.py --label v0.0.2
+    python benchmarks/suite.py --lengths 1e3,1e4,1e5,1e6,1e7 --gauges 1,10,100,1000,10000
+"""
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from baseflow import models, processing
+from baseflow.batch import batch_filter
+from baseflow.ensemble import run_ensemble
+from baseflow.periods import calendar_index, clear_calendar_indexes
+from baseflow.segments import duration_stats, segment_hydrograph
+from baseflow.summary import summarize_models
+from bench_models import synthetic_streamflow
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+BUNDLED_DATA = os.path.join(ROOT, 'USGS_Data_for_01636500.txt')
+
+FILTER_PARAMS = {
+    'lyne_hollick': {'alpha': 0.925},
+    'chapman': {'alpha': 0.925},
+    'eckhardt': {'alpha': 0.925, 'bfi_max': 0.8},
+    'chapman_maxwell': {'k': 0.7},
+    'boughton': {'k': 0.925, 'C': 0.1},
+    'furey_gupta': {'gamma': 0.1, 'c1': 1.0, 'c3': 0.5},
+    'what': {'BFImax': 0.8, 'alpha': 0.925},
+    'hyd_run': {'k': 0.925, 'passes': 4},
+}
+
+PREDICTION_COLUMNS = ['Lyne_Hollick', 'Chapman']
+
+# Slowdowns smaller than this many seconds are never reported, whatever their ratio
+MIN_DELTA = 0.001
+
+
+def _best_time(function, repeat):
+    # One untimed call first, so imports, lazy caches and allocator warm-up don't land in the timings
+    function()
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def _station_frame(streamflow):
+    # Daily dates would run past the year 2262 limit of pandas timestamps, so long series are 15-minute
+    frequency = 'D' if len(streamflow) <= 100000 else '15min'
+    df = pd.DataFrame({
+        'Date': pd.date_range('1900-01-01', periods=len(streamflow), freq=frequency),
+        'Discharge': streamflow,
+    })
+    df = processing.separate_date_parameters(df)
+    df['Lyne_Hollick'] = batch_filter(df['Discharge'], 'lyne_hollick', alpha=0.925)
+    df['Chapman'] = batch_filter(df['Discharge'], 'chapman', alpha=0.925)
+    return df
+
+
+def filter_cases(lengths, gauges, max_elements):
+    """Yields (case name, callable) for every filter, length and gauge count within the size limit."""
+    for length in lengths:
+        for count in gauges:
+            if length * count > max_elements:
+                continue
+            block = np.column_stack([synthetic_streamflow(length, seed) for seed in range(min(count, 8))])
+            block = np.tile(block, (1, -(-count // block.shape[1])))[:, :count]
+            for name, params in FILTER_PARAMS.items():
+                yield (f'filter/{name}/n={length}/gauges={count}',
+                       lambda block=block, name=name, params=params: batch_filter(block, name, **params))
+            if count == 1:
+                specs = list(FILTER_PARAMS.items())
+                yield (f'filter/ensemble/n={length}/gauges=1',
+                       lambda series=block[:, 0], specs=specs: run_ensemble(series, specs))
+
+
+def processing_cases(lengths, max_elements):
+    """Yields (case name, callable) for every processing step and length within the size limit."""
+    for length in lengths:
+        if length > max_elements:
+            continue
+        df = _station_frame(synthetic_streamflow(length))
+        dates = df['Date']
+        # Decoding the dates from scratch; the other steps reuse the shared calendar index
+        yield (f'processing/calendar_index/n={length}',
+               lambda dates=dates: (clear_calendar_indexes(), calendar_index(dates)))
+        yield (f'processing/separate_date_parameters/n={length}',
+               lambda df=df: processing.separate_date_parameters(df[['Date', 'Discharge']].copy()))
+        yield (f'processing/quantiles/n={length}',
+               lambda df=df: processing.quantiles(df, 'Month', 0.9))
+        yield (f'processing/label_rows/n={length}',
+               lambda df=df: processing.label_rows(df.copy(), PREDICTION_COLUMNS, 200))
+        yield (f'processing/create_quantiles_dataframe/n={length}',
+               lambda df=df, dates=dates: processing.create_quantiles_dataframe(dates, df['Discharge'], 0.9))
+        yield (f'processing/summarize_models/n={length}',
+               lambda df=df: summarize_models(df, PREDICTION_COLUMNS, 'month'))
+        yield (f'processing/duration_stats/n={length}',
+               lambda df=df, dates=dates: duration_stats(segment_hydrograph(df['Discharge']), dates, 'month'))
+        yield (f'processing/fill_gaps/n={length}',
+               lambda df=df: processing.fill_gaps(df['Discharge'], max_gap=3, method='log'))
+
+
+def bundled_cases():
+    """Yields the full execution.py chain on the bundled station file."""
+    df = pd.read_csv(BUNDLED_DATA, header=None, names=['Date', 'Discharge'], parse_dates=[0])
+
+    def chain():
+        data = processing.separate_date_parameters(processing.clean_ffill(df.copy()))
+        data['Lyne_Hollick'] = models.lyne_hollick(data['Discharge'], 0.925)
+        data['Chapman'] = models.chapman(data['Discharge'], 0.925, 0.075)
+        data['Eckhardt'] = models.eckhardt(data['Discharge'], 0.8, 0.6)
+        data['Chapman_Maxwell'] = models.chapman_maxwell(data['Discharge'], 0.7)
+        data = processing.quantiles(data, 'Month', 0.9)
+        return processing.label_rows(data, PREDICTION_COLUMNS, 200)
+
+    yield 'bundled/01636500/execution_chain', chain
+
+
+def run(lengths, gauges, repeat, max_elements):
+    results = {}
+    # Cases are generated lazily so only one size's data is in memory at a time
+    cases = itertools.chain(filter_cases(lengths, gauges, max_elements), processing_cases(lengths, max_elements),
+                            bundled_cases())
+    for name, function in cases:
+        results[name] = _best_time(function, repeat)
+        print(f'{name:<60}{results[name]:>12.5f} s')
+    return results
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)
+
+
+def compare(previous, results, tolerance, min_delta=MIN_DELTA):
+    """
+    Lists cases that got slower than ``tolerance`` times their previous timing by at least ``min_delta``.
+
+    The absolute floor keeps timer noise on sub-millisecond cases from being reported as a regression.
+
+    Returns:
+        list of tuple: (case, previous seconds, current seconds) for every regression.
+    """
+    regressions = []
+    for name, seconds in results.items():
+        before = previous.get(name)
+        if before and seconds > before * tolerance and seconds - before >= min_delta:
+            regressions.append((name, before, seconds))
+    return regressions
+
+
+def _parse_sizes(text):
+    return [int(float(value)) for value in text.split(',') if value]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--lengths', default='1e3,1e4,1e5', help='Comma-separated series lengths.')
+    parser.add_argument('--gauges', default='1,100', help='Comma-separated gauge counts.')
+    parser.add_argument('--repeat', type=int, default=3, help='Timing repetitions; the best is kept.')
+    parser.add_argument('--max-elements', type=float, default=1e8,
+                        help='Skip cases whose length x gauges exceeds this (memory guard).')
+    parser.add_argument('--history', default=os.path.join(ROOT, 'benchmarks', 'history.json'),
+                        help='JSON file the run is appended to.')
+    parser.add_argument('--label', default='', help='Name of this run, e.g. a release tag.')
+    parser.add_argument('--tolerance', type=float, default=1.25,
+                        help='Flag cases slower than this factor times the previous run.')
+    parser.add_argument('--min-delta', type=float, default=MIN_DELTA,
+                        help='Only flag cases that also got at least this many seconds slower.')
+    args = parser.parse_args()
+
+    results = run(_parse_sizes(args.lengths), _parse_sizes(args.gauges), args.repeat, args.max_elements)
+
+    history = load_history(args.history)
+    regressions = compare(history[-1]['results'], results, args.tolerance, args.min_delta) if history else []
+    history.append({
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'label': args.label,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'machine': platform.machine(),
+        'results': results,
+    })
+    with open(args.history, 'w') as file:
+        json.dump(history, file, indent=2)
+
+    for name, before, seconds in regressions:
+        print(f'REGRESSION {name}: {before:.5f} s -> {seconds:.5f} s ({seconds / before:.2f}x)')
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
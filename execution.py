@@ -1,27 +1,40 @@
 from baseflow.processing import *
 from baseflow.models import *
 from baseflow.plots import *
+from baseflow.cache import enable_cache
+from baseflow.ensemble import ensemble_frame
+import os
 import ssl
 
 # This restores the same behavior as before.
 ssl._create_default_https_context = ssl._create_unverified_context
 
+MODEL_SPECS = [
+    ('lyne_hollick', {'alpha': 0.925}),
+    ('chapman', {'alpha': 0.925, 'beta': 0.075}),
+    ('eckhardt', {'alpha': 0.8, 'bfi_max': 0.6}),
+    ('chapman_maxwell', {'k': 0.7}),
+]
+
 
 def main():
+    # Set BASEFLOW_FILTER_CACHE to a folder to reuse filter results from earlier runs on the same data
+    # with the same parameters, e.g. BASEFLOW_FILTER_CACHE=filter_cache python execution.py
+    cache_dir = os.environ.get('BASEFLOW_FILTER_CACHE')
+    if cache_dir:
+        enable_cache(cache_dir=cache_dir)
+
     dataset = fetch_and_process_usgs_data('01636500', '2019-06-10', '2023-10-07')
     cleaned_dataset = clean_ffill(dataset)
-    dataset_models = cleaned_dataset.copy()
-    dataset_models = separate_date_parameters(dataset_models)
-    dataset_models['Lyne_Hollick'] = lyne_hollick(dataset_models['Discharge'], 0.925)
-    dataset_models['Chapman'] = chapman(dataset_models['Discharge'], 0.925, 0.075)
-    dataset_models['Eckhardt'] = eckhardt(dataset_models['Discharge'], 0.8, 0.6)
-    dataset_models['Chapman_Maxwell'] = chapman_maxwell(dataset_models['Discharge'], 0.7)
+    dataset_models = separate_date_parameters(cleaned_dataset)
+    # All four filters in one pass; the columns are named Lyne_Hollick, Chapman, Eckhardt and Chapman_Maxwell
+    dataset_models = ensemble_frame(dataset_models, MODEL_SPECS, statistics=False)
 
     dataset_models = quantiles(dataset_models, 'Month', 0.9)
 
     column_names = dataset_models.columns[5:].tolist()
 
-    label_rows(dataset_models, column_names, 200)
+    label_rows(dataset_models, column_names, 200, output_file='labled_data.csv')
 
     # plot the data
     plot_discharge_and_models(dataset_models, column_names)
@@ -8,6 +8,12 @@ ssl._create_default_https_context = ssl._create_unverified_context
 
 def main():
     data = 'manually.csv'
+    # Or detect the periods instead of picking them by hand:
+    # from baseflow.processing import fetch_and_process_usgs_data
+    # from baseflow.segments import segment_hydrograph, segment_table
+    # dataset = fetch_and_process_usgs_data('01636500', '2019-06-10', '2023-10-07')
+    # periods = segment_table(segment_hydrograph(dataset['Discharge'], min_length=5), dataset['Date'])
+    # data = periods[periods['Kind'] == 'recession']
     average_yearly_duration(data)
     # total_monthly_duration(data)
     # total_yearly_duration(data)
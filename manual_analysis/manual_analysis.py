@@ -1,24 +1,74 @@
 import pandas as pd
 import matplotlib.pyplot as plt
 
+# Period keys the script can still group by with pandas when the baseflow package is not installed
+DATE_ACCESSORS = {'year': 'year', 'month': 'month', 'day': 'day', 'day_of_year': 'dayofyear'}
 
-def average_yearly_duration (data):
 
-    # Load the data from the CSV file
-    data = pd.read_csv(data)
+def load_periods(data):
+    """
+    Loads baseflow periods with their durations.
+
+    Parameters:
+        data (str or pandas.DataFrame): Path to a CSV file of manually picked periods with 'start_date'
+            and 'end_date' columns, or a table of detected periods from
+            baseflow.segments.segment_table, e.g. its recession segments.
+
+    Returns:
+        pandas.DataFrame: The periods with 'start_date', 'end_date' and 'duration_days'.
+    """
+    if isinstance(data, pd.DataFrame):
+        data = data.copy()
+    else:
+        # Load the data from the CSV file
+        data = pd.read_csv(data)
 
     # Convert date columns to datetime objects
     data['start_date'] = pd.to_datetime(data['start_date'])
     data['end_date'] = pd.to_datetime(data['end_date'])
 
-    # Calculate the time duration for each period (in days, you can change it to weeks, months, etc.)
+    # Calculate the time duration for each period (in days)
     data['duration_days'] = (data['end_date'] - data['start_date']).dt.days
+    return data
+
 
-    # Group the data by different time periods (e.g., annually)
-    annual_groups = data.groupby(data['start_date'].dt.year)
+def duration_by_period(data, key, how='sum'):
+    """
+    Totals or averages the period durations by the year, month or season of their start dates.
 
-    # Calculate statistics for each group (e.g., mean duration)
-    annual_stats = annual_groups['duration_days'].mean()
+    The start dates are decoded once into a shared calendar index (baseflow.periods.calendar_index)
+    and grouped by integer keys, instead of decoding them and hashing them in a groupby on every call.
+    The baseflow package is imported here rather than at the top, so the script also runs from a plain
+    checkout (python execution.py) without installing it; the keys in DATE_ACCESSORS then fall back to
+    a pandas groupby with the same result.
+
+    Parameters:
+        data (pandas.DataFrame): Periods from load_periods.
+        key (str): A period key of baseflow.periods.PERIOD_KEYS, e.g. 'year' or 'month'.
+        how (str): 'sum' or 'mean' of the durations.
+
+    Returns:
+        pandas.Series: One value per key value present, in increasing key order.
+    """
+    try:
+        from baseflow.periods import calendar_index, period_groups, reduce_groups
+    except ImportError:
+        if key not in DATE_ACCESSORS:
+            raise ImportError(f"Grouping by '{key}' needs the baseflow package. Install it from the repository "
+                              "root with: pip install -e .") from None
+        keys = getattr(data['start_date'].dt, DATE_ACCESSORS[key])
+        return data['duration_days'].groupby(keys.to_numpy()).agg(how).astype(float).rename(None)
+
+    groups = period_groups(calendar_index(data['start_date']), key)
+    return pd.Series(reduce_groups(groups, data['duration_days'], how), index=groups['labels'][key])
+
+
+def average_yearly_duration (data):
+
+    data = load_periods(data)
+
+    # Calculate statistics for each year (e.g., mean duration)
+    annual_stats = duration_by_period(data, 'year', how='mean')
 
     # Visualize the annual pattern (you can change it to other periods)
     plt.figure(figsize=(10, 6))
@@ -30,22 +80,10 @@ def average_yearly_duration (data):
 
 def total_monthly_duration (data):
 
-    # Load the data from the CSV file
-    data = pd.read_csv(data)
-
-    # Convert date columns to datetime objects
-    data['start_date'] = pd.to_datetime(data['start_date'])
-    data['end_date'] = pd.to_datetime(data['end_date'])
-
-    # Calculate the time duration for each period (in days)
-    data['duration_days'] = (data['end_date'] - data['start_date']).dt.days
-
-    # Group the data by month
-    data['month'] = data['start_date'].dt.month
-    monthly_groups = data.groupby('month')
+    data = load_periods(data)
 
     # Calculate the total duration for each month
-    monthly_totals = monthly_groups['duration_days'].sum()
+    monthly_totals = duration_by_period(data, 'month')
 
     # Visualize the monthly pattern
     months = ['January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October', 'November', 'December']
@@ -60,22 +98,10 @@ def total_monthly_duration (data):
 
 def total_yearly_duration(data):
 
-    # Load the data from the CSV file
-    data = pd.read_csv('manually.csv')
-
-    # Convert date columns to datetime objects
-    data['start_date'] = pd.to_datetime(data['start_date'])
-    data['end_date'] = pd.to_datetime(data['end_date'])
-
-    # Calculate the time duration for each period (in days)
-    data['duration_days'] = (data['end_date'] - data['start_date']).dt.days
-
-    # Group the data by year
-    data['year'] = data['start_date'].dt.year
-    yearly_groups = data.groupby('year')
+    data = load_periods(data)
 
     # Calculate the total duration for each year
-    yearly_totals = yearly_groups['duration_days'].sum()
+    yearly_totals = duration_by_period(data, 'year')
 
     # Visualize the yearly totals
     plt.figure(figsize=(10, 6))
@@ -87,15 +113,7 @@ def total_yearly_duration(data):
 
 def total_seasonal_duration(data):
 
-    # Load the data from the CSV file
-    data = pd.read_csv('manually.csv')
-
-    # Convert date columns to datetime objects
-    data['start_date'] = pd.to_datetime(data['start_date'])
-    data['end_date'] = pd.to_datetime(data['end_date'])
-
-    # Calculate the time duration for each period (in days)
-    data['duration_days'] = (data['end_date'] - data['start_date']).dt.days
+    data = load_periods(data)
 
     # Define the mapping of months to seasons
     season_mapping = {
@@ -113,14 +131,9 @@ def total_seasonal_duration(data):
         12: 'Winter',
     }
 
-    # Assign the season to each row based on the start date
-    data['season'] = data['start_date'].dt.month.map(season_mapping)
-
-    # Group the data by season
-    season_groups = data.groupby('season')
-
-    # Calculate the total duration for each season
-    season_totals = season_groups['duration_days'].sum()
+    # Total the durations by the month of the start date, then add up the months of each season
+    monthly_totals = duration_by_period(data, 'month')
+    season_totals = monthly_totals.groupby(monthly_totals.index.map(season_mapping)).sum()
 
     # Visualize the season totals
     plt.figure(figsize=(10, 6))
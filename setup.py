@@ -9,5 +9,11 @@ setup(
     name='baseflow',
     version='0.0.1',
     packages=find_packages(),
-    install_requires=install_requires
+    install_requires=install_requires,
+    extras_require={
+        'store': ['pyarrow'],
+    },
+    entry_points={
+        'console_scripts': ['baseflow=baseflow.cli:main'],
+    },
 )
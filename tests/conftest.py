@@ -0,0 +1,73 @@
+import http.server
+import os
+import sys
+import threading
+import urllib.parse
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from baseflow.cache import disable_cache
+
+DATA_DIR = os.path.join(os.path.dirname(__file__), 'data')
+
+
+@pytest.fixture
+def streamflow():
+    """Two years of positive daily streamflow with a few NaN gaps, like a cleaned NWIS record."""
+    rng = np.random.default_rng(42)
+    values = 1000 + 500 * np.sin(np.arange(730) / 58) + rng.gamma(2.0, 150.0, 730)
+    values[[0, 17, 18, 19, 400, 729]] = np.nan
+    return values
+
+
+@pytest.fixture(autouse=True)
+def no_cache():
+    # Tests that enable the filter cache must not leak it into the others
+    yield
+    disable_cache()
+
+
+class _StubNWISHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        query = urllib.parse.parse_qs(urllib.parse.urlparse(self.path).query)
+        station = (query.get('search_site_no') or query.get('sites'))[0]
+        self.server.requests.append((station, query))
+        replies = self.server.replies.get(station, [(404, b'No sites found')])
+        if callable(replies):
+            status, body = replies(query)
+        else:
+            # Replies are served in order and the last one repeats
+            status, body = replies.pop(0) if len(replies) > 1 else replies[0]
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def nwis_server():
+    """
+    A local NWIS stand-in. Set ``server.replies[station]`` to a list of (status, body) pairs, or to a
+    function of the parsed query returning one; every request is recorded in ``server.requests`` as
+    (station, query). Its URL is ``server.url``.
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _StubNWISHandler)
+    server.replies, server.requests = {}, []
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/nwis/dv'
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def rdb_body():
+    with open(os.path.join(DATA_DIR, '01636500_dv.rdb'), 'rb') as file:
+        return file.read()
@@ -0,0 +1,70 @@
+"""Plain-loop versions of the published filter recurrences, used as the expected results in the tests."""
+import numpy as np
+
+
+def lyne_hollick(q, alpha):
+    b = [q[0]]
+    for current, previous in zip(q[1:], q[:-1]):
+        b.append(current - (alpha * (previous - b[-1]) + ((1 + alpha) / 2) * (current - previous)))
+    return b
+
+
+def chapman(q, alpha, beta=None):
+    b = [q[0]]
+    for current, previous in zip(q[1:], q[:-1]):
+        b.append(((3 * alpha - 1) / (3 - alpha)) * b[-1] + ((1 - alpha) / (3 - alpha)) * (current + previous))
+    return b
+
+
+def eckhardt(q, alpha, bfi_max):
+    b = [q[0]]
+    for current in q[1:]:
+        b.append(((1 - bfi_max) * alpha * b[-1] + (1 - alpha) * bfi_max * current) / (1 - alpha * bfi_max))
+    return b
+
+
+def chapman_maxwell(q, k):
+    b = [q[0]]
+    for current in q[1:]:
+        b.append((1 / (2 - k)) * b[-1] + ((1 - k) / (2 - k)) * current)
+    return b
+
+
+def boughton(q, k, C):
+    b = [q[0]]
+    for current in q[1:]:
+        b.append((k / (1 + C)) * b[-1] + (C / (1 + C)) * current)
+    return b
+
+
+def furey_gupta(q, gamma, c1, c3):
+    b = [q[0]]
+    for previous in q[:-1]:
+        b.append((1 - gamma) * b[-1] + gamma * (c3 / c1) * (previous - b[-1]))
+    return b
+
+
+def what(q, BFImax, alpha):
+    b = [0.0]
+    for current in q[1:]:
+        b.append(((1 - BFImax) * alpha * b[-1] + (1 - alpha) * BFImax * current) / (1 - alpha * BFImax))
+    return b
+
+
+# Every filter of the form b[t] = a * b[t-1] + c0 * Q[t] + c1 * Q[t-1], with test parameters
+LINEAR_CASES = [
+    ('lyne_hollick', lyne_hollick, {'alpha': 0.925}),
+    ('chapman', chapman, {'alpha': 0.925, 'beta': None}),
+    ('eckhardt', eckhardt, {'alpha': 0.98, 'bfi_max': 0.8}),
+    ('chapman_maxwell', chapman_maxwell, {'k': 0.7}),
+    ('boughton', boughton, {'k': 0.95, 'C': 0.05}),
+    ('furey_gupta', furey_gupta, {'gamma': 0.1, 'c1': 1.0, 'c3': 0.5}),
+]
+
+
+def expected(reference, streamflow, params):
+    """Runs a reference on the non-NaN values, as the filters do, and puts NaN back at the gaps."""
+    result = np.full(len(streamflow), np.nan)
+    valid = ~np.isnan(streamflow)
+    result[valid] = reference(streamflow[valid].tolist(), **params)
+    return result
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow import models
+from baseflow.batch import batch_filter
+from reference import LINEAR_CASES, expected
+
+
+@pytest.mark.parametrize('name, reference, params', LINEAR_CASES)
+def test_batch_filter_matches_each_column(name, reference, params, streamflow):
+    block = np.column_stack([streamflow, streamflow[::-1], streamflow * 2])
+    baseflow = batch_filter(block, name, **params)
+
+    assert baseflow.shape == block.shape
+    for column in range(block.shape[1]):
+        np.testing.assert_allclose(baseflow[:, column], expected(reference, block[:, column], params), rtol=1e-10)
+
+
+def test_batch_filter_per_column_parameters(streamflow):
+    block = np.column_stack([streamflow, streamflow])
+    baseflow = batch_filter(block, 'lyne_hollick', alpha=np.array([0.9, 0.95]))
+
+    np.testing.assert_allclose(baseflow[:, 0], models.lyne_hollick(streamflow, 0.9))
+    np.testing.assert_allclose(baseflow[:, 1], models.lyne_hollick(streamflow, 0.95))
+
+
+def test_batch_filter_keeps_frame_labels(streamflow):
+    discharge = pd.DataFrame({'01636500': streamflow, '01646500': streamflow * 3},
+                             index=pd.date_range('2019-01-01', periods=len(streamflow), name='Date'))
+    baseflow = batch_filter(discharge, models.eckhardt, alpha=0.98, bfi_max=0.8)
+
+    assert isinstance(baseflow, pd.DataFrame)
+    assert baseflow.index.equals(discharge.index)
+    assert list(baseflow.columns) == list(discharge.columns)
+    np.testing.assert_allclose(baseflow['01646500'], models.eckhardt(streamflow * 3, 0.98, 0.8))
+
+
+@pytest.mark.parametrize('values, shape', [(np.array([]), (0,)), (np.empty((0, 3)), (0, 3))])
+def test_batch_filter_empty_input(values, shape):
+    assert batch_filter(values, 'eckhardt', alpha=0.98, bfi_max=0.8).shape == shape
+    assert batch_filter(values, 'hyd_run', k=0.9, passes=4).shape == shape
+
+
+def test_batch_filter_empty_frame():
+    baseflow = batch_filter(pd.DataFrame({'A': [], 'B': []}, dtype=float), 'lyne_hollick', alpha=0.925)
+    assert isinstance(baseflow, pd.DataFrame)
+    assert list(baseflow.columns) == ['A', 'B'] and baseflow.empty
+
+
+def test_batch_filter_rejects_unknown_filters_and_shapes(streamflow):
+    with pytest.raises(ValueError, match='Unknown filter'):
+        batch_filter(streamflow, 'no_such_filter', alpha=0.9)
+    with pytest.raises(ValueError, match='1-D'):
+        batch_filter(np.ones((3, 3, 3)), 'lyne_hollick', alpha=0.9)
+
+
+def test_batch_filter_validates_parameters_per_column(streamflow):
+    block = np.column_stack([streamflow, streamflow, streamflow])
+    with pytest.raises(ValueError, match=r'eckhardt: alpha .* \(positions 2\)'):
+        batch_filter(block, 'eckhardt', alpha=np.array([0.9, 0.95, 1.0]), bfi_max=0.8)
+    with pytest.raises(ValueError, match='boughton: C'):
+        batch_filter(block, 'boughton', k=0.9, C=-1.0)
+
+
+def test_check_parameters():
+    models.check_parameters('chapman_maxwell', {'k': 1.0})
+    with pytest.raises(ValueError, match='exclusive'):
+        models.check_parameters('eckhardt', {'alpha': 0.9, 'bfi_max': 0.0})
+    with pytest.raises(ValueError, match='positions 1'):
+        models.check_parameters('lyne_hollick', {'alpha': np.array([0.9, np.nan])})
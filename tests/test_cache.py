@@ -0,0 +1,107 @@
+import ssl
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow import cache
+from baseflow.cache import cache_info, enable_cache, fingerprint
+from baseflow.models import eckhardt, lyne_hollick
+
+
+def test_fingerprint_follows_contents(streamflow):
+    assert fingerprint(streamflow, 0.925) == fingerprint(streamflow.copy(), 0.925)
+    assert fingerprint(streamflow, 0.925) == fingerprint(pd.Series(streamflow), 0.925)
+
+    edited = streamflow.copy()
+    edited[300] += 1e-9
+    assert fingerprint(edited, 0.925) != fingerprint(streamflow, 0.925)
+    assert fingerprint(streamflow, 0.93) != fingerprint(streamflow, 0.925)
+    assert fingerprint(streamflow.astype(np.float32), 0.925) != fingerprint(streamflow, 0.925)
+    assert fingerprint({'alpha': 0.925}) != fingerprint({'k': 0.925})
+    assert fingerprint(1) != fingerprint(1.0)
+
+
+def test_fingerprint_hashes_buffers_by_contents():
+    values = np.arange(10, dtype=np.float64)
+    view = memoryview(values)
+    before = fingerprint(view)
+
+    values[3] = -1.0
+    assert fingerprint(view) != before
+    assert fingerprint(memoryview(values)) == fingerprint(view)
+    assert fingerprint(values.tobytes()) != fingerprint(np.arange(10, dtype=np.float64).tobytes())
+
+
+def test_fingerprint_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        fingerprint(object())
+
+
+def test_edited_data_is_not_served_stale(streamflow):
+    enable_cache()
+    first = lyne_hollick(streamflow, 0.925)
+    np.testing.assert_array_equal(lyne_hollick(streamflow, 0.925), first)
+    assert cache_info()['hits'] == 1
+
+    streamflow[500] *= 2
+    np.testing.assert_array_equal(lyne_hollick(streamflow, 0.925), lyne_hollick(streamflow.copy(), 0.925))
+    assert not np.array_equal(lyne_hollick(streamflow, 0.925), first)
+    assert cache_info()['misses'] == 2
+
+
+def test_returned_arrays_are_copies(streamflow):
+    enable_cache()
+    first = eckhardt(streamflow, 0.98, 0.8)
+    expected = first.copy()
+    first[:] = 0.0
+    np.testing.assert_array_equal(eckhardt(streamflow, 0.98, 0.8), expected)
+
+
+def test_disk_tier_is_shared_and_versioned(streamflow, tmp_path, monkeypatch):
+    enable_cache(cache_dir=str(tmp_path))
+    expected = eckhardt(streamflow, 0.98, 0.8)
+
+    # A fresh memory tier, as in another process, is served from disk
+    enable_cache(cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(eckhardt(streamflow, 0.98, 0.8), expected)
+    assert cache_info()['disk_hits'] == 1
+
+    # Files written under another cache version are never reused
+    monkeypatch.setattr(cache, 'CACHE_VERSION', cache.CACHE_VERSION + '-next')
+    enable_cache(cache_dir=str(tmp_path))
+    eckhardt(streamflow, 0.98, 0.8)
+    assert cache_info()['disk_hits'] == 0
+    assert cache_info()['misses'] == 1
+
+
+def test_disk_tier_is_bounded(streamflow, tmp_path):
+    enable_cache(cache_dir=str(tmp_path), max_disk_bytes=4 * streamflow.nbytes)
+    for alpha in np.linspace(0.9, 0.99, 10):
+        lyne_hollick(streamflow, alpha)
+
+    assert sum(path.stat().st_size for path in tmp_path.rglob('*.npz')) <= 4 * streamflow.nbytes
+    assert cache_info()['disk_evictions'] > 0
+
+
+def test_execution_script_caches_only_when_asked(monkeypatch, tmp_path):
+    # The script swaps the default HTTPS context when imported; put it back afterwards
+    monkeypatch.setattr(ssl, '_create_default_https_context', ssl._create_default_https_context)
+    import execution
+
+    def offline(*args):
+        raise RuntimeError('offline')
+
+    calls = []
+    monkeypatch.setattr(execution, 'enable_cache', lambda **kwargs: calls.append(kwargs))
+    monkeypatch.setattr(execution, 'fetch_and_process_usgs_data', offline)
+
+    monkeypatch.delenv('BASEFLOW_FILTER_CACHE', raising=False)
+    with pytest.raises(RuntimeError, match='offline'):
+        execution.main()
+    assert calls == []
+
+    monkeypatch.setenv('BASEFLOW_FILTER_CACHE', str(tmp_path))
+    with pytest.raises(RuntimeError, match='offline'):
+        execution.main()
+    assert calls == [{'cache_dir': str(tmp_path)}]
@@ -0,0 +1,122 @@
+import json
+import os
+
+import pytest
+
+from baseflow import cli, pipeline
+
+
+@pytest.fixture
+def fake_run(monkeypatch):
+    """Replaces run_pipeline with one that fails the stations in ``failing`` and records every call."""
+    state = {'calls': [], 'failing': set()}
+
+    def run_pipeline(stations, steps, output_dir, on_result=None, **kwargs):
+        state['calls'].append((list(stations), steps, kwargs))
+        for station in stations:
+            ok = station not in state['failing']
+            output = os.path.join(output_dir, f'{station}.csv')
+            if ok:
+                with open(output, 'w') as file:
+                    file.write('Date,Discharge\n')
+            on_result({'Station': station, 'Status': 'ok' if ok else 'failed', 'Rows': 10 if ok else 0,
+                       'Output': output if ok else None, 'Error': None if ok else 'HTTPError: 503',
+                       'Seconds': 0.01, 'Stages': {'fetch': 0.01}})
+
+    monkeypatch.setattr(pipeline, 'run_pipeline', run_pipeline)
+    return state
+
+
+def test_read_station_list(tmp_path):
+    path = tmp_path / 'stations.txt'
+    path.write_text('# Shenandoah\n01636500\n\n01638500\n01636500\n')
+    assert cli.read_stations(str(path)) == ['01636500', '01638500']
+
+    with pytest.raises(ValueError, match='HUC'):
+        cli.read_stations(str(path), huc='0207')
+
+
+def test_read_station_table_with_huc_filter(tmp_path):
+    path = tmp_path / 'sites.rdb'
+    path.write_text('# NWIS site file\n'
+                    'agency_cd\tsite_no\tstation_nm\thuc_cd\n'
+                    '5s\t15s\t50s\t16s\n'
+                    'USGS\t01636500\tSHENANDOAH RIVER AT MILLVILLE, WV\t02070007\n'
+                    'USGS\t01646500\tPOTOMAC RIVER NEAR WASH, DC\t02070008\n'
+                    'USGS\t02035000\tJAMES RIVER AT CARTERSVILLE, VA\t02080205\n')
+
+    assert cli.read_stations(str(path)) == ['01636500', '01646500', '02035000']
+    assert cli.read_stations(str(path), huc='0207') == ['01636500', '01646500']
+
+    csv = tmp_path / 'sites.csv'
+    csv.write_text('name,huc\nMillville,02070007\n')
+    with pytest.raises(ValueError, match='station column'):
+        cli.read_stations(str(csv))
+
+
+def test_pipeline_key_follows_the_steps():
+    steps = [('fetch', {'start_date': '2000-01-01'}), ('clean', {})]
+    assert cli.pipeline_key(steps) == cli.pipeline_key([('fetch', {'start_date': '2000-01-01'}), ('clean', {})])
+    assert cli.pipeline_key(steps) != cli.pipeline_key([('fetch', {'start_date': '2001-01-01'}), ('clean', {})])
+
+
+def test_read_checkpoint(tmp_path):
+    output = tmp_path / '01636500.csv'
+    output.write_text('Date,Discharge\n')
+    records = [
+        {'Station': '01636500', 'Status': 'failed', 'Output': None, 'Pipeline': 'a'},
+        {'Station': '01636500', 'Status': 'ok', 'Output': str(output), 'Pipeline': 'a'},
+        {'Station': '01638500', 'Status': 'ok', 'Output': str(output), 'Pipeline': 'b'},
+        # Its output was deleted since
+        {'Station': '01646500', 'Status': 'ok', 'Output': str(tmp_path / 'gone.csv'), 'Pipeline': 'a'},
+    ]
+    path = tmp_path / 'checkpoint.jsonl'
+    # The last line of an interrupted run is cut short
+    path.write_text(''.join(json.dumps(record) + '\n' for record in records) + '{"Station": "0207')
+
+    assert cli.read_checkpoint(str(path), 'a') == {'01636500'}
+    assert cli.read_checkpoint(str(tmp_path / 'missing.jsonl'), 'a') == set()
+
+
+def test_rerun_resumes_from_the_checkpoint(tmp_path, fake_run, capsys):
+    stations = tmp_path / 'stations.txt'
+    stations.write_text('01636500\n01638500\n01646500\n')
+    output = tmp_path / 'output'
+    log = tmp_path / 'run.jsonl'
+    argv = ['--stations', str(stations), '--output-dir', str(output), '--json-log', str(log),
+            '--start-date', '2000-01-01', '--quiet']
+
+    fake_run['failing'] = {'01638500'}
+    assert cli.main(argv) == 1
+    stations_run, steps, _ = fake_run['calls'][0]
+    assert stations_run == ['01636500', '01638500', '01646500']
+    assert dict(steps)['fetch']['start_date'] == '2000-01-01'
+    assert '2 ok, 1 failed' in capsys.readouterr().out
+
+    # Only the failed station runs again
+    fake_run['failing'] = set()
+    assert cli.main(argv) == 0
+    assert fake_run['calls'][1][0] == ['01638500']
+
+    events = [json.loads(line) for line in log.read_text().splitlines()]
+    assert [event['event'] for event in events] == ['station'] * 3 + ['summary', 'station', 'summary']
+    assert events[3]['failed'] == 1 and events[3]['rows'] == 20
+    assert events[5]['skipped'] == 2
+
+    # A different pipeline, or --restart, does not reuse the checkpoint
+    assert cli.main(argv[:-3] + ['--start-date', '2010-01-01', '--quiet']) == 0
+    assert len(fake_run['calls'][2][0]) == 3
+    assert cli.main(argv + ['--restart']) == 0
+    assert len(fake_run['calls'][3][0]) == 3
+
+
+def test_throughput():
+    records = [{'Status': 'ok', 'Rows': 100, 'Stages': {'fetch': 1.0, 'filter': 0.5}},
+               {'Status': 'failed', 'Rows': 0, 'Stages': {'fetch': 2.0}}]
+    metrics = cli.throughput(records, 2.0)
+
+    assert metrics['ok'] == 1 and metrics['failed'] == 1
+    assert metrics['stations_per_second'] == 1.0
+    assert metrics['rows_per_second'] == 50.0
+    assert metrics['stages'] == {'fetch': 3.0, 'filter': 0.5}
+    assert cli.throughput([], 0.0)['rows_per_second'] == 0.0
@@ -0,0 +1,111 @@
+import asyncio
+import os
+import time
+
+import pytest
+import urllib3
+
+from baseflow.download import cache_path, download_stations, download_to_cache, fetch_rdb, nwis_url
+
+
+def test_nwis_url_carries_station_and_dates():
+    url = nwis_url('01636500', '2019-06-10', '2023-10-07', base_url='http://stub/nwis/dv')
+
+    assert url.startswith('http://stub/nwis/dv?')
+    assert 'search_site_no=01636500' in url
+    assert 'begin_date=2019-06-10' in url and 'end_date=2023-10-07' in url
+
+
+def test_download_stations(nwis_server, rdb_body):
+    nwis_server.replies['01636500'] = [(200, rdb_body)]
+    responses = download_stations(['01636500'], '2019-06-10', '2019-06-19', base_url=nwis_server.url)
+
+    assert responses == {'01636500': rdb_body}
+    station, query = nwis_server.requests[0]
+    assert query['begin_date'] == ['2019-06-10'] and query['end_date'] == ['2019-06-19']
+
+
+def test_cache_hit_makes_no_request(nwis_server, rdb_body, tmp_path):
+    nwis_server.replies['01636500'] = [(200, rdb_body)]
+    first = download_stations(['01636500'], '2019-06-10', '2019-06-19', cache_dir=str(tmp_path),
+                              base_url=nwis_server.url)
+    second = download_stations(['01636500'], '2019-06-10', '2019-06-19', cache_dir=str(tmp_path),
+                               base_url=nwis_server.url)
+
+    assert first == second == {'01636500': rdb_body}
+    assert len(nwis_server.requests) == 1
+    assert os.path.exists(cache_path(str(tmp_path), '01636500', '2019-06-10', '2019-06-19'))
+
+    # Another date range is another request
+    download_stations(['01636500'], '2019-06-10', '2019-06-12', cache_dir=str(tmp_path), base_url=nwis_server.url)
+    assert len(nwis_server.requests) == 2
+
+
+def test_server_errors_are_retried_with_backoff(nwis_server, rdb_body):
+    nwis_server.replies['01636500'] = [(503, b''), (500, b''), (200, rdb_body)]
+    started = time.perf_counter()
+    responses = download_stations(['01636500'], '2019-06-10', '2019-06-19', retries=3, backoff=0.2,
+                                  base_url=nwis_server.url)
+
+    assert responses['01636500'] == rdb_body
+    assert len(nwis_server.requests) == 3
+    # The first retry is immediate and the second waits backoff * 2
+    assert time.perf_counter() - started >= 0.35
+
+
+def test_failures_are_reported_per_station(nwis_server, rdb_body, tmp_path):
+    nwis_server.replies['01636500'] = [(200, rdb_body)]
+    nwis_server.replies['01646500'] = [(500, b'')]
+    nwis_server.replies['01638500'] = [(404, b'No sites found')]
+
+    responses = download_stations(['01636500', '01646500', '01638500'], '2019-06-10', '2019-06-19',
+                                  cache_dir=str(tmp_path), retries=1, backoff=0.0, base_url=nwis_server.url)
+
+    assert responses['01636500'] == rdb_body
+    assert isinstance(responses['01646500'], urllib3.exceptions.HTTPError)
+    assert isinstance(responses['01638500'], urllib3.exceptions.HTTPError)
+    assert 'HTTP 404' in str(responses['01638500'])
+    # 5xx answers were retried, 404 was not, and failures are not cached
+    assert sum(station == '01646500' for station, _ in nwis_server.requests) == 2
+    assert sum(station == '01638500' for station, _ in nwis_server.requests) == 1
+    assert not os.path.exists(cache_path(str(tmp_path), '01646500', '2019-06-10', '2019-06-19'))
+
+
+def test_download_stations_inside_a_running_loop(nwis_server, rdb_body):
+    nwis_server.replies['01636500'] = [(200, rdb_body)]
+
+    async def caller():
+        return download_stations(['01636500'], '2019-06-10', '2019-06-19', base_url=nwis_server.url)
+
+    assert asyncio.run(caller()) == {'01636500': rdb_body}
+
+
+def test_fetch_rdb_is_awaitable(nwis_server, rdb_body):
+    nwis_server.replies['01636500'] = [(200, rdb_body)]
+    responses = asyncio.run(fetch_rdb(['01636500'], '2019-06-10', '2019-06-19', base_url=nwis_server.url))
+    assert responses == {'01636500': rdb_body}
+
+
+def test_download_to_cache_streams_to_disk(nwis_server, rdb_body, tmp_path):
+    nwis_server.replies['01636500'] = [(200, rdb_body)]
+    path = download_to_cache('01636500', '2019-06-10', '2019-06-19', str(tmp_path), base_url=nwis_server.url,
+                             block_size=64)
+
+    with open(path, 'rb') as file:
+        assert file.read() == rdb_body
+    assert download_to_cache('01636500', '2019-06-10', '2019-06-19', str(tmp_path),
+                             base_url=nwis_server.url) == path
+    assert len(nwis_server.requests) == 1
+
+
+def test_download_to_cache_leaves_nothing_on_failure(nwis_server, tmp_path):
+    nwis_server.replies['01636500'] = [(404, b'No sites found')]
+    with pytest.raises(urllib3.exceptions.HTTPError):
+        download_to_cache('01636500', '2019-06-10', '2019-06-19', str(tmp_path), retries=0,
+                          base_url=nwis_server.url)
+    assert not [name for _, _, names in os.walk(tmp_path) for name in names]
+
+
+def test_unknown_service_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='service'):
+        download_to_cache('01636500', '2019-06-10', '2019-06-19', str(tmp_path), service='gw')
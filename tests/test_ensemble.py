@@ -0,0 +1,91 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow import models
+from baseflow.ensemble import ensemble_frame, run_ensemble
+from baseflow.processing import fill_gaps
+
+SPECS = [
+    ('lyne_hollick', {'alpha': 0.925}),
+    ('chapman', {'alpha': 0.925, 'beta': 0.075}),
+    ('eckhardt', {'alpha': 0.98, 'bfi_max': 0.8}),
+    (models.eckhardt, {'alpha': 0.9, 'bfi_max': 0.5}, 'Eckhardt_Fast'),
+    ('chapman_maxwell', {'k': 0.7}),
+    ('boughton', {'k': 0.95, 'C': 0.05}),
+    ('furey_gupta', {'gamma': 0.1, 'c1': 1.0, 'c3': 0.5}),
+    ('what', {'BFImax': 0.8, 'alpha': 0.98}),
+    ('hyd_run', {'k': 0.925, 'passes': 4}),
+]
+
+
+def _one_by_one(streamflow, specs, **kwargs):
+    columns = []
+    for model, params, *_ in specs:
+        name = getattr(model, '__name__', model)
+        if name == 'what':
+            # what takes a frame with a 'streamflow' column and also returns the quickflow
+            columns.append(models.what(pd.DataFrame({'streamflow': streamflow}), **params, **kwargs)[0])
+        else:
+            columns.append(getattr(models, name)(streamflow, **params, **kwargs))
+    return np.column_stack(columns)
+
+
+def test_matches_each_filter_on_its_own(streamflow):
+    ensemble = run_ensemble(pd.Series(streamflow), SPECS)
+    expected = _one_by_one(streamflow, SPECS)
+
+    assert ensemble['names'] == ['Lyne_Hollick', 'Chapman', 'Eckhardt', 'Eckhardt_Fast', 'Chapman_Maxwell',
+                                 'Boughton', 'Furey_Gupta', 'What', 'Hyd_Run']
+    np.testing.assert_allclose(ensemble['baseflow'], expected, rtol=1e-10)
+    assert ensemble['baseflow'][:, 0].flags['C_CONTIGUOUS']
+
+    valid = ~np.isnan(streamflow)
+    np.testing.assert_allclose(ensemble['mean'][valid], expected[valid].mean(axis=1), rtol=1e-10)
+    np.testing.assert_allclose(ensemble['spread'][valid], np.ptp(expected[valid], axis=1), rtol=1e-10, atol=1e-9)
+    assert np.isnan(ensemble['min'][~valid]).all()
+
+
+def test_segments_restart_every_linear_filter(streamflow):
+    streamflow[300:320] = np.nan
+    gaps = fill_gaps(streamflow, max_gap=3)
+    linear = SPECS[:-1]
+    ensemble = run_ensemble(gaps['streamflow'], linear, segments=gaps['segments'])
+
+    expected = _one_by_one(gaps['streamflow'], linear, segments=gaps['segments'])
+    np.testing.assert_allclose(ensemble['baseflow'], expected, rtol=1e-10)
+
+    with pytest.raises(ValueError, match='hyd_run'):
+        run_ensemble(gaps['streamflow'], SPECS, segments=gaps['segments'])
+
+
+def test_ensemble_frame(streamflow):
+    df = pd.DataFrame({'Discharge': streamflow})
+    ensemble_frame(df, SPECS[:2])
+    assert list(df.columns) == ['Discharge', 'Lyne_Hollick', 'Chapman', 'Ensemble Mean', 'Ensemble Spread',
+                                'Ensemble Min', 'Ensemble Max']
+
+    bare = ensemble_frame(pd.DataFrame({'Discharge': streamflow}), SPECS[:2], statistics=False)
+    assert list(bare.columns) == ['Discharge', 'Lyne_Hollick', 'Chapman']
+
+
+def test_empty_series():
+    ensemble = run_ensemble(np.array([]), SPECS)
+    assert ensemble['baseflow'].shape == (0, len(SPECS))
+
+
+@pytest.mark.parametrize('specs, message', [
+    ([], 'at least one'),
+    ([('eckhardt', {'alpha': 0.98, 'bfi_max': 0.8}), ('eckhardt', {'alpha': 0.9, 'bfi_max': 0.5})], 'own column'),
+    ([('kalman', {})], 'Unknown filter'),
+    ([('lyne_hollick', {'alpha': 1.5})], 'alpha'),
+    ([('eckhardt', {'alpha': 0.98, 'bfi_max': 0.0})], 'bfi_max'),
+])
+def test_rejects_bad_specs(streamflow, specs, message):
+    with pytest.raises(ValueError, match=message):
+        run_ensemble(streamflow, specs)
+
+
+def test_rejects_many_gauges(streamflow):
+    with pytest.raises(ValueError, match='batch_filter'):
+        run_ensemble(np.column_stack([streamflow, streamflow]), SPECS)
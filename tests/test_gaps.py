@@ -0,0 +1,86 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.batch import batch_filter
+from baseflow.models import eckhardt
+from baseflow.processing import GAP_EDGE, GAP_LONG, GAP_SHORT, clean_gaps, fill_gaps, find_gaps
+
+NAN = np.nan
+
+
+@pytest.fixture
+def gappy():
+    # Gaps of 2 (short), 5 (long) and 1 (short) steps, plus one at each end
+    q = np.arange(1.0, 31.0) * 10
+    q[[0, 1, 5, 6, 12, 13, 14, 15, 16, 22, 29]] = NAN
+    return q
+
+
+def test_find_gaps(gappy):
+    gaps = find_gaps(np.column_stack([gappy, np.arange(30.0)]), max_gap=3)
+
+    assert gaps['gauge'].tolist() == [0] * 5
+    assert gaps['start'].tolist() == [0, 5, 12, 22, 29]
+    assert gaps['end'].tolist() == [1, 6, 16, 22, 29]
+    assert gaps['length'].tolist() == [2, 2, 5, 1, 1]
+    assert gaps['kind'].tolist() == [GAP_EDGE, GAP_SHORT, GAP_LONG, GAP_SHORT, GAP_EDGE]
+
+
+def test_short_gaps_are_interpolated(gappy):
+    original = gappy.copy()
+    gaps = fill_gaps(gappy, max_gap=3)
+
+    np.testing.assert_array_equal(gappy, original)
+    expected = np.arange(1.0, 31.0) * 10
+    expected[[0, 1, 12, 13, 14, 15, 16, 29]] = NAN
+    np.testing.assert_allclose(gaps['streamflow'], expected)
+    assert np.flatnonzero(gaps['imputed']).tolist() == [5, 6, 22]
+    # The segment after the long gap starts at its first valid value
+    np.testing.assert_array_equal(gaps['segments'], [0] * 17 + [1] * 13)
+
+
+def test_log_interpolation():
+    q = np.array([100.0, NAN, NAN, 12.5, NAN, -1.0, 4.0])
+    filled = fill_gaps(q, max_gap=2, method='log')['streamflow']
+
+    np.testing.assert_allclose(filled[:4], [100.0, 50.0, 25.0, 12.5])
+    # Not positive at one end, so the gap is interpolated linearly
+    assert filled[4] == pytest.approx(5.75)
+
+
+def test_gauges_are_independent_and_chunking_does_not_matter(gappy, streamflow):
+    block = np.column_stack([gappy, gappy[::-1], streamflow[:30]])
+    whole = fill_gaps(pd.DataFrame(block), max_gap=3)
+    chunked = fill_gaps(block, max_gap=3, max_bytes=1)
+
+    for key in whole:
+        np.testing.assert_array_equal(chunked[key], whole[key])
+        np.testing.assert_array_equal(whole[key][:, 1], fill_gaps(gappy[::-1], max_gap=3)[key])
+
+
+def test_segments_restart_the_filters(gappy):
+    gaps = fill_gaps(gappy, max_gap=3)
+    restarted = batch_filter(gaps['streamflow'], 'eckhardt', segments=gaps['segments'], alpha=0.925, bfi_max=0.8)
+
+    filled = gaps['streamflow']
+    separate = np.concatenate([eckhardt(filled[:17], 0.925, 0.8), eckhardt(filled[17:], 0.925, 0.8)])
+    np.testing.assert_allclose(restarted, separate, rtol=1e-12)
+    np.testing.assert_allclose(eckhardt(filled, 0.925, 0.8, segments=gaps['segments']), separate, rtol=1e-12)
+
+
+def test_clean_gaps_restores_missing_rows():
+    dates = pd.to_datetime(['2020-01-01', '2020-01-02', '2020-01-04', '2020-01-05', '2020-01-10', '2020-01-10'])
+    df = pd.DataFrame({'Date': dates, 'Discharge': [10.0, 20.0, 40.0, 50.0, 100.0, 100.0]})
+    cleaned = clean_gaps(df, max_gap=2)
+
+    assert cleaned['Date'].tolist() == list(pd.date_range('2020-01-01', '2020-01-10'))
+    np.testing.assert_allclose(cleaned['Discharge'], [10.0, 20.0, 30.0, 40.0, 50.0, NAN, NAN, NAN, NAN, 100.0])
+    assert cleaned['Imputed'].tolist() == [False, False, True] + [False] * 7
+    assert cleaned['Segment'].tolist() == [0] * 9 + [1]
+    assert len(df) == 6
+
+
+def test_fill_gaps_rejects_unknown_methods(gappy):
+    with pytest.raises(ValueError, match='method'):
+        fill_gaps(gappy, method='spline')
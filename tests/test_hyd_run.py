@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.engine import multi_pass_filter
+from baseflow.models import hyd_run
+from reference import expected
+
+
+def reference_hyd_run(q, k, passes):
+    # Each pass filters the previous pass's output; even passes run backward
+    u = list(q)
+    for p in range(passes):
+        values = u[::-1] if p % 2 else u
+        b = [values[0]]
+        for current, previous in zip(values[1:], values[:-1]):
+            b.append(min(k * b[-1] + (1 - k) * (current + previous) / 2, current))
+        u = b[::-1] if p % 2 else b
+    return u
+
+
+@pytest.mark.parametrize('k, passes', [(0.9, 1), (0.9, 2), (0.925, 3), (0.95, 4)])
+def test_hyd_run_matches_reference(k, passes, streamflow):
+    series = pd.Series(streamflow)
+    baseflow = hyd_run(series, k, passes)
+
+    np.testing.assert_allclose(baseflow, expected(reference_hyd_run, streamflow, {'k': k, 'passes': passes}),
+                               rtol=1e-10)
+    np.testing.assert_array_equal(series.to_numpy(), streamflow)
+
+
+def test_baseflow_never_exceeds_streamflow(streamflow):
+    baseflow = hyd_run(streamflow, 0.9, 4)
+    valid = ~np.isnan(streamflow)
+    assert (baseflow[valid] <= streamflow[valid] + 1e-9).all()
+
+
+def test_multi_pass_filter_per_column(streamflow):
+    filled = np.nan_to_num(streamflow, nan=900.0)
+    block = np.column_stack([filled, filled[::-1]])
+    baseflow = multi_pass_filter(block, np.array([0.9, 0.95]), 3)
+
+    np.testing.assert_allclose(baseflow[:, 0], reference_hyd_run(filled.tolist(), 0.9, 3), rtol=1e-10)
+    np.testing.assert_allclose(baseflow[:, 1], reference_hyd_run(filled[::-1].tolist(), 0.95, 3), rtol=1e-10)
+
+
+@pytest.mark.parametrize('values', [np.array([]), np.empty((0, 2)), pd.Series([], dtype=float)])
+def test_empty_input(values):
+    assert hyd_run(values, 0.9, 4).shape == np.shape(values)
+
+
+def test_single_value():
+    np.testing.assert_array_equal(hyd_run(np.array([5.0]), 0.9, 4), [5.0])
@@ -0,0 +1,167 @@
+import functools
+import io
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow import download, models
+from baseflow.batch import batch_filter
+from baseflow.engine import filter_state
+from baseflow.processing import fetch_and_process_usgs_data
+from baseflow.rdb import iter_rdb, parse_rdb
+
+HEADER = (b'# Data provided for site 01636500\n'
+          b'#    USGS 01636500 SHENANDOAH RIVER AT MILLVILLE, WV\n'
+          b'agency_cd\tsite_no\tdatetime\t149188_00060_00003\t149188_00060_00003_cd\n'
+          b'5s\t15s\t20d\t14n\t10s\n')
+
+# What NWIS sends for a date range without any published values
+NO_DATA = (b'# //Output-Format: RDB\n'
+           b'# //Response-Status: OK\n'
+           b'# //Response-Message: No sites found matching all criteria\n')
+
+# The full record, 2019-06-10 to 2019-08-08; the tests publish it up to a given day
+RECORD = pd.Series(np.arange(1000.0, 1060.0), index=pd.date_range('2019-06-10', periods=60))
+
+
+def _published(last_day):
+    def reply(query):
+        days = RECORD[query['begin_date'][0]:min(pd.Timestamp(query['end_date'][0]), pd.Timestamp(last_day))]
+        if days.empty:
+            return 200, NO_DATA
+        rows = ''.join(f'USGS\t01636500\t{day:%Y-%m-%d}\t{value:g}\tA\n' for day, value in days.items())
+        return 200, HEADER + rows.encode()
+    return reply
+
+
+@pytest.fixture
+def nwis(nwis_server, monkeypatch):
+    monkeypatch.setattr(download, 'nwis_url', functools.partial(download.nwis_url, base_url=nwis_server.url))
+    return nwis_server
+
+
+def test_comment_only_response_parses_to_an_empty_frame():
+    df = parse_rdb(io.BytesIO(NO_DATA))
+
+    assert df.empty
+    assert list(df.columns) == ['Date', 'Discharge', 'Qualifier']
+    assert pd.api.types.is_datetime64_dtype(df['Date'])
+    assert list(iter_rdb(io.BytesIO(NO_DATA))) == []
+    assert parse_rdb(io.BytesIO(b'')).empty
+
+
+def test_incremental_update_downloads_only_new_days(nwis, tmp_path):
+    nwis.replies['01636500'] = _published('2019-07-28')
+    first = fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True,
+                                        data_dir=str(tmp_path), verbose=False)
+    assert len(first) == 49
+
+    nwis.replies['01636500'] = _published('2019-08-08')
+    updated = fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True,
+                                          data_dir=str(tmp_path), verbose=False)
+
+    _, query = nwis.requests[-1]
+    assert query['begin_date'] == ['2019-07-29']
+    np.testing.assert_array_equal(updated['Discharge'], RECORD.to_numpy())
+    assert (updated['Date'] == RECORD.index).all()
+
+
+def test_incremental_update_without_published_days(nwis, tmp_path):
+    nwis.replies['01636500'] = _published('2019-07-28')
+    fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True, data_dir=str(tmp_path),
+                                verbose=False)
+
+    # A nightly run before NWIS has published anything new must not fail
+    new_rows = fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True,
+                                           return_history=False, data_dir=str(tmp_path), verbose=False)
+    assert new_rows.empty
+    assert nwis.requests[-1][1]['begin_date'] == ['2019-07-29']
+
+
+def test_update_without_new_days_returns_the_stored_frame(nwis, tmp_path):
+    nwis.replies['01636500'] = _published('2019-07-28')
+    stored = fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True,
+                                         data_dir=str(tmp_path), verbose=False)
+    path = tmp_path / 'USGS_Data_for_01636500.txt'
+    saved = path.read_bytes()
+
+    again = fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True,
+                                        data_dir=str(tmp_path), verbose=False)
+
+    pd.testing.assert_frame_equal(again, stored)
+    assert path.read_bytes() == saved
+
+
+def test_update_after_a_fetch_without_data(nwis, tmp_path):
+    nwis.replies['01636500'] = _published('2019-06-01')
+    nothing = fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True,
+                                          data_dir=str(tmp_path), verbose=False)
+    assert nothing.empty
+    # The saved file is empty, and still nothing is published
+    still_nothing = fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True,
+                                                data_dir=str(tmp_path), verbose=False)
+    assert still_nothing.empty
+    assert pd.api.types.is_datetime64_dtype(still_nothing['Date'])
+    assert still_nothing['Discharge'].dtype == np.float64
+
+    nwis.replies['01636500'] = _published('2019-08-08')
+    record = fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True,
+                                         data_dir=str(tmp_path), verbose=False)
+    np.testing.assert_array_equal(record['Discharge'], RECORD.to_numpy())
+
+
+def test_incremental_needs_a_saved_file(tmp_path):
+    with pytest.raises(ValueError, match='save_file'):
+        fetch_and_process_usgs_data('01636500', '2019-06-10', '2019-08-08', incremental=True, save_file=False,
+                                    data_dir=str(tmp_path), verbose=False)
+
+
+@pytest.mark.parametrize('name, params', [
+    ('lyne_hollick', {'alpha': 0.925}),
+    ('chapman', {'alpha': 0.925, 'beta': None}),
+    ('eckhardt', {'alpha': 0.98, 'bfi_max': 0.8}),
+    ('chapman_maxwell', {'k': 0.7}),
+    ('boughton', {'k': 0.95, 'C': 0.05}),
+    ('furey_gupta', {'gamma': 0.1, 'c1': 1.0, 'c3': 0.5}),
+])
+def test_saved_state_resumes_full_run(name, params, streamflow):
+    function = getattr(models, name)
+    full = function(streamflow, **params)
+
+    history, new_days = streamflow[:400], streamflow[400:]
+    # The state survives a round trip through JSON, as when it is saved between runs
+    state = json.loads(json.dumps(filter_state(history, function(history, **params))))
+    resumed = function(new_days, **params, state=state)
+
+    np.testing.assert_allclose(np.concatenate([function(history, **params), resumed]), full, rtol=1e-10)
+
+
+def test_what_resumes_full_run(streamflow):
+    filled = pd.DataFrame({'streamflow': np.nan_to_num(streamflow, nan=1000.0)})
+    full, _ = models.what(filled, 0.8, 0.98)
+
+    history, _ = models.what(filled[:300], 0.8, 0.98)
+    state = filter_state(filled['streamflow'][:300], history)
+    resumed, _ = models.what(filled[300:].reset_index(drop=True), 0.8, 0.98, state=state)
+
+    np.testing.assert_allclose(np.concatenate([history, resumed]), full, rtol=1e-10)
+
+
+def test_batch_state_resumes_full_run(streamflow):
+    block = np.column_stack([streamflow, streamflow * 2])
+    full = batch_filter(block, 'lyne_hollick', alpha=0.925)
+
+    first = batch_filter(block[:300], 'lyne_hollick', alpha=0.925)
+    rest = batch_filter(block[300:], 'lyne_hollick', state=filter_state(block[:300], first), alpha=0.925)
+
+    np.testing.assert_allclose(np.concatenate([first, rest]), full, rtol=1e-10)
+
+
+def test_state_keeps_columns_without_new_values():
+    previous = {'streamflow': [10.0, 20.0], 'baseflow': [5.0, 6.0]}
+    chunk = np.array([[1.0, np.nan], [2.0, np.nan]])
+    state = filter_state(chunk, chunk / 2, previous=previous)
+
+    assert state == {'streamflow': [2.0, 20.0], 'baseflow': [1.0, 6.0]}
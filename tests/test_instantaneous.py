@@ -0,0 +1,130 @@
+import functools
+import io
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow import download
+from baseflow.batch import batch_filter
+from baseflow.models import LINEAR_FILTERS, iter_filter
+from baseflow.processing import fetch_instantaneous, iter_daily
+from baseflow.rdb import iter_rdb, parse_rdb
+
+PARAMS = {
+    'lyne_hollick': {'alpha': 0.925},
+    'chapman': {'alpha': 0.925, 'beta': None},
+    'eckhardt': {'alpha': 0.98, 'bfi_max': 0.8},
+    'chapman_maxwell': {'k': 0.7},
+    'boughton': {'k': 0.95, 'C': 0.05},
+    'furey_gupta': {'gamma': 0.1, 'c1': 1.0, 'c3': 0.5},
+    'what': {'BFImax': 0.8, 'alpha': 0.98},
+}
+
+# Three local days of 15-minute values across the end of daylight saving time
+TIMES = pd.date_range('2023-11-04 00:00', '2023-11-06 23:45', freq='15min')
+ZONES = np.where(TIMES < pd.Timestamp('2023-11-05 02:00'), 'EDT', 'EST')
+VALUES = 500 + np.arange(len(TIMES)) % 40 * 2.5
+
+
+def _iv_body():
+    rows = ''.join(f'USGS\t01636500\t{time:%Y-%m-%d %H:%M}\t{zone}\t{value:g}\tP\n'
+                   for time, zone, value in zip(TIMES, ZONES, VALUES))
+    return (b'# Data provided for site 01636500\n'
+            b'#    USGS 01636500 SHENANDOAH RIVER AT MILLVILLE, WV\n'
+            b'agency_cd\tsite_no\tdatetime\ttz_cd\t69928_00060\t69928_00060_cd\n'
+            b'5s\t15s\t20d\t6s\t14n\t10s\n' + rows.encode())
+
+
+def _utc():
+    return TIMES + pd.to_timedelta(np.where(ZONES == 'EDT', 4, 5), unit='h')
+
+
+def _chunks(values, bounds):
+    return [values[start:end] for start, end in zip([0, *bounds], [*bounds, len(values)])]
+
+
+def test_instantaneous_values_are_converted_to_utc():
+    df = parse_rdb(io.BytesIO(_iv_body()))
+
+    np.testing.assert_array_equal(df['Date'].to_numpy(), _utc().to_numpy())
+    np.testing.assert_array_equal(df['Discharge'], VALUES)
+    assert df.attrs['station_number'] == '01636500'
+
+
+def test_iter_rdb_chunks_add_up_to_parse_rdb():
+    chunks = list(iter_rdb(io.BytesIO(_iv_body()), chunk_rows=50))
+
+    assert [len(chunk) for chunk in chunks][:-1] == [50] * (len(chunks) - 1)
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True)[['Date', 'Discharge']],
+                                  parse_rdb(io.BytesIO(_iv_body()))[['Date', 'Discharge']])
+
+
+@pytest.mark.parametrize('bounds', [[], [1], [95, 96, 97], [30, 200, 201]])
+def test_iter_daily_ignores_chunk_boundaries(bounds):
+    frame = pd.DataFrame({'Date': _utc(), 'Discharge': VALUES})
+    frame.loc[10:20, 'Discharge'] = np.nan
+    # A whole UTC day without a valid value
+    frame.loc[frame['Date'].dt.day == 6, 'Discharge'] = np.nan
+
+    daily = pd.concat(iter_daily(_chunks(frame, bounds)), ignore_index=True)
+    expected = frame.groupby(frame['Date'].dt.floor('D'))['Discharge'].mean()
+
+    np.testing.assert_array_equal(daily['Date'].to_numpy(), expected.index.to_numpy())
+    np.testing.assert_allclose(daily['Discharge'], expected.to_numpy())
+    assert np.isnan(daily['Discharge'].iloc[2])
+
+
+def test_fetch_instantaneous(nwis_server, monkeypatch):
+    nwis_server.replies['01636500'] = [(200, _iv_body())]
+    monkeypatch.setattr(download, 'nwis_iv_url', functools.partial(download.nwis_iv_url, base_url=nwis_server.url))
+
+    chunks = list(fetch_instantaneous('01636500', '2023-11-04', '2023-11-06', chunk_rows=100))
+    assert len(chunks) == 3
+    assert list(chunks[0].columns) == ['Date', 'Discharge']
+    np.testing.assert_array_equal(pd.concat(chunks)['Discharge'], VALUES)
+    assert nwis_server.requests[0][1]['parameterCd'] == ['00060']
+
+    daily = pd.concat(fetch_instantaneous('01636500', '2023-11-04', '2023-11-06', daily=True, chunk_rows=100))
+    pd.testing.assert_frame_equal(daily, pd.concat(iter_daily(chunks)))
+
+
+def test_fetch_instantaneous_from_cache(nwis_server, monkeypatch, tmp_path):
+    nwis_server.replies['01636500'] = [(200, _iv_body())]
+    monkeypatch.setattr(download, 'NWIS_IV_URL', nwis_server.url)
+
+    first = pd.concat(fetch_instantaneous('01636500', '2023-11-04', '2023-11-06', cache_dir=str(tmp_path)))
+    again = pd.concat(fetch_instantaneous('01636500', '2023-11-04', '2023-11-06', cache_dir=str(tmp_path)))
+
+    pd.testing.assert_frame_equal(again, first)
+    assert len(nwis_server.requests) == 1
+
+
+def test_every_linear_filter_is_covered():
+    assert set(PARAMS) == set(LINEAR_FILTERS)
+
+
+@pytest.mark.parametrize('name', PARAMS)
+def test_iter_filter_matches_full_run(name, streamflow):
+    params = PARAMS[name]
+    # One chunk is all NaN, which must not break the chain
+    streamflow[100:130] = np.nan
+    full = batch_filter(streamflow, name, **params)
+
+    chunked = np.concatenate(list(iter_filter(_chunks(streamflow, [1, 100, 130, 365]), name, **params)))
+
+    np.testing.assert_allclose(chunked, full, rtol=1e-10)
+
+
+def test_iter_filter_matches_full_run_per_gauge(streamflow):
+    block = np.column_stack([streamflow, streamflow[::-1]])
+    full = batch_filter(block, 'eckhardt', alpha=0.98, bfi_max=0.8)
+
+    chunked = np.concatenate(list(iter_filter(_chunks(block, [200, 500]), 'eckhardt', alpha=0.98, bfi_max=0.8)))
+
+    np.testing.assert_allclose(chunked, full, rtol=1e-10)
+
+
+def test_iter_filter_rejects_hyd_run(streamflow):
+    with pytest.raises(ValueError, match='hyd_run'):
+        next(iter_filter([streamflow], 'hyd_run', k=0.9, passes=4))
@@ -0,0 +1,118 @@
+import io
+import json
+
+import pytest
+
+from baseflow import instrument, models
+from baseflow.instrument import (add_hook, count, counting_stream, disable_metrics, enable_metrics, export_metrics,
+                                 merge_metrics, metrics_info, prometheus_text, stage, timed)
+
+
+@pytest.fixture(autouse=True)
+def no_metrics():
+    # Tests that enable instrumentation must not leak it into the others
+    yield
+    disable_metrics()
+
+
+def test_disabled_hooks_do_nothing():
+    stream = io.BytesIO(b'data')
+    assert stage('parse') is instrument._DISABLED
+    assert counting_stream(stream) is stream
+    count('bytes_downloaded', 10)
+    assert metrics_info() == {'enabled': False}
+    assert prometheus_text() == ''
+
+
+def test_nested_stages_and_hooks():
+    calls = []
+    enable_metrics(hooks=[lambda *args: calls.append(args)])
+    with stage('pipeline'):
+        with stage('parse', rows=100):
+            pass
+        with stage('parse', rows=50):
+            pass
+
+    stages = metrics_info()['stages']
+    assert stages['parse']['calls'] == 2
+    assert stages['parse']['rows'] == 150
+    assert stages['pipeline']['seconds'] >= stages['parse']['seconds']
+    assert stages['pipeline']['max_seconds'] == stages['pipeline']['seconds']
+    assert [(name, rows) for name, _, rows in calls] == [('parse', 100), ('parse', 50), ('pipeline', None)]
+
+
+def test_stage_records_when_it_raises():
+    enable_metrics()
+    with pytest.raises(RuntimeError):
+        with stage('download'):
+            raise RuntimeError
+    assert metrics_info()['stages']['download']['calls'] == 1
+
+
+def test_timed_filters_count_rows_and_rejections(streamflow, capsys):
+    enable_metrics()
+    models.lyne_hollick(streamflow, 0.925)
+    models.chapman_maxwell(streamflow, 1.5)
+
+    info = metrics_info()
+    assert info['stages']['filter.lyne_hollick']['rows'] == len(streamflow)
+    assert info['counters'] == {'filter.chapman_maxwell.rejected': 1}
+
+
+def test_timed_wraps_the_function():
+    @timed('custom')
+    def square(values):
+        """Squares."""
+        return [value * value for value in values]
+
+    assert square.__name__ == 'square' and square.__doc__ == 'Squares.'
+    enable_metrics()
+    add_hook(lambda name, seconds, rows: count('hooked', rows))
+    assert square([1, 2, 3]) == [1, 4, 9]
+    assert metrics_info()['counters'] == {'hooked': 3}
+
+
+def test_counting_stream():
+    enable_metrics()
+    with counting_stream(io.BytesIO(b'# header\nrow 1\nrow 2\n')) as stream:
+        assert stream.readline() == b'# header\n'
+        assert list(stream) == [b'row 1\n', b'row 2\n']
+        assert stream.read() == b''
+    assert metrics_info()['counters']['bytes_downloaded'] == 21
+
+
+def test_worker_snapshots_merge_into_the_parent():
+    enable_metrics()
+    with stage('filter.eckhardt', rows=10):
+        pass
+    count('bytes_downloaded', 100)
+    snapshot = metrics_info(reset=True)
+    assert metrics_info()['stages'] == {} and metrics_info()['counters'] == {}
+
+    merge_metrics(snapshot)
+    merge_metrics(snapshot)
+    merge_metrics({'enabled': False})
+    info = metrics_info()
+    assert info['stages']['filter.eckhardt']['calls'] == 2
+    assert info['stages']['filter.eckhardt']['rows'] == 20
+    assert info['counters'] == {'bytes_downloaded': 200}
+
+
+def test_export(tmp_path):
+    enable_metrics()
+    with stage('filter.eckhardt', rows=10):
+        pass
+    count('bytes_downloaded', 100)
+
+    export_metrics(str(tmp_path / 'metrics.json'))
+    assert json.loads((tmp_path / 'metrics.json').read_text())['counters'] == {'bytes_downloaded': 100}
+
+    export_metrics(str(tmp_path / 'metrics.prom'))
+    text = (tmp_path / 'metrics.prom').read_text()
+    assert 'baseflow_stage_calls_total{stage="filter.eckhardt"} 1\n' in text
+    assert 'baseflow_stage_rows_total{stage="filter.eckhardt"} 10\n' in text
+    assert '# TYPE baseflow_bytes_downloaded_total counter\nbaseflow_bytes_downloaded_total 100\n' in text
+    assert sorted(path.name for path in tmp_path.iterdir()) == ['metrics.json', 'metrics.prom']
+
+    with pytest.raises(ValueError, match='format'):
+        export_metrics(str(tmp_path / 'metrics.txt'), format='csv')
@@ -0,0 +1,63 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.processing import label_agreement, label_rows
+
+
+@pytest.fixture
+def predictions():
+    return pd.DataFrame({
+        'Lyne_Hollick': [100.0, 100.0, np.nan, 100.0, 50.0],
+        'Chapman': [150.0, 400.0, 100.0, 100.0, 60.0],
+        'Eckhardt': [120.0, 100.0, 100.0, np.nan, 500.0],
+    })
+
+
+def _baseline_labels(df, columns, threshold):
+    # The row-wise labeling that label_rows replaced
+    difference = df[columns].apply(lambda row: abs(row.iloc[0] - row.iloc[1]), axis=1)
+    return difference.apply(lambda x: 'BFO' if x <= threshold else 'NBF').tolist()
+
+
+def test_label_rows_matches_baseline(predictions):
+    expected = _baseline_labels(predictions, ['Lyne_Hollick', 'Chapman'], 200)
+    labeled = label_rows(predictions.copy(), ['Lyne_Hollick', 'Chapman'], 200)
+
+    assert labeled['Label'].tolist() == expected == ['BFO', 'NBF', 'NBF', 'BFO', 'BFO']
+
+
+def test_label_rows_writes_csv_only_when_asked(predictions, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    label_rows(predictions, ['Lyne_Hollick', 'Chapman'], 200)
+    assert list(tmp_path.iterdir()) == []
+
+    label_rows(predictions, ['Lyne_Hollick', 'Chapman'], 200, output_file='labels.csv')
+    assert pd.read_csv(tmp_path / 'labels.csv')['Label'].tolist() == ['BFO', 'NBF', 'NBF', 'BFO', 'BFO']
+
+
+def test_label_agreement_spread(predictions):
+    labels = label_agreement(predictions, ['Lyne_Hollick', 'Chapman', 'Eckhardt'], 100)['Label']
+
+    assert labels.dtype == 'category'
+    # Rows with a NaN get a missing label instead of a guess
+    assert labels.tolist()[:2] == ['BFO', 'NBF']
+    assert labels.isna().tolist() == [False, False, True, True, False]
+    assert labels.iloc[4] == 'NBF'
+
+
+def test_label_agreement_within_reference(predictions):
+    labels = label_agreement(predictions, ['Chapman', 'Eckhardt'], 60, rule='within', reference='Lyne_Hollick')
+    assert labels['Label'].tolist()[:2] == ['BFO', 'NBF']
+
+
+def test_label_agreement_relative(predictions):
+    labels = label_agreement(predictions, ['Lyne_Hollick', 'Chapman'], 0.3, relative=True)['Label']
+    # 50 apart around a mean of 125 is 40%; 10 apart around 55 is 18%
+    assert labels.iloc[0] == 'NBF'
+    assert labels.iloc[4] == 'BFO'
+
+
+def test_label_agreement_rejects_unknown_rules(predictions):
+    with pytest.raises(ValueError, match='spread'):
+        label_agreement(predictions, ['Lyne_Hollick', 'Chapman'], 100, rule='median')
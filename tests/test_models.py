@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow import models
+from baseflow.engine import first_order_filter, linear_recurrence, masked_filter, pack_valid, unpack_valid
+from reference import LINEAR_CASES, expected, what
+
+
+def _loop_recurrence(x, a, initial):
+    y = [initial]
+    for value in x[1:]:
+        y.append(a * y[-1] + value)
+    return np.array(y)
+
+
+@pytest.mark.parametrize('name, reference, params', LINEAR_CASES)
+def test_filter_matches_reference(name, reference, params, streamflow):
+    series = pd.Series(streamflow)
+    baseflow = getattr(models, name)(series, **params)
+
+    np.testing.assert_allclose(baseflow, expected(reference, streamflow, params), rtol=1e-10)
+    # The input is left as it was
+    np.testing.assert_array_equal(series.to_numpy(), streamflow)
+
+
+@pytest.mark.parametrize('name, reference, params', LINEAR_CASES)
+def test_filter_accepts_any_array_like(name, reference, params, streamflow):
+    from_series = getattr(models, name)(pd.Series(streamflow), **params)
+    np.testing.assert_array_equal(getattr(models, name)(streamflow, **params), from_series)
+    np.testing.assert_array_equal(getattr(models, name)(streamflow.tolist(), **params), from_series)
+
+
+def test_what_matches_reference(streamflow):
+    filled = np.nan_to_num(streamflow, nan=1000.0)
+    baseflow, quickflow = models.what(pd.DataFrame({'streamflow': filled}), 0.8, 0.98)
+
+    np.testing.assert_allclose(baseflow, what(filled.tolist(), 0.8, 0.98), rtol=1e-10)
+    np.testing.assert_allclose(quickflow, filled - baseflow)
+
+
+def test_out_of_range_parameter_prints_and_returns_none(streamflow, capsys):
+    assert models.chapman_maxwell(streamflow, 1.5) is None
+    assert 'k must be between 0 and 1' in capsys.readouterr().out
+
+
+def test_empty_input():
+    assert models.lyne_hollick(np.array([]), 0.925).shape == (0,)
+
+
+def test_linear_recurrence_matches_loop():
+    x = np.random.default_rng(0).normal(size=500)
+    np.testing.assert_allclose(linear_recurrence(x, 0.9, 3.0), _loop_recurrence(x, 0.9, 3.0))
+
+
+@pytest.mark.parametrize('columns', [4, 40])
+def test_linear_recurrence_per_column_coefficients(columns):
+    # Few distinct coefficients are grouped into lfilter calls; many take the blocked scan
+    x = np.random.default_rng(1).normal(size=(300, columns))
+    a = np.linspace(0.5, 0.99, columns)
+    initial = np.arange(columns, dtype=np.float64)
+    y = linear_recurrence(x, a, initial)
+
+    for column in range(columns):
+        np.testing.assert_allclose(y[:, column], _loop_recurrence(x[:, column], a[column], initial[column]),
+                                   rtol=1e-9, atol=1e-9)
+
+
+def test_first_order_filter_matches_loop():
+    q = np.random.default_rng(2).gamma(2.0, 100.0, 200)
+    b = [q[0]]
+    for t in range(1, len(q)):
+        b.append(0.9 * b[-1] + 0.03 * q[t] + 0.07 * q[t - 1])
+    np.testing.assert_allclose(first_order_filter(q, 0.9, 0.03, 0.07, q[0]), b)
+
+
+def test_pack_valid_round_trip(streamflow):
+    block = np.column_stack([streamflow, streamflow[::-1]])
+    packed, order, valid = pack_valid(block)
+
+    assert not np.isnan(packed).any()
+    np.testing.assert_array_equal(packed[:valid[:, 0].sum(), 0], streamflow[~np.isnan(streamflow)])
+    np.testing.assert_array_equal(unpack_valid(packed, order, valid), block)
+
+
+def test_masked_filter_leaves_input_untouched(streamflow):
+    before = streamflow.copy()
+    masked_filter(streamflow, 0.9, 0.05, 0.05)
+    np.testing.assert_array_equal(streamflow, before)
@@ -0,0 +1,125 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.periods import (PERIOD_KEYS, broadcast_groups, calendar_index, clear_calendar_indexes, key_groups,
+                              period_groups, reduce_groups)
+
+
+@pytest.fixture(autouse=True)
+def fresh_indexes():
+    clear_calendar_indexes()
+    yield
+    clear_calendar_indexes()
+
+
+@pytest.fixture
+def dates():
+    # Covers leap days, ISO weeks 52/53 around the new year and every season boundary
+    return pd.Series(pd.date_range('2015-12-20', '2021-01-10'))
+
+
+def test_calendar_index_matches_dt_accessors(dates):
+    calendar = calendar_index(dates)
+
+    np.testing.assert_array_equal(calendar['year'], dates.dt.year)
+    np.testing.assert_array_equal(calendar['month'], dates.dt.month)
+    np.testing.assert_array_equal(calendar['day'], dates.dt.day)
+    np.testing.assert_array_equal(calendar['week'], dates.dt.isocalendar().week)
+    np.testing.assert_array_equal(calendar['day_of_year'], dates.dt.dayofyear)
+    day = dates.dt.dayofyear
+    season = np.select([(80 <= day) & (day < 172), (172 <= day) & (day < 266), (266 <= day) & (day < 356)],
+                       [2, 3, 4], 1)
+    np.testing.assert_array_equal(calendar['season'], season)
+    assert all(calendar[key].dtype == dtype for key, dtype in PERIOD_KEYS.items())
+
+
+def test_irregular_dates_with_nat():
+    dates = pd.Series(pd.to_datetime(['2020-12-31 23:45', None, '2021-01-04 00:15', '2019-06-10 00:00']))
+    calendar = calendar_index(dates)
+
+    assert calendar['valid'].tolist() == [True, False, True, True]
+    assert calendar['year'].tolist() == [2020, 0, 2021, 2019]
+    assert calendar['week'].tolist() == [53, 0, 1, 24]
+    with pytest.raises(ValueError):
+        calendar['year'][0] = 1
+
+
+def test_time_zone_aware_dates_use_local_time():
+    dates = pd.Series(pd.date_range('2020-12-31 20:00', periods=3, freq='3h', tz='America/New_York'))
+    np.testing.assert_array_equal(calendar_index(dates)['day'], dates.dt.day)
+
+
+def test_indexes_are_shared_by_equal_dates(dates):
+    first = calendar_index(dates)
+    assert calendar_index(pd.DatetimeIndex(dates.copy())) is first
+    assert calendar_index(dates[:-1]) is not first
+
+    shuffled = dates.sample(frac=1, random_state=1)
+    assert calendar_index(shuffled) is calendar_index(shuffled.copy())
+
+
+def test_period_groups_match_groupby(dates, streamflow):
+    values = np.resize(streamflow, len(dates))
+    calendar = calendar_index(dates)
+    groups = period_groups(calendar, 'year', 'month')
+
+    expected = pd.Series(values).groupby([dates.dt.year, dates.dt.month])
+    np.testing.assert_allclose(reduce_groups(groups, values), expected.mean())
+    np.testing.assert_allclose(reduce_groups(groups, values, 'sum'), expected.sum())
+    np.testing.assert_array_equal(reduce_groups(groups, values, 'count'), expected.count())
+    assert list(zip(groups['labels']['year'], groups['labels']['month'])) == list(expected.mean().index)
+    np.testing.assert_allclose(broadcast_groups(groups, reduce_groups(groups, values)),
+                               expected.transform('mean'))
+    # Built once per calendar
+    assert period_groups(calendar, 'year', 'month') is groups
+
+
+def test_nat_rows_belong_to_no_group():
+    calendar = calendar_index(pd.to_datetime(['2020-01-01', None, '2020-02-01', '2020-01-02']))
+    groups = period_groups(calendar, 'month')
+
+    assert groups['count'] == 2
+    assert groups['counts'].tolist() == [2, 1]
+    np.testing.assert_allclose(reduce_groups(groups, [1.0, 100.0, 5.0, np.nan]), [1.0, 5.0])
+    assert np.isnan(broadcast_groups(groups, [1.0, 5.0])[1])
+
+
+def test_key_groups():
+    integer = key_groups(np.array([12, 3, 12, 5]))
+    assert integer['labels']['key'].tolist() == [3, 5, 12]
+    np.testing.assert_allclose(reduce_groups(integer, [1.0, 2.0, 3.0, 4.0]), [2.0, 4.0, 2.0])
+
+    text = key_groups(np.array(['BFO', None, 'NBF', 'BFO'], dtype=object))
+    assert text['labels']['key'].tolist() == ['BFO', 'NBF']
+    np.testing.assert_allclose(reduce_groups(text, [1.0, 2.0, 3.0, 4.0], 'sum'), [5.0, 3.0])
+
+
+def test_bad_arguments(dates):
+    with pytest.raises(ValueError, match='keys'):
+        period_groups(calendar_index(dates), 'decade')
+    with pytest.raises(ValueError, match='how'):
+        reduce_groups(key_groups([1, 2]), [1.0, 2.0], 'median')
+
+
+def test_manual_analysis_works_without_the_package(monkeypatch):
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(__file__), '..', 'manual_analysis'))
+    import manual_analysis
+
+    data = manual_analysis.load_periods(pd.DataFrame({
+        'start_date': ['2020-01-05', '2020-03-01', '2021-01-09', '2021-01-20'],
+        'end_date': ['2020-01-15', '2020-03-04', '2021-01-10', '2021-01-27'],
+    }))
+    with_package = {(key, how): manual_analysis.duration_by_period(data, key, how) for key in ['year', 'month']
+                    for how in ['sum', 'mean']}
+
+    # As when the script runs from a checkout where baseflow is not installed
+    monkeypatch.setitem(sys.modules, 'baseflow.periods', None)
+    for (key, how), expected in with_package.items():
+        pd.testing.assert_series_equal(manual_analysis.duration_by_period(data, key, how), expected,
+                                       check_index_type=False)
+    with pytest.raises(ImportError, match='pip install'):
+        manual_analysis.duration_by_period(data, 'season')
@@ -0,0 +1,81 @@
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow import pipeline
+from baseflow.models import eckhardt
+from baseflow.pipeline import run_pipeline, run_station
+
+
+def _write_station_files(folder, stations, streamflow):
+    dates = pd.date_range('2019-06-10', periods=len(streamflow)).strftime('%Y-%m-%d')
+    for station in stations:
+        pd.DataFrame({'Date': dates, 'Discharge': streamflow}).to_csv(
+            os.path.join(folder, f'USGS_Data_for_{station}.txt'), header=False, index=False)
+    return os.path.join(folder, 'USGS_Data_for_{station}.txt')
+
+
+def _exit_for(df, station, victim):
+    if station == victim:
+        os._exit(1)
+    return df
+
+
+@pytest.fixture
+def forked_pool(monkeypatch):
+    # Workers are forked so they see steps registered by the test
+    monkeypatch.setattr(pipeline, 'ProcessPoolExecutor',
+                        functools.partial(ProcessPoolExecutor, mp_context=multiprocessing.get_context('fork')))
+
+
+def test_run_station(tmp_path, streamflow):
+    path = _write_station_files(str(tmp_path), ['01636500'], streamflow)
+    steps = [('read', {'path': path}), ('clean', {}),
+             ('filter', {'column': 'Eckhardt', 'model': 'eckhardt', 'alpha': 0.98, 'bfi_max': 0.8})]
+
+    record = run_station('01636500', steps, str(tmp_path))
+
+    assert record['Status'] == 'ok', record['Error']
+    assert record['Rows'] == len(streamflow)
+    assert set(record['Stages']) == {'read', 'clean', 'filter', 'write'}
+    output = pd.read_csv(record['Output'])
+    cleaned = pd.Series(streamflow).ffill()
+    np.testing.assert_allclose(output['Eckhardt'], eckhardt(cleaned, 0.98, 0.8))
+
+
+def test_run_station_reports_step_errors(tmp_path):
+    record = run_station('01636500', [('read', {'path': str(tmp_path / 'missing_{station}.txt')})], str(tmp_path))
+
+    assert record['Status'] == 'failed'
+    assert record['Error'].startswith('FileNotFoundError')
+    assert record['Output'] is None
+
+
+def test_run_pipeline_rejects_unknown_steps(tmp_path):
+    with pytest.raises(ValueError, match='Unknown pipeline steps: resample'):
+        run_pipeline(['01636500'], [('resample', {})], str(tmp_path))
+
+
+def test_run_pipeline_survives_a_dead_worker(tmp_path, streamflow, monkeypatch, forked_pool):
+    stations = [f'0{number}' for number in range(1636500, 1636512)]
+    path = _write_station_files(str(tmp_path), stations, streamflow)
+    monkeypatch.setitem(pipeline.STEPS, 'exit_for', _exit_for)
+    steps = [('read', {'path': path}), ('exit_for', {'victim': stations[2]}), ('clean', {})]
+
+    seen = []
+    summary = run_pipeline(stations, steps, str(tmp_path / 'out'), workers=2, on_result=seen.append)
+
+    assert sorted(summary['Station']) == stations
+    assert len(seen) == len(stations)
+    records = summary.set_index('Station')
+    assert records.loc[stations[2], 'Status'] == 'failed'
+    assert 'BrokenProcessPool' in records.loc[stations[2], 'Error']
+    # Stations submitted well after the crash run on a new pool
+    assert (records.loc[stations[-3:], 'Status'] == 'ok').all()
+    for station in records.index[records['Status'] == 'ok']:
+        assert os.path.exists(tmp_path / 'out' / f'{station}.csv')
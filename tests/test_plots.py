@@ -0,0 +1,73 @@
+import matplotlib
+
+matplotlib.use('Agg')
+
+import matplotlib.pyplot as plt
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.plots import downsample, minmax_indices, plot_discharge_and_models
+
+
+@pytest.fixture
+def dataset(streamflow):
+    return pd.DataFrame({'Date': pd.date_range('2019-06-10', periods=len(streamflow)), 'Discharge': streamflow,
+                         'Lyne_Hollick': streamflow * 0.6, 'Chapman': streamflow * 0.4})
+
+
+def test_short_series_are_kept_whole():
+    np.testing.assert_array_equal(minmax_indices(np.arange(40.0), 10), np.arange(40))
+
+
+@pytest.mark.parametrize('buckets', [7, 50, 100])
+def test_every_bucket_keeps_its_extremes(streamflow, buckets):
+    values = np.tile(streamflow, 3)
+    kept = minmax_indices(values, buckets)
+
+    size = -(-len(values) // buckets)
+    bucket = kept // size
+    assert np.all(np.diff(kept) > 0)
+    assert np.bincount(bucket).max() <= 4
+    for b in range(buckets):
+        window = values[b * size:(b + 1) * size]
+        chosen = values[kept[bucket == b]]
+        assert kept[bucket == b][0] == b * size
+        assert np.nanmin(chosen) == np.nanmin(window)
+        assert np.nanmax(chosen) == np.nanmax(window)
+    assert kept[-1] == len(values) - 1
+
+
+def test_downsample_keeps_pairs(dataset):
+    x, y = downsample(dataset['Date'], dataset['Discharge'], 20)
+    kept = minmax_indices(dataset['Discharge'], 20)
+
+    np.testing.assert_array_equal(x, dataset['Date'].to_numpy()[kept])
+    np.testing.assert_array_equal(y, dataset['Discharge'].to_numpy()[kept])
+
+
+def test_output_file_is_written_without_pyplot(dataset, tmp_path):
+    plt.close('all')
+    figure = plot_discharge_and_models(dataset, ['Lyne_Hollick', 'Chapman'], output_file=str(tmp_path / 'plot.png'))
+
+    assert (tmp_path / 'plot.png').stat().st_size > 0
+    assert plt.get_fignums() == []
+    lines = figure.axes[0].get_lines()
+    assert [line.get_label() for line in lines] == ['Discharge', 'Lyne_Hollick', 'Chapman']
+    # The default of one bucket per pixel is wider than this record, so every point is drawn
+    assert len(lines[0].get_xdata()) == len(dataset)
+
+
+def test_plotly_html(dataset, tmp_path):
+    pytest.importorskip('plotly')
+    figure = plot_discharge_and_models(dataset, ['Chapman'], buckets=50, output_file=str(tmp_path / 'plot.html'),
+                                       backend='plotly')
+
+    assert (tmp_path / 'plot.html').exists()
+    assert [trace.name for trace in figure.data] == ['Discharge', 'Chapman']
+    assert len(figure.data[0].x) <= 4 * 50
+
+
+def test_rejects_unknown_backend(dataset):
+    with pytest.raises(ValueError, match='backend'):
+        plot_discharge_and_models(dataset, ['Chapman'], backend='bokeh')
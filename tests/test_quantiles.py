@@ -0,0 +1,84 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.processing import create_quantiles_dataframe, quantiles, separate_date_parameters
+
+
+@pytest.fixture
+def record(streamflow):
+    return pd.Series(pd.date_range('2019-06-10', periods=len(streamflow))), streamflow
+
+
+def _season(day):
+    return np.select([(80 <= day) & (day < 172), (172 <= day) & (day < 266), (266 <= day) & (day < 356)],
+                     [2, 3, 4], 1)
+
+
+def _reference(dates, streamflow, percentile):
+    # The pandas groupby construction the vectorized builder replaced
+    df = pd.DataFrame({'Date': dates, 'Q': streamflow, 'Year': dates.dt.year, 'Month': dates.dt.month,
+                       'Week': dates.dt.isocalendar().week.astype(int), 'Day': dates.dt.dayofyear})
+    df['Season'] = _season(df['Day'].to_numpy())
+
+    expected = pd.DataFrame({'Date': dates, 'Daily Streamflow': streamflow})
+    for name, keys in [('Weekly', ['Year', 'Week']), ('Monthly', ['Year', 'Month']),
+                       ('Seasonal', ['Year', 'Season']), ('Yearly', ['Year'])]:
+        expected[f'{name} Streamflow'] = df.groupby(keys)['Q'].transform('mean')
+    for name, key in [('Daily', 'Day'), ('Weekly', 'Week'), ('Monthly', 'Month'), ('Seasonal', 'Season'),
+                      ('Yearly', 'Year')]:
+        expected[f'{name} Threshold'] = df[key].map(df.groupby(key)['Q'].quantile(percentile))
+    columns = expected.columns[1:]
+    expected[columns] = expected[columns].round(1)
+    expected['Percentile'] = percentile
+    return expected
+
+
+@pytest.mark.parametrize('percentile', [0.1, 0.5, 0.9])
+def test_matches_groupby_reference(record, percentile):
+    dates, streamflow = record
+    result = create_quantiles_dataframe(dates, streamflow, percentile)
+    pd.testing.assert_frame_equal(result, _reference(dates, streamflow, percentile), check_dtype=False)
+
+
+def test_several_percentiles_are_stacked(record):
+    dates, streamflow = record
+    result = create_quantiles_dataframe(dates, streamflow, [0.25, 0.75])
+
+    assert len(result) == 2 * len(dates)
+    assert result['Percentile'].unique().tolist() == [0.25, 0.75]
+    for value, block in result.groupby('Percentile'):
+        pd.testing.assert_frame_equal(block.reset_index(drop=True), _reference(dates, streamflow, value),
+                                      check_dtype=False)
+
+
+def test_results_are_cached_by_contents(record, tmp_path):
+    dates, streamflow = record
+    first = create_quantiles_dataframe(dates, streamflow, 0.9, station='01636500', cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 1
+    pd.testing.assert_frame_equal(
+        create_quantiles_dataframe(dates, streamflow, 0.9, station='01636500', cache_dir=str(tmp_path)), first)
+
+    # Revised values for the same dates are a new entry, not the stale one
+    revised = streamflow.copy()
+    revised[100] = 1e6
+    second = create_quantiles_dataframe(dates, revised, 0.9, station='01636500', cache_dir=str(tmp_path))
+    assert len(os.listdir(tmp_path)) == 2
+    assert second['Daily Streamflow'].iloc[100] == 1e6
+
+
+def test_empty_record():
+    result = create_quantiles_dataframe(pd.Series(pd.to_datetime([])), np.array([]), 0.9)
+    assert result.empty
+    assert 'Yearly Threshold' in result.columns
+
+
+def test_quantiles_per_period(record):
+    dates, streamflow = record
+    df = separate_date_parameters(pd.DataFrame({'Date': dates, 'Discharge': streamflow}))
+    result = quantiles(df, 'Month', 0.9)
+
+    expected = df['Month'].map(df.groupby('Month')['Discharge'].quantile(0.9))
+    np.testing.assert_allclose(result['Month Quantile 0.9'], expected)
@@ -0,0 +1,60 @@
+import io
+import os
+
+import numpy as np
+import pandas as pd
+
+from baseflow.rdb import iter_rdb, parse_rdb
+from conftest import DATA_DIR
+
+FIXTURE = os.path.join(DATA_DIR, '01636500_dv.rdb')
+
+
+def test_parse_rdb():
+    with open(FIXTURE, 'rb') as stream:
+        df = parse_rdb(stream)
+
+    assert list(df.columns) == ['Date', 'Discharge', 'Qualifier']
+    assert df.attrs == {'station_number': '01636500', 'station_name': 'SHENANDOAH RIVER AT MILLVILLE, WV'}
+    assert len(df) == 10
+    assert pd.api.types.is_datetime64_dtype(df['Date'])
+    assert df['Date'].iloc[0] == pd.Timestamp('2019-06-10')
+    assert df['Date'].iloc[-1] == pd.Timestamp('2019-06-19')
+    # Codes such as 'Ice' in place of a value become NaN
+    assert np.isnan(df['Discharge'].iloc[5])
+    assert df['Discharge'].iloc[0] == 1850.0
+    assert list(df['Qualifier'].cat.categories) == ['A', 'P']
+
+
+def test_iter_rdb_matches_parse_rdb():
+    with open(FIXTURE, 'rb') as stream:
+        expected = parse_rdb(stream)
+    with open(FIXTURE, 'rb') as stream:
+        chunks = list(iter_rdb(stream, chunk_rows=4))
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert all(chunk.attrs['station_number'] == '01636500' for chunk in chunks)
+    combined = pd.concat(chunks, ignore_index=True)
+    pd.testing.assert_series_equal(combined['Date'], expected['Date'])
+    pd.testing.assert_series_equal(combined['Discharge'], expected['Discharge'])
+    assert combined['Qualifier'].astype(str).tolist() == expected['Qualifier'].astype(str).tolist()
+
+
+def test_parse_rdb_writes_sink():
+    sink = io.StringIO()
+    with open(FIXTURE, 'rb') as stream:
+        parse_rdb(stream, sink=sink, chunk_rows=3)
+
+    lines = sink.getvalue().splitlines()
+    assert len(lines) == 10
+    assert lines[0] == '2019-06-10,1850'
+    assert lines[5] == '2019-06-15,Ice'
+
+
+def test_parse_rdb_without_rows():
+    with open(FIXTURE, 'rb') as stream:
+        header = b''.join(line for line in stream if line.startswith(b'#') or not line.startswith(b'USGS'))
+
+    df = parse_rdb(io.BytesIO(header))
+    assert df.empty
+    assert df.attrs['station_number'] == '01636500'
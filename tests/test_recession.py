@@ -0,0 +1,68 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.recession import recession_constant
+
+
+def _storms(k, events=6, length=20, peak=500.0):
+    # Storm peaks followed by clean exponential recessions, Q(t) = Q0 * k ** t
+    series = []
+    for event in range(events):
+        series.append(peak + 100 * event)
+        series.extend((peak + 100 * event) * 0.5 * k ** np.arange(length))
+    return np.array(series)
+
+
+@pytest.mark.parametrize('method', ['master', 'envelope'])
+def test_recovers_exponential_recession(method):
+    assert recession_constant(_storms(0.95), method=method) == pytest.approx(0.95, rel=1e-9)
+
+
+@pytest.mark.parametrize('method', ['master', 'envelope'])
+def test_one_constant_per_gauge(method):
+    block = np.column_stack([_storms(0.9), _storms(0.97), np.linspace(1.0, 100.0, 126)])
+    constants = recession_constant(pd.DataFrame(block), method=method)
+
+    np.testing.assert_allclose(constants[:2], [0.9, 0.97], rtol=1e-9)
+    # A gauge that never recedes has no estimate
+    assert np.isnan(constants[2])
+
+
+def test_envelope_ignores_quickflow_steps():
+    q = _storms(0.95)
+    # Speed up the first steps of every recession, as quickflow would
+    starts = np.flatnonzero(np.diff(q) < 0)[::20]
+    q[starts + 2] *= 0.6
+    assert recession_constant(q, method='envelope', envelope=0.5) == pytest.approx(0.95, rel=1e-9)
+
+
+def test_results_are_cached_per_station(tmp_path):
+    block = np.column_stack([_storms(0.9), _storms(0.97)])
+    dates = pd.date_range('2020-01-01', periods=len(block))
+    first = recession_constant(block, stations=['01636500', '01638500'], dates=dates, cache_dir=str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ['recession_01636500_20200101_20200505_master_5_1.json',
+                                            'recession_01638500_20200101_20200505_master_5_1.json']
+
+    # A cached station is not estimated again, so its stored constant comes back even for new values
+    again = recession_constant(block * 0.0 + 1.0, stations=['01636500', '01638500'], dates=dates,
+                               cache_dir=str(tmp_path))
+    np.testing.assert_array_equal(again, first)
+
+    envelope = recession_constant(block[:, 0], method='envelope', envelope=0.2, stations='01636500', dates=dates,
+                                  cache_dir=str(tmp_path))
+    assert envelope == pytest.approx(0.9, rel=1e-9)
+    assert 'recession_01636500_20200101_20200505_envelope_5_1_0.2.json' in os.listdir(tmp_path)
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'method': 'slope'}, 'method'),
+    ({'min_length': 2, 'skip': 2}, 'min_length'),
+    ({'stations': ['01636500', '01638500'], 'dates': pd.date_range('2020-01-01', periods=126), 'cache_dir': '.'},
+     'stations'),
+])
+def test_rejects_bad_arguments(kwargs, message):
+    with pytest.raises(ValueError, match=message):
+        recession_constant(_storms(0.95), **kwargs)
@@ -0,0 +1,102 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.segments import (FLAT, RECESSION, RISING, duration_stats, find_peaks, segment_hydrograph,
+                               segment_table, select_segments)
+
+
+def _reference_segments(q, tolerance=0.0, min_length=1):
+    # Walks the steps one at a time, starting a segment whenever the sign changes
+    segments = []
+    current = None
+    for i in range(len(q) - 1):
+        delta = q[i + 1] - q[i]
+        if np.isnan(delta):
+            kind = None
+        else:
+            kind = RISING if delta > tolerance else RECESSION if delta < -tolerance else FLAT
+        if current is not None and kind == current[2]:
+            current[1] = i + 1
+            continue
+        if current is not None and current[2] is not None:
+            segments.append(tuple(current))
+        current = [i, i + 1, kind]
+    if current is not None and current[2] is not None:
+        segments.append(tuple(current))
+    return [segment for segment in segments if segment[1] - segment[0] >= min_length]
+
+
+def _as_list(index, gauge=0):
+    selected = select_segments(index, gauge=gauge)
+    return list(zip(selected['start'].tolist(), selected['end'].tolist(), selected['kind'].tolist()))
+
+
+def test_hand_built_hydrograph():
+    q = np.array([1.0, 2.0, 3.0, 3.0, 2.0, 1.0, np.nan, 4.0, 5.0])
+    index = segment_hydrograph(q)
+
+    assert _as_list(index) == [(0, 2, RISING), (2, 3, FLAT), (3, 5, RECESSION), (7, 8, RISING)]
+    assert index['gauge'].dtype == np.int32 and index['kind'].dtype == np.int8
+
+
+@pytest.mark.parametrize('tolerance, min_length', [(0.0, 1), (50.0, 1), (0.0, 3), (25.0, 4)])
+def test_matches_reference(streamflow, tolerance, min_length):
+    index = segment_hydrograph(streamflow, tolerance, min_length)
+    assert _as_list(index) == _reference_segments(streamflow, tolerance, min_length)
+
+
+def test_gauges_are_segmented_independently(streamflow):
+    block = np.column_stack([streamflow, streamflow[::-1], np.full(len(streamflow), 7.0)])
+    index = segment_hydrograph(pd.DataFrame(block))
+
+    assert _as_list(index, 0) == _reference_segments(streamflow)
+    assert _as_list(index, 1) == _reference_segments(streamflow[::-1])
+    # A constant gauge is one flat segment, not joined onto the end of the previous gauge
+    assert _as_list(index, 2) == [(0, len(streamflow) - 1, FLAT)]
+
+
+@pytest.mark.parametrize('values', [np.array([]), np.array([1.0]), np.empty((10, 0))])
+def test_too_short_or_empty(values):
+    index = segment_hydrograph(values)
+    assert all(len(array) == 0 for array in index.values())
+
+
+def test_rejects_three_dimensions():
+    with pytest.raises(ValueError, match='1-D'):
+        segment_hydrograph(np.zeros((3, 3, 3)))
+
+
+def test_find_peaks():
+    q = np.array([1.0, 3.0, 2.0, 2.0, 5.0, 5.0, 1.0, 4.0])
+    gauge, row = find_peaks(segment_hydrograph(np.column_stack([q, q])))
+
+    assert gauge.tolist() == [0, 0, 1, 1]
+    assert row.tolist() == [1, 4, 1, 4]
+
+
+def test_segment_table_and_duration_stats():
+    dates = pd.date_range('2020-01-28', periods=10)
+    q = np.array([9.0, 8.0, 7.0, 8.0, 7.0, 6.0, 5.0, 4.0, 5.0, 6.0])
+    index = segment_hydrograph(q)
+
+    table = segment_table(index, dates, names=['01636500'])
+    assert table['Kind'].tolist() == ['recession', 'rising', 'recession', 'rising']
+    assert table['start_date'].tolist() == [dates[0], dates[2], dates[3], dates[7]]
+    assert table['duration_days'].tolist() == [2, 1, 4, 2]
+    assert (table['Gauge'] == '01636500').all()
+
+    monthly = duration_stats(index, dates, period='month', names=['01636500'])
+    assert monthly['Month'].tolist() == [1]
+    assert monthly['Count'].tolist() == [2]
+    assert monthly['Total Duration'].tolist() == [6.0]
+    assert monthly['Mean Duration'].tolist() == [3.0]
+
+    rising = duration_stats(index, dates, period='season', kind=RISING)
+    assert rising['Season'].tolist() == ['Winter']
+    assert rising['Count'].tolist() == [2]
+
+
+def test_duration_stats_rejects_unknown_periods():
+    with pytest.raises(ValueError, match='period'):
+        duration_stats(segment_hydrograph(np.arange(5.0)), pd.date_range('2020-01-01', periods=5), period='week')
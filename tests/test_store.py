@@ -0,0 +1,72 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+pytest.importorskip('pyarrow')
+
+from baseflow.store import list_stations, open_station, read_station, write_station
+
+DATES = pd.date_range('2019-12-25', periods=20)
+
+
+def _discharge(dates=DATES, start=0.0):
+    return pd.DataFrame({'Date': dates, 'Discharge': np.arange(start, start + len(dates))})
+
+
+def test_round_trip(tmp_path):
+    df = _discharge().assign(Eckhardt=lambda frame: frame['Discharge'] / 2)
+    written = write_station(str(tmp_path), '01636500', df)
+
+    assert [path.rsplit('/', 1)[1] for path in written] == ['year=2019.arrow', 'year=2020.arrow']
+    assert list_stations(str(tmp_path)) == ['01636500']
+    pd.testing.assert_frame_equal(read_station(str(tmp_path), '01636500'), df, check_dtype=False)
+
+
+def test_new_columns_keep_stored_columns(tmp_path):
+    write_station(str(tmp_path), '01636500', _discharge())
+    write_station(str(tmp_path), '01636500', pd.DataFrame({'Date': DATES, 'Eckhardt': np.full(len(DATES), 0.5)}))
+
+    stored = read_station(str(tmp_path), '01636500')
+    assert list(stored.columns) == ['Date', 'Discharge', 'Eckhardt']
+    np.testing.assert_array_equal(stored['Discharge'], np.arange(len(DATES)))
+    np.testing.assert_array_equal(stored['Eckhardt'], 0.5)
+
+
+def test_partial_rows_and_columns_merge(tmp_path):
+    write_station(str(tmp_path), '01636500', _discharge())
+    # Model values for the last five days only, then new and revised days
+    write_station(str(tmp_path), '01636500', pd.DataFrame({'Date': DATES[-5:], 'Eckhardt': np.arange(5.0)}))
+    write_station(str(tmp_path), '01636500', _discharge(pd.date_range(DATES[-2], periods=4), start=100.0))
+
+    stored = read_station(str(tmp_path), '01636500')
+    assert len(stored) == len(DATES) + 2
+    np.testing.assert_array_equal(stored['Discharge'], [*range(18), 100.0, 101.0, 102.0, 103.0])
+    np.testing.assert_array_equal(stored['Eckhardt'], [*[np.nan] * 15, 0.0, 1.0, 2.0, 3.0, 4.0, np.nan, np.nan])
+
+
+def test_missing_values_do_not_erase_stored_ones(tmp_path):
+    write_station(str(tmp_path), '01636500', _discharge())
+    revision = pd.DataFrame({'Date': DATES[:3], 'Discharge': [np.nan, 50.0, np.nan]})
+    write_station(str(tmp_path), '01636500', revision)
+
+    np.testing.assert_array_equal(read_station(str(tmp_path), '01636500')['Discharge'][:3], [0.0, 50.0, 2.0])
+
+
+def test_date_range_and_column_selection(tmp_path):
+    df = _discharge().assign(Eckhardt=0.5, Chapman=0.25)
+    write_station(str(tmp_path), '01636500', df)
+
+    selected = read_station(str(tmp_path), '01636500', columns=['Chapman'], start_date='2019-12-30',
+                            end_date='2020-01-02')
+    assert list(selected.columns) == ['Date', 'Chapman']
+    assert selected['Date'].tolist() == list(pd.date_range('2019-12-30', '2020-01-02'))
+
+    table = open_station(str(tmp_path), '01636500', start_date='2020-01-01')
+    assert table.num_rows == 13
+    assert open_station(str(tmp_path), '01636500', start_date='2021-01-01').num_rows == 0
+
+
+def test_missing_station(tmp_path):
+    assert list_stations(str(tmp_path / 'nowhere')) == []
+    with pytest.raises(FileNotFoundError, match='01636500'):
+        read_station(str(tmp_path), '01636500')
@@ -0,0 +1,92 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow.summary import baseflow_summary, summarize_models
+
+
+@pytest.fixture
+def gauges(streamflow):
+    discharge = np.column_stack([streamflow, streamflow[::-1], streamflow * 2])
+    models = {'Lyne_Hollick': discharge * 0.6, 'Chapman': discharge * np.linspace(0.5, 1.0, len(discharge))[:, None]}
+    models['Chapman'][50:60, 1] = np.nan
+    return pd.date_range('2019-06-10', periods=len(discharge)), discharge, models
+
+
+def _reference(dates, discharge, models, keys, baseflow_fraction=0.9):
+    # One gauge, period and model at a time, straight from the definitions
+    rows = []
+    stacked = np.stack(list(models.values()), axis=-1)
+    for gauge in range(discharge.shape[1]):
+        for key in pd.unique(keys):
+            in_period = keys == key
+            q = discharge[in_period, gauge]
+            block = stacked[in_period, gauge]
+            valid = ~np.isnan(block) & ~np.isnan(q)[:, None]
+            with np.errstate(invalid='ignore'):
+                ensemble = np.where(valid, block, 0.0).sum(axis=1) / valid.sum(axis=1)
+            for m, model in enumerate(models):
+                ok = valid[:, m]
+                b, flow = block[ok, m], q[ok]
+                rows.append({
+                    'Gauge': gauge, 'Key': key, 'Model': model, 'Steps': ok.sum(),
+                    'BFI': b.sum() / flow.sum(),
+                    'Baseflow Volume': b.sum() * 86400,
+                    'Percent Baseflow': 100.0 * (b >= baseflow_fraction * flow).sum() / ok.sum(),
+                    'Divergence': np.abs(b - ensemble[ok]).sum() / b.sum(),
+                })
+    reference = pd.DataFrame(rows)
+    reference['Model'] = pd.Categorical(reference['Model'], categories=list(models))
+    return reference
+
+
+@pytest.mark.parametrize('period', ['year', 'month', 'all'])
+def test_matches_reference(gauges, period):
+    dates, discharge, models = gauges
+    keys = {'year': dates.year, 'month': dates.year * 100 + dates.month, 'all': np.zeros(len(dates))}[period]
+    summary = baseflow_summary(discharge, models, dates, period=period)
+    expected = _reference(dates, discharge, models, np.asarray(keys))
+
+    summary = summary.sort_values(['Gauge', *summary.columns[1:-6], 'Model']).reset_index(drop=True)
+    expected = expected.sort_values(['Gauge', 'Key', 'Model']).reset_index(drop=True)
+    assert len(summary) == len(expected)
+    for column in ['Steps', 'BFI', 'Baseflow Volume', 'Percent Baseflow', 'Divergence']:
+        np.testing.assert_allclose(summary[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float),
+                                   rtol=1e-9, err_msg=column)
+    if period == 'month':
+        assert (summary['Year'] * 100 + summary['Month']).tolist() == expected['Key'].tolist()
+
+
+def test_chunks_do_not_change_the_result(gauges):
+    dates, discharge, models = gauges
+    whole = baseflow_summary(discharge, models, dates, period='month', names=['a', 'b', 'c'])
+    # A budget below one gauge's arrays forces one gauge per chunk
+    chunked = baseflow_summary(discharge, models, dates, period='month', names=['a', 'b', 'c'], max_bytes=1)
+
+    pd.testing.assert_frame_equal(chunked.sort_values(['Gauge', 'Year', 'Month', 'Model'], ignore_index=True),
+                                  whole.sort_values(['Gauge', 'Year', 'Month', 'Model'], ignore_index=True))
+    assert list(whole['Model'].cat.categories) == ['Lyne_Hollick', 'Chapman']
+
+
+def test_summarize_models(gauges):
+    dates, discharge, models = gauges
+    df = pd.DataFrame({'Date': dates, 'Discharge': discharge[:, 0], 'Lyne_Hollick': models['Lyne_Hollick'][:, 0]})
+    summary = summarize_models(df, ['Lyne_Hollick'], period='year', station='01636500')
+
+    assert summary['Gauge'].tolist() == ['01636500'] * 3
+    assert summary['Year'].tolist() == [2019, 2020, 2021]
+    np.testing.assert_allclose(summary['BFI'], 0.6)
+    np.testing.assert_allclose(summary['Divergence'], 0.0)
+
+
+@pytest.mark.parametrize('kwargs, message', [
+    ({'period': 'week'}, 'period'),
+    ({'dates': pd.date_range('2019-06-10', periods=3)}, 'dates'),
+    ({'baseflow': {}}, 'Nothing to summarize'),
+    ({'baseflow': {'Chapman': np.zeros(5)}}, 'same shape'),
+])
+def test_rejects_bad_arguments(gauges, kwargs, message):
+    dates, discharge, models = gauges
+    arguments = {'streamflow': discharge, 'baseflow': models, 'dates': dates, **kwargs}
+    with pytest.raises(ValueError, match=message):
+        baseflow_summary(**arguments)
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from baseflow import models
+from baseflow.sweep import iter_sweep, parameter_grid, parameter_sweep
+
+
+def test_parameter_grid():
+    grid = parameter_grid(alpha=[0.9, 0.95], bfi_max=[0.25, 0.5, 0.8])
+
+    assert list(grid.columns) == ['alpha', 'bfi_max']
+    assert len(grid) == 6
+    assert grid.iloc[1].tolist() == [0.9, 0.5]
+
+
+def test_iter_sweep_matches_each_filter_call(streamflow):
+    grid = {'alpha': [0.9, 0.95, 0.98], 'bfi_max': [0.5, 0.8]}
+    # A tiny budget forces one parameter set per chunk
+    chunks = list(iter_sweep(streamflow, 'eckhardt', grid, max_bytes=1))
+
+    assert len(chunks) == 6
+    for params, cube in chunks:
+        assert cube.shape == (1, len(streamflow), 1)
+        alpha, bfi_max = params.iloc[0]
+        np.testing.assert_allclose(cube[0, :, 0], models.eckhardt(streamflow, alpha, bfi_max), rtol=1e-10)
+
+
+def test_parameter_sweep_summaries(streamflow):
+    discharge = pd.DataFrame({'A': streamflow, 'B': streamflow * 2})
+    summary = parameter_sweep(discharge, 'lyne_hollick', {'alpha': [0.9, 0.95]})
+
+    assert list(summary.columns) == ['alpha', 'Gauge', 'BFI', 'Mean Baseflow']
+    assert summary['Gauge'].tolist() == ['A', 'B', 'A', 'B']
+
+    valid = ~np.isnan(streamflow)
+    for _, row in summary.iterrows():
+        q = discharge[row['Gauge']].to_numpy()
+        baseflow = models.lyne_hollick(q, row['alpha'])
+        assert row['BFI'] == pytest.approx(baseflow[valid].sum() / q[valid].sum())
+        assert row['Mean Baseflow'] == pytest.approx(baseflow[valid].mean())
+
+
+def test_sweep_grid_frame_and_chunking_agree(streamflow):
+    grid = parameter_grid(k=np.linspace(0.1, 0.9, 9))
+    whole = parameter_sweep(streamflow, 'chapman_maxwell', grid)
+    chunked = parameter_sweep(streamflow, 'chapman_maxwell', grid, max_bytes=1)
+    pd.testing.assert_frame_equal(whole, chunked)
+
+
+def test_sweep_rejects_hyd_run_and_bad_parameters(streamflow):
+    with pytest.raises(ValueError, match='linear filters only'):
+        parameter_sweep(streamflow, 'hyd_run', {'k': [0.9], 'passes': [4]})
+    with pytest.raises(ValueError, match='linear filters only'):
+        next(iter_sweep(streamflow, models.hyd_run, {'k': [0.9], 'passes': [4]}))
+    with pytest.raises(ValueError, match=r'alpha .* \(positions 1\)'):
+        parameter_sweep(streamflow, 'lyne_hollick', {'alpha': [0.9, 1.5]})